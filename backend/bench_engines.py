@@ -0,0 +1,458 @@
+"""
+相似度与推荐引擎的规模基准。
+
+用合成的、形状接近 flavor network 的数据 (幂律分布的食材热度与化合物数量、按类别分组的食材、
+长度 2~30 的食谱) 在不同规模下测量各引擎函数的耗时与峰值内存，结果写成 JSON，便于对比两次运行。
+完全离线，只需要 CPU。
+
+用法 (在 backend 目录下):
+    python bench_engines.py                                   # 默认规模 1000 种食材 x 5 万份食谱
+    python bench_engines.py --scale 10000x1000000 --scale 50000x5000000 --json after.json
+    python bench_engines.py --scale 5000x500000 --compare before.json
+    python bench_engines.py --scale 50000x5000000 --top-k 100              # 用 top-K 稀疏矩阵代替稠密矩阵
+    python bench_engines.py --check --scale 300x5000                        # 与原先的实现逐格对比
+
+N x N 稠密矩阵的体积超过 --max-dense-gb 时，依赖它的基准会被跳过并在结果中注明原因；
+指定 --top-k 时三个相似度矩阵都按块构建为 top-K 稀疏矩阵，不受此限制。
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.api.creative import find_bridge_ingredients
+from src.api.recommend import get_recommendations
+from src.combo_index import ClassicComboIndex
+from src.complement_index import PairComplementIndex
+from src.core.readiness import readiness
+from src.dataloader import RECIPE_FILES, recipe_vocabulary
+from src.embedding_store import EmbeddingStore
+from src.innovative_scorer import InnovativeScorer
+from src.matrix_store import (
+    SimilarityMatrix, SparseSimilarityMatrix, default_block_rows, load_or_build_similarity_matrix, load_similarity_matrix,
+    save_similarity_matrix,
+)
+from src.neighbors import NeighborTable
+from src.recipe_store import RecipeStore
+from src.services.name_resolver import NameResolver
+from src.services.result_cache import ResultCache
+from src.similarity_engine import (
+    calculate_cooccurrence_similarity, calculate_cooccurrence_similarity_streaming, calculate_cooccurrence_similarity_top_k,
+    calculate_flavor_similarity, calculate_flavor_similarity_top_k,
+)
+from src import recommender
+
+CATEGORIES = ["vegetable", "fruit", "meat", "seafood", "dairy", "spice", "herb", "cereal", "nut/seed", "alcoholic beverage",
+              "plant derivative", "flower", "animal product", "fish"]
+EMBEDDING_DIM = 128
+BENCHMARK_FORMAT_VERSION = 1
+
+
+# --- 合成数据 ---
+
+def _popularity(n: int, exponent: float, rng: np.random.Generator) -> np.ndarray:
+    """Zipf 型热度分布，随机打乱使热门食材不集中在某一段ID。"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def make_dataset(n_ingredients: int, n_recipes: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    names = [f"ingredient_{i:06d}" for i in range(n_ingredients)]
+    category_weights = _popularity(len(CATEGORIES), 1.0, rng)
+    categories = rng.choice(CATEGORIES, size=n_ingredients, p=category_weights)
+    ingr_info = pd.DataFrame({'id': np.arange(n_ingredients), 'name': names, 'category': categories})
+
+    # 每种食材含 0~300 种化合物 (对数正态)，化合物本身的出现频率也是幂律
+    n_compounds = max(n_ingredients, 1000)
+    compound_p = _popularity(n_compounds, 1.1, rng)
+    compound_counts = np.minimum(rng.lognormal(mean=3.0, sigma=1.0, size=n_ingredients).astype(np.int64), 300)
+    compound_counts[rng.random(n_ingredients) < 0.3] = 0
+    flat_compounds = rng.choice(n_compounds, size=int(compound_counts.sum()), p=compound_p)
+    bounds = np.concatenate([[0], np.cumsum(compound_counts)])
+    ingr_comp = {i: set(flat_compounds[bounds[i]:bounds[i + 1]].tolist()) for i in range(n_ingredients) if compound_counts[i]}
+
+    # 食谱: 长度 2~30，食材按热度抽样，每份食谱内排序去重 (全程向量化，500 万份也只需几秒)
+    ingredient_p = _popularity(n_ingredients, 1.0, rng)
+    sizes = np.clip(rng.poisson(8, size=n_recipes), 2, 30)
+    flat = rng.choice(n_ingredients, size=int(sizes.sum()), p=ingredient_p).astype(np.int32)
+    recipe_of = np.repeat(np.arange(n_recipes, dtype=np.int64), sizes)
+    order = np.lexsort((flat, recipe_of))
+    flat, recipe_of = flat[order], recipe_of[order]
+    keep = np.ones(flat.size, dtype=bool)
+    keep[1:] = (flat[1:] != flat[:-1]) | (recipe_of[1:] != recipe_of[:-1])
+    flat, recipe_of = flat[keep], recipe_of[keep]
+    indptr = np.zeros(n_recipes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(recipe_of, minlength=n_recipes), out=indptr[1:])
+
+    # 嵌入: 约 5% 的食材未对齐 (全零行)
+    embeddings = rng.standard_normal((n_ingredients, EMBEDDING_DIM)).astype(np.float32)
+    embeddings[rng.random(n_ingredients) < 0.05] = 0
+
+    # 查询锚点取自较热门的食材，与真实流量相近
+    popular = np.argsort(-ingredient_p)[:max(50, n_ingredients // 20)]
+    queries = [[names[i] for i in rng.choice(popular, size=rng.integers(1, 4), replace=False)] for _ in range(50)]
+
+    return {
+        'ingr_info': ingr_info,
+        'ingr_comp': ingr_comp,
+        'recipes': RecipeStore(indptr, flat, recipe_vocabulary(ingr_info)),
+        'embeddings': embeddings,
+        'queries': queries,
+    }
+
+
+# --- 计时与内存 ---
+
+def measure(func, repeat: int, memory: bool):
+    """运行 repeat 次取耗时，再在 tracemalloc 下运行一次记录峰值内存 (numpy 的分配也会被跟踪)。"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            runs.append(time.perf_counter() - start)
+    entry = {"seconds": round(float(np.median(runs)), 6), "runs": [round(r, 6) for r in runs]}
+    if memory:
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                func()
+            entry["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        finally:
+            tracemalloc.stop()
+    return entry, result
+
+
+def bench_scale(n_ingredients: int, n_recipes: int, args) -> dict:
+    print(f"\n=== {n_ingredients} 种食材 x {n_recipes} 份食谱 ===")
+    start = time.perf_counter()
+    data = make_dataset(n_ingredients, n_recipes, args.seed)
+    print(f"合成数据: {time.perf_counter() - start:.1f}s")
+
+    results = {}
+    dense_gb = 4 * n_ingredients ** 2 / 2 ** 30
+    # DataFrame 结果与转换出的 SimilarityMatrix 会同时存在，按三倍估算
+    dense_ok = dense_gb * 3 <= args.max_dense_gb
+    skip_reason = f"N x N 稠密矩阵约 {dense_gb:.1f} GB (计算时约三倍)，超过 --max-dense-gb={args.max_dense_gb}"
+
+    def run(name, func, repeat=args.repeat, needs_dense=False):
+        if needs_dense and not dense_ok:
+            results[name] = {"skipped": skip_reason}
+            print(f"{name}: 跳过 ({skip_reason})")
+            return None
+        entry, value = measure(func, repeat, args.memory)
+        results[name] = entry
+        print(f"{name}: {entry['seconds'] * 1000:.2f} ms" + (f", 峰值 {entry['peak_mb']} MB" if "peak_mb" in entry else ""))
+        return value
+
+    ingr_info, recipes, queries = data['ingr_info'], data['recipes'], data['queries']
+    vocabulary = recipes.vocabulary
+
+    embedding_store = EmbeddingStore(data['embeddings'], vocabulary)
+    similarity_mb = None
+    if args.top_k:
+        k = args.top_k
+        flavor_sim = run("calculate_flavor_similarity_top_k", lambda: calculate_flavor_similarity_top_k(data['ingr_comp'], ingr_info, k), repeat=1)
+        classic_sim = run("calculate_cooccurrence_similarity_top_k", lambda: calculate_cooccurrence_similarity_top_k(recipes, ingr_info, k), repeat=1)
+        multimodal_sim = run("multimodal_similarity_top_k", lambda: SparseSimilarityMatrix.from_blocks(
+            _embedding_blocks(embedding_store), vocabulary, k
+        ), repeat=1)
+        similarity_mb = round(sum(m.nbytes for m in (flavor_sim, classic_sim, multimodal_sim)) / 2 ** 20, 2)
+        matrices_ok = True
+    else:
+        flavor_df = run("calculate_flavor_similarity", lambda: calculate_flavor_similarity(data['ingr_comp'], ingr_info), repeat=1, needs_dense=True)
+        classic_df = run("calculate_cooccurrence_similarity", lambda: calculate_cooccurrence_similarity(recipes, ingr_info), repeat=1, needs_dense=True)
+        matrices_ok = dense_ok
+        if dense_ok:
+            flavor_sim = SimilarityMatrix.from_frame(flavor_df)
+            classic_sim = SimilarityMatrix.from_frame(classic_df)
+            del flavor_df, classic_df
+            multimodal_sim = SimilarityMatrix(embedding_store.score(embedding_store.unit, invalid_value=0.0), vocabulary)
+            similarity_mb = round(3 * 4 * n_ingredients ** 2 / 2 ** 20, 2)
+
+    if matrices_ok:
+        category_map = dict(zip(ingr_info['name'], ingr_info['category']))
+
+        run("recommender.recommend", lambda: [recommender.recommend(classic_sim, q, 10) for q in queries])
+        flavor_table = run("NeighborTable.build", lambda: NeighborTable.build(flavor_sim, vocabulary), repeat=1)
+        run("recommender.recommend_innovative (neighbors)",
+            lambda: [recommender.recommend_innovative(flavor_sim, q, 10, category_map, flavor_table) for q in queries])
+        combo_index = run("ClassicComboIndex.build", lambda: ClassicComboIndex.build(recipes, classic_sim), repeat=1)
+
+        app_data = _app_data(ingr_info, embedding_store, classic_sim, flavor_sim, multimodal_sim, combo_index)
+
+        def recommend_all(mode):
+            return [get_recommendations(mode, ",".join(q), top_n=10, username=None, db=None, app_data=app_data) for q in queries]
+
+        run("get_recommendations[classic]", lambda: recommend_all('classic'))
+        run("get_recommendations[innovative]", lambda: recommend_all('innovative'))
+        pairs = [(q[0], queries[(i + 1) % len(queries)][0]) for i, q in enumerate(queries)]
+        run("find_creative_pivot (find-bridge, 2 steps)",
+            lambda: [find_bridge_ingredients(a, b, steps=2, app_data=app_data) for a, b in pairs if a != b])
+    else:
+        for name in ["recommender.recommend", "NeighborTable.build", "recommender.recommend_innovative (neighbors)",
+                     "ClassicComboIndex.build", "get_recommendations[classic]", "get_recommendations[innovative]",
+                     "find_creative_pivot (find-bridge, 2 steps)"]:
+            results[name] = {"skipped": skip_reason}
+
+    run("RecipeStore.match + ingredient_counts", lambda: [
+        recipes.ingredient_counts(recipes.match(q[:2])) for q in queries
+    ])
+    pair_index = run("PairComplementIndex.build", lambda: PairComplementIndex.build(recipes), repeat=1)
+    pairs = [recipes.ids_for(q[:2]) for q in queries if len(q) >= 2]
+    run("PairComplementIndex.top_complements", lambda: [pair_index.top_complements(a, b, (), 5) for a, b in pairs])
+    run("EmbeddingStore.score (50 queries)", lambda: embedding_store.score(embedding_store.unit[:50]))
+
+    return {
+        "n_ingredients": n_ingredients,
+        "n_recipes": n_recipes,
+        "n_queries": len(queries),
+        "top_k": args.top_k,
+        "similarity_mb": similarity_mb,
+        "recipe_store_mb": round(recipes.nbytes / 2 ** 20, 2),
+        "results": results,
+    }
+
+
+def _embedding_blocks(embedding_store: EmbeddingStore):
+    step = default_block_rows(len(embedding_store))
+    for start in range(0, len(embedding_store), step):
+        yield start, embedding_store.score(embedding_store.unit[start:start + step], invalid_value=0.0)
+
+
+def _app_data(ingr_info, embedding_store, classic_sim, flavor_sim, multimodal_sim, combo_index) -> dict:
+    """接口函数所需的最小 app_data；结果缓存容量为 0，每次都真正计算。"""
+    names = embedding_store.names
+    category_map = dict(zip(ingr_info['name'], ingr_info['category']))
+    categories = np.array([category_map.get(name) for name in names], dtype=object)
+    readiness.register(['ingredients', 'embeddings', 'classic', 'flavor', 'multimodal', 'innovative'])
+    for name in ['ingredients', 'embeddings', 'classic', 'flavor', 'multimodal', 'innovative']:
+        readiness.mark_ready(name)
+    return {
+        'bundle_version': 'bench',
+        'result_cache': ResultCache(max_entries=0),
+        'name_resolver': NameResolver({}, names, [], {}),
+        'canonical_to_zh_map': {},
+        'canonical_to_base_map': {},
+        'ingr_to_category_map': category_map,
+        'ingredient_categories': categories,
+        'name_to_idx_map': {name: i for i, name in enumerate(names)},
+        'idx_to_name_map': dict(enumerate(names)),
+        'embedding_store': embedding_store,
+        'classic_sim': classic_sim,
+        'innovative_sim': flavor_sim,
+        'multimodal_sim': multimodal_sim,
+        'classic_combo_index': combo_index,
+        'innovative_scorer': InnovativeScorer(flavor_sim, multimodal_sim, names, categories),
+    }
+
+
+# --- 与原实现的一致性检查 ---
+
+def reference_flavor_similarity(ingr_comp: dict, ingr_info: pd.DataFrame) -> np.ndarray:
+    """原先逐对计算集合 Jaccard 的实现 (去掉了 DataFrame.loc 写入)，只用于小规模对比。"""
+    ids = ingr_info['id'].tolist()
+    result = np.zeros((len(ids), len(ids)), dtype=np.float32)
+    for i, id1 in enumerate(ids):
+        set1 = ingr_comp.get(id1, set())
+        for j in range(i + 1, len(ids)):
+            set2 = ingr_comp.get(ids[j], set())
+            intersection = len(set1 & set2)
+            if intersection:
+                result[i, j] = result[j, i] = intersection / len(set1 | set2)
+    np.fill_diagonal(result, 1.0)
+    return result
+
+
+def reference_cooccurrence_similarity(recipes: RecipeStore, ingr_info: pd.DataFrame) -> np.ndarray:
+    """原先的实现: 长格式列表 -> pd.crosstab 得到稠密的 食谱 x 食材 矩阵 -> sklearn 余弦相似度。"""
+    from sklearn.metrics.pairwise import cosine_similarity
+    names = ingr_info['name'].tolist()
+    pairs = pd.DataFrame([(recipe_idx, name) for recipe_idx, recipe in enumerate(recipes) for name in recipe],
+                         columns=['recipe_idx', 'ingredient_name'])
+    matrix = pd.crosstab(pairs['recipe_idx'], pairs['ingredient_name']).reindex(columns=names, fill_value=0)
+    return cosine_similarity(matrix.T)
+
+
+def reference_classic_combinations(recipes: RecipeStore, classic_sim: SimilarityMatrix, anchors: list, excludes: list, top_n: int) -> list:
+    """原先 /recommend?mode=classic 的逐食谱打分: 匹配食谱 -> 两两平均相似度 -> 排序 -> 按食材集合去重。"""
+    scored = []
+    for recipe_id in recipes.match(set(anchors), set(excludes)):
+        recipe_set = recipes[recipe_id]
+        if len(recipe_set) > 10 or len(recipe_set) <= len(set(anchors)):
+            continue
+        pair_scores = [classic_sim.value(a, b) for a, b in itertools.combinations(recipe_set, 2) if a in classic_sim and b in classic_sim]
+        average = sum(pair_scores) / len(pair_scores) if pair_scores else 0
+        if average > 0:
+            scored.append((frozenset(recipe_set), average))
+    unique, seen = [], set()
+    for combination, score in sorted(scored, key=lambda item: item[1], reverse=True):
+        if combination not in seen:
+            unique.append((combination, score))
+            seen.add(combination)
+    return unique[:top_n]
+
+
+def _write_recipe_files(recipes: RecipeStore, data_path: Path):
+    """按原始数据的格式 (地区\t食材名...，食材名中的下划线写成空格) 写出食谱文件，供流式版本读取。"""
+    recipes_path = data_path / "scirep-cuisines-detail"
+    recipes_path.mkdir(parents=True)
+    with open(recipes_path / RECIPE_FILES[0], 'w', encoding='utf-8') as f:
+        for recipe in recipes:
+            f.write("\t".join(["synthetic"] + [name.replace('_', ' ') for name in sorted(recipe)]) + "\n")
+    for file_name in RECIPE_FILES[1:]:
+        (recipes_path / file_name).touch()
+
+
+def check_scale(n_ingredients: int, n_recipes: int, args) -> bool:
+    """新实现与原实现在合成数据上的最大绝对误差；超过容差时返回 False。"""
+    print(f"\n=== 一致性检查: {n_ingredients} 种食材 x {n_recipes} 份食谱 ===")
+    data = make_dataset(n_ingredients, n_recipes, args.seed)
+    ingr_info = data['ingr_info']
+    checks = []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        flavor_expected = reference_flavor_similarity(data['ingr_comp'], ingr_info)
+        checks.append(("calculate_flavor_similarity", flavor_expected,
+                       calculate_flavor_similarity(data['ingr_comp'], ingr_info), 0.0))
+        checks.append(("calculate_flavor_similarity (block_size=64)", flavor_expected,
+                       calculate_flavor_similarity(data['ingr_comp'], ingr_info, block_size=64), 0.0))
+
+        # 余弦在 float64 下计算后转为 float32 保存，容差取 float32 的舍入误差
+        recipes = data['recipes']
+        cooccurrence_expected = reference_cooccurrence_similarity(recipes, ingr_info)
+        checks.append(("calculate_cooccurrence_similarity (RecipeStore)", cooccurrence_expected,
+                       calculate_cooccurrence_similarity(recipes, ingr_info), 1e-6))
+        checks.append(("calculate_cooccurrence_similarity (食谱集合列表)", cooccurrence_expected,
+                       calculate_cooccurrence_similarity(list(recipes), ingr_info), 1e-6))
+        with tempfile.TemporaryDirectory() as tmp:
+            _write_recipe_files(recipes, Path(tmp))
+            checks.append(("calculate_cooccurrence_similarity_streaming", cooccurrence_expected,
+                           calculate_cooccurrence_similarity_streaming(Path(tmp), ingr_info, chunk_size=1000), 1e-6))
+
+        # 内存映射格式: 旧版 .feather 缓存的转换与保存后重新打开都应逐位一致 (按标签对齐，标签不符时误差为 NaN)，
+        # 按标签求和与原先的 df.loc[labels].sum() 一致
+        classic_df = calculate_cooccurrence_similarity(recipes, ingr_info)
+        labels = classic_df.index
+        with tempfile.TemporaryDirectory() as tmp:
+            classic_df.reset_index().to_feather(Path(tmp) / "legacy.feather")
+            converted = load_or_build_similarity_matrix(Path(tmp) / "legacy", build=None)
+            checks.append(("SimilarityMatrix (由 .feather 缓存转换)", classic_df.values,
+                           converted.to_frame().reindex(index=labels, columns=labels).values, 0.0))
+            save_similarity_matrix(classic_df, Path(tmp) / "saved")
+            saved = load_similarity_matrix(Path(tmp) / "saved")
+            checks.append(("save_similarity_matrix + load_similarity_matrix", classic_df.values,
+                           saved.to_frame().reindex(index=labels, columns=labels).values, 0.0))
+            checks.append(("SimilarityMatrix.sum_rows", np.array([classic_df.loc[q].sum().values for q in data['queries']]),
+                           np.array([saved.sum_rows(q).reindex(labels).values for q in data['queries']]), 1e-6))
+
+            # 经典组合: 预计算索引的 top_n 与原先逐食谱打分的结果 (组合顺序与得分) 一致；组合不同时误差记为 inf
+            combo_index = ClassicComboIndex.build(recipes, saved)
+            expected_scores, actual_scores = [], []
+            for i, anchors in enumerate(data['queries']):
+                excludes = [name for name in data['queries'][(i + 1) % len(data['queries'])][:1] if name not in anchors]
+                expected = reference_classic_combinations(recipes, saved, anchors, excludes, 10)
+                actual = [(frozenset(combination), score) for combination, score in combo_index.top_n(anchors, excludes, 10)]
+                same = [c for c, _ in expected] == [c for c, _ in actual]
+                expected_scores += [s for _, s in expected] if same else [0.0]
+                actual_scores += [s for _, s in actual] if same else [np.inf]
+            checks.append(("ClassicComboIndex.top_n", np.array(expected_scores), np.array(actual_scores), 1e-9))
+
+    ok = True
+    for name, expected, actual, tolerance in checks:
+        error = float(np.max(np.abs(np.asarray(actual, dtype=np.float64) - expected)))
+        passed = error <= tolerance
+        ok &= passed
+        print(f"{name}: 最大误差 {error:.3g} ({'通过' if passed else f'超过容差 {tolerance:g}'})")
+    return ok
+
+
+# --- 输出与对比 ---
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(previous: dict, current: dict):
+    """按 (规模, 基准名) 打印两次运行的耗时比值。"""
+    def index(report):
+        return {(s["n_ingredients"], s["n_recipes"], name): entry
+                for s in report["scales"] for name, entry in s["results"].items()}
+    before, after = index(previous), index(current)
+    print(f"\n{'规模':>16}  {'基准':<48} {'之前':>10} {'现在':>10} {'比值':>7}")
+    for key, entry in after.items():
+        old = before.get(key)
+        if old is None or "seconds" not in old or "seconds" not in entry:
+            continue
+        ratio = entry["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        print(f"{key[0]:>7}x{key[1]:<8}  {key[2]:<48} {old['seconds'] * 1000:>8.2f}ms {entry['seconds'] * 1000:>8.2f}ms {ratio:>6.2f}x")
+
+
+def parse_scale(text: str):
+    try:
+        n_ingredients, n_recipes = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"规模格式应为 <食材数>x<食谱数>，例如 1000x50000: {text}")
+    return n_ingredients, n_recipes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相似度与推荐引擎的规模基准")
+    parser.add_argument("--scale", type=parse_scale, action="append", help="<食材数>x<食谱数>，可重复；默认 1000x50000")
+    parser.add_argument("--repeat", type=int, default=3, help="每个基准的计时次数，取中位数")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="不测量峰值内存 (省去一次额外运行)")
+    parser.add_argument("--max-dense-gb", type=float, default=4.0, help="允许的 N x N 稠密矩阵内存上限")
+    parser.add_argument("--top-k", type=int, default=0, help="大于 0 时使用每行 top-K 的稀疏相似度矩阵")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="结果写入的 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--check", action="store_true", help="只检查稀疏实现与原先的稠密实现结果一致 (默认规模 300x5000)")
+    args = parser.parse_args()
+
+    if args.check:
+        results = [check_scale(n_ingredients, n_recipes, args) for n_ingredients, n_recipes in args.scale or [(300, 5000)]]
+        return 0 if all(results) else 1
+
+    report = {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "environment": environment(),
+        "scales": [bench_scale(n_ingredients, n_recipes, args) for n_ingredients, n_recipes in args.scale or [(1000, 50000)]],
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
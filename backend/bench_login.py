@@ -0,0 +1,134 @@
+"""
+登录压力下的推荐延迟基准。
+
+先单独测推荐接口的延迟作为基线，再在持续注册/登录的同时重复测量，
+输出登录吞吐量与推荐延迟的 p50/p95/p99。需要先启动服务端。
+
+用法 (在 backend 目录下):
+    python bench_login.py --base-url http://127.0.0.1:8000
+    python bench_login.py --logins 200 --login-concurrency 32 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+INGREDIENTS = [
+    "garlic", "onion", "tomato", "basil", "beef", "chicken", "potato", "carrot", "ginger", "lemon",
+    "butter", "cream", "strawberry", "apple", "pork", "shrimp", "mushroom", "rice", "egg", "cheese",
+]
+
+
+def percentiles(latencies) -> dict:
+    if not latencies:
+        return {}
+    values = np.array(latencies) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+async def recommend_load(client: httpx.AsyncClient, stop: asyncio.Event, concurrency: int, rng: random.Random):
+    """持续发送推荐请求直到 stop 被设置；每次换一组参数，避免命中结果缓存。"""
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while not stop.is_set():
+            params = {
+                "mode": rng.choice(["classic", "innovative"]),
+                "ingredients": ",".join(rng.sample(INGREDIENTS, 2)),
+                "top_n": rng.randint(5, 40),
+            }
+            start = time.perf_counter()
+            response = await client.get("/api/recommend", params=params)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def login_storm(client: httpx.AsyncClient, total: int, concurrency: int):
+    """注册 total 个新用户，再用同样的密码各登录一次 (两次 bcrypt)。"""
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(f"bench-{uuid.uuid4().hex[:12]}")
+    status_counts = {}
+
+    async def worker():
+        while not queue.empty():
+            username = queue.get_nowait()
+            for _ in range(2):
+                response = await client.post("/api/users/login", json={"username": username, "password": "bench-password"})
+                status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, status_counts
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.rec_concurrency + args.login_concurrency + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        (await client.get("/health/ready")).raise_for_status()
+
+        # 基线: 没有登录请求时的推荐延迟
+        stop = asyncio.Event()
+        baseline = asyncio.create_task(recommend_load(client, stop, args.rec_concurrency, rng))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        baseline_latencies, baseline_errors = await baseline
+
+        # 登录风暴期间的推荐延迟
+        stop = asyncio.Event()
+        loaded = asyncio.create_task(recommend_load(client, stop, args.rec_concurrency, rng))
+        login_seconds, status_counts = await login_storm(client, args.logins, args.login_concurrency)
+        stop.set()
+        loaded_latencies, loaded_errors = await loaded
+
+    login_requests = sum(status_counts.values())
+    return {
+        "base_url": args.base_url,
+        "login": {
+            "requests": login_requests,
+            "seconds": round(login_seconds, 3),
+            "per_second": round(login_requests / login_seconds, 2),
+            "status_counts": {str(k): v for k, v in sorted(status_counts.items())},
+        },
+        "recommend_baseline": {**percentiles(baseline_latencies), "errors": baseline_errors},
+        "recommend_during_logins": {**percentiles(loaded_latencies), "errors": loaded_errors},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录压力下的推荐延迟基准")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--logins", type=int, default=100, help="注册的新用户数 (每个用户注册 + 登录各一次)")
+    parser.add_argument("--login-concurrency", type=int, default=16)
+    parser.add_argument("--rec-concurrency", type=int, default=4)
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="把结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+离线构建预计算产物 (解析后的数据包、经典/风味/多模态相似度矩阵及其 Top-K 近邻表)。
+
+每个产物的输入文件指纹记录在 cache/manifest.json 中，只重建输入有变化的产物，
+三个矩阵在独立进程中并行计算。服务端启动时只核对清单，不再在线计算。
+
+用法 (在 backend 目录下):
+    python build_artifacts.py              # 增量构建
+    python build_artifacts.py --check      # 只检查，不构建
+    python build_artifacts.py --force classic flavor
+    python build_artifacts.py --top-k 200    # 每行只保留 top-200 的稀疏矩阵 (很大的食材表)，服务端需设置相同的 SIMILARITY_TOP_K
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.artifacts import (
+    ARTIFACTS, CACHE_DIR, artifact_problems, compute_artifact, load_manifest, open_dataset_bundle, record_artifact,
+    similarity_top_k,
+)
+from src.dataloader import recipe_vocabulary
+from src.matrix_store import load_similarity_matrix
+from src.neighbors import load_or_build_neighbor_table
+
+
+def stale_artifacts(names, top_k):
+    manifest = load_manifest()
+    stale = {}
+    for name in names:
+        problems = artifact_problems(name, manifest, top_k)
+        if problems:
+            stale[name] = problems
+    return stale
+
+
+def build_neighbor_tables(names, bundle, top_k):
+    """近邻表以矩阵文件的标记判断新旧，矩阵没变时直接复用。"""
+    ingr_info, _, _ = bundle.ingredient_data()
+    vocabulary = recipe_vocabulary(ingr_info)
+    for name in names:
+        matrix_path, _ = ARTIFACTS[name]
+        matrix = load_similarity_matrix(matrix_path, sparse=top_k > 0)
+        load_or_build_neighbor_table(CACHE_DIR / f"neighbors_{name}.npz", matrix, matrix_path, vocabulary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建相似度矩阵等预计算产物")
+    parser.add_argument("artifacts", nargs="*", help=f"要处理的产物 ({', '.join(ARTIFACTS)})，默认全部")
+    parser.add_argument("--force", action="store_true", help="忽略清单，强制重建")
+    parser.add_argument("--check", action="store_true", help="只检查产物是否最新，有过期产物时返回非零退出码")
+    parser.add_argument("--jobs", type=int, default=len(ARTIFACTS), help="并行构建的进程数")
+    parser.add_argument("--top-k", type=int, default=similarity_top_k(),
+                        help="大于 0 时每行只保留 top-K 的稀疏矩阵，默认取 SIMILARITY_TOP_K (0 为稠密矩阵)")
+    args = parser.parse_args()
+
+    names = args.artifacts or list(ARTIFACTS)
+    unknown = [name for name in names if name not in ARTIFACTS]
+    if unknown:
+        parser.error(f"未知的产物: {', '.join(unknown)}")
+    CACHE_DIR.mkdir(exist_ok=True)
+
+    stale = {name: ["--force"] for name in names} if args.force else stale_artifacts(names, args.top_k)
+    for name in names:
+        print(f"{name}: {'; '.join(stale[name]) if name in stale else '已是最新'}")
+    if args.check:
+        sys.exit(1 if stale else 0)
+
+    # 先在主进程中准备好数据包，各构建进程直接读取，不再重复解析原始文件
+    bundle = open_dataset_bundle(rebuild=args.force)
+
+    if stale:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(stale)))) as executor:
+            futures = {executor.submit(compute_artifact, name, None, args.top_k): name for name in stale}
+            for future in as_completed(futures):
+                # 清单只由主进程写入，多个构建进程不会互相覆盖
+                name, inputs, top_k = future.result()
+                record_artifact(name, inputs, top_k=top_k)
+                print(f"--- {futures[future]} 构建完成 ({time.perf_counter() - start:.1f}s) ---")
+
+    build_neighbor_tables(names, bundle, args.top_k)
+    print("--- 所有产物均已是最新 ---")
+
+
+if __name__ == "__main__":
+    main()
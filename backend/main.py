@@ -3,7 +3,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.core.lifespan import lifespan
-from src.api import users, recommend, creative, recipes
+from src.core.metrics import MetricsMiddleware
+from src.api import users, recommend, creative, recipes, health, metrics, admin
 
 # FastAPI 实例
 app = FastAPI(
@@ -21,13 +22,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 按路由记录请求耗时，导出于 /metrics
+app.add_middleware(MetricsMiddleware)
 
 # 路由模块
 print("正在加载API路由...")
+app.include_router(health.router)
+app.include_router(metrics.router)
 app.include_router(users.router)
 app.include_router(recommend.router)
 app.include_router(creative.router)
 app.include_router(recipes.router)
+app.include_router(admin.router)
 print("所有API路由加载完毕。")
 
 # 根路径用于测试
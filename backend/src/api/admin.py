@@ -0,0 +1,40 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+
+from ..core.readiness import readiness, LOADING, PENDING
+from ..core.snapshots import snapshots
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """管理接口要求请求头 X-Admin-Token 与环境变量 ADMIN_TOKEN 一致；未设置 ADMIN_TOKEN 时管理接口全部禁用。"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected or not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="需要有效的管理令牌。")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)]
+)
+
+
+@router.get("/data")
+def data_status():
+    """当前数据快照、等待释放的旧快照，以及最近一次重载的进度。"""
+    return snapshots.status()
+
+
+@router.post("/reload", status_code=202)
+async def reload_data():
+    """
+    在后台重新加载全部数据子系统 (数据包、翻译、嵌入、相似度矩阵与近邻表) 并生成新快照，
+    全部成功后原子切换，切换前开始的请求继续使用旧快照。进度见 GET /admin/data。
+    """
+    if any(entry.get("state") in (PENDING, LOADING) for entry in readiness.snapshot().values()):
+        raise HTTPException(status_code=409, detail="数据仍在首次加载，请稍后再试。")
+    if not snapshots.start_reload():
+        raise HTTPException(status_code=409, detail="已有重载正在进行。")
+    return snapshots.status()
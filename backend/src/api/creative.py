@@ -1,13 +1,12 @@
 
 import re
-import json
 import numpy as np
-import pandas as pd
-import google.generativeai as genai
 from fastapi import APIRouter, Depends, HTTPException
-from sklearn.metrics.pairwise import cosine_similarity
 
 from ..core.dependencies import get_app_data
+from ..core.metrics import span
+from ..core.readiness import readiness, requires
+from ..core.warmup import data_version
 from ..services import helpers
 from ..schemas.main_schemas import CombinationPayload
 
@@ -18,7 +17,7 @@ router = APIRouter(
 )
 
 
-@router.get("/alchemy")
+@router.get("/alchemy", dependencies=[Depends(requires("ingredients", "embeddings"))])
 def perform_alchemy(
     base: str,
     add: str = "",
@@ -33,38 +32,57 @@ def perform_alchemy(
     add_ingredients_input = [s.strip().lower() for s in re.split('[,，]', add) if s.strip()]
     subtract_ingredients_input = [s.strip().lower() for s in re.split('[,，]', subtract) if s.strip()]
 
-    try:
-        target_vec, base_canonical = helpers.get_vector_by_name(base_ingredient_input, app_data)
-        target_vec = target_vec.copy()
+    # 基础、加、减食材一次性解析，每个名称只解析一次
+    all_inputs = [base_ingredient_input] + add_ingredients_input + subtract_ingredients_input
+    resolved = helpers.require_resolved(all_inputs, helpers.resolve_names(all_inputs, app_data))
+    base_canonical = resolved[0]
+    added_canonicals = resolved[1:1 + len(add_ingredients_input)]
+    subtracted_canonicals = resolved[1 + len(add_ingredients_input):]
 
-        added_canonicals = [helpers.get_vector_by_name(ingr, app_data)[1] for ingr in add_ingredients_input]
-        subtracted_canonicals = [helpers.get_vector_by_name(ingr, app_data)[1] for ingr in subtract_ingredients_input]
-
-        for ingr in add_ingredients_input:
-            target_vec += helpers.get_vector_by_name(ingr, app_data)[0]
-        for ingr in subtract_ingredients_input:
-            target_vec -= helpers.get_vector_by_name(ingr, app_data)[0]
-    except HTTPException as e:
-        raise HTTPException(status_code=404, detail=e.detail)
-
-    similarities = cosine_similarity([target_vec], app_data['aligned_embeddings'])[0]
-    sim_series = pd.Series(similarities, index=app_data['name_to_idx_map'].keys())
-
-    exclude_ingredients = {base_canonical} | set(added_canonicals) | set(subtracted_canonicals)
-    sim_series.drop(labels=exclude_ingredients, inplace=True, errors='ignore')
-
-    top_results = sim_series.nlargest(top_n)
-
-    recommendations_zh = [{"ingredient": app_data['canonical_to_zh_map'].get(name, name), "score": score} for name, score in top_results.items()]
     operation_details = {
         "base": app_data['canonical_to_zh_map'].get(base_canonical, base_canonical),
         "add": [app_data['canonical_to_zh_map'].get(c, c) for c in added_canonicals],
         "subtract": [app_data['canonical_to_zh_map'].get(c, c) for c in subtracted_canonicals]
     }
+
+    # 加减的先后顺序不影响结果，重复的食材会被重复加减，因此键里保留排序后的完整列表
+    result_cache = app_data['result_cache']
+    cache_key = result_cache.key(
+        'alchemy', data_version(app_data), base_canonical,
+        sorted(added_canonicals), sorted(subtracted_canonicals), top_n
+    )
+    recommendations_zh = result_cache.get(cache_key)
+    if recommendations_zh is None:
+        with span("alchemy.score"):
+            recommendations_zh = _alchemy_recommendations(app_data, base_canonical, added_canonicals, subtracted_canonicals, top_n)
+        result_cache.set(cache_key, recommendations_zh)
     return {"operation": operation_details, "recommendations": recommendations_zh}
 
 
-@router.get("/find-bridge")
+def _alchemy_recommendations(app_data: dict, base_canonical: str, added_canonicals: list, subtracted_canonicals: list, top_n: int) -> list:
+    embedding_store = app_data['embedding_store']
+    target_vec = embedding_store.vector(base_canonical).copy()
+    for canonical_name in added_canonicals:
+        target_vec += embedding_store.vector(canonical_name)
+    for canonical_name in subtracted_canonicals:
+        target_vec -= embedding_store.vector(canonical_name)
+
+    similarities = embedding_store.score(target_vec)
+
+    exclude_ingredients = {base_canonical} | set(added_canonicals) | set(subtracted_canonicals)
+    exclude_indices = [embedding_store.name_to_idx[name] for name in exclude_ingredients if name in embedding_store.name_to_idx]
+    similarities[exclude_indices] = -np.inf
+
+    # 未对齐的食材分数为 -inf，不会出现在结果中
+    top_indices = [i for i in np.argsort(-similarities, kind='stable')[:top_n] if np.isfinite(similarities[i])]
+
+    return [
+        {"ingredient": app_data['canonical_to_zh_map'].get(embedding_store.names[i], embedding_store.names[i]), "score": float(similarities[i])}
+        for i in top_indices
+    ]
+
+
+@router.get("/find-bridge", dependencies=[Depends(requires("ingredients", "embeddings"))])
 def find_bridge_ingredients(
     start: str,
     end: str,
@@ -76,77 +94,68 @@ def find_bridge_ingredients(
     if not 1 <= steps <= 3:
         raise HTTPException(status_code=400, detail="桥梁数量必须在1到3之间。")
 
-    try:
-        start_vec, start_canonical = helpers.get_vector_by_name(start, app_data)
-        end_vec, end_canonical = helpers.get_vector_by_name(end, app_data)
-    except HTTPException as e:
-        raise HTTPException(status_code=404, detail=e.detail)
+    start_canonical, end_canonical = helpers.require_resolved(
+        [start, end], helpers.resolve_names([start, end], app_data)
+    )
+    result_cache = app_data['result_cache']
+    cache_key = result_cache.key('find-bridge', data_version(app_data), start_canonical, end_canonical, steps)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    embedding_store = app_data['embedding_store']
+    start_vec, end_vec = embedding_store.vector(start_canonical), embedding_store.vector(end_canonical)
 
     def find_creative_pivot(vec1, canon1, vec2, canon2, exclude_canonicals, creativity_factor=1.5):
         cat1 = app_data['ingr_to_category_map'].get(canon1)
         cat2 = app_data['ingr_to_category_map'].get(canon2)
         
-        sim_to_vec1 = cosine_similarity([vec1], app_data['aligned_embeddings'])[0]
-        sim_to_vec2 = cosine_similarity([vec2], app_data['aligned_embeddings'])[0]
+        # 两个端点一次矩阵乘法完成打分
+        sim_to_vec1, sim_to_vec2 = embedding_store.score(np.stack([vec1, vec2]), invalid_value=0.0)
         sim_to_vec1[sim_to_vec1 < 0] = 0
         sim_to_vec2[sim_to_vec2 < 0] = 0
         
         pivot_scores = sim_to_vec1 * sim_to_vec2
-        bonus = np.ones_like(pivot_scores)
-        for i, name in enumerate(app_data['idx_to_name_map'].values()):
-            candidate_cat = app_data['ingr_to_category_map'].get(name)
-            if candidate_cat not in [cat1, cat2]:
-                bonus[i] = creativity_factor
+        categories = app_data['ingredient_categories']
+        bonus = np.where((categories != cat1) & (categories != cat2), creativity_factor, 1.0)
         
         creative_scores = pivot_scores * bonus
         exclude_indices = [app_data['name_to_idx_map'][name] for name in exclude_canonicals if name in app_data['name_to_idx_map']]
         
         creative_scores[exclude_indices] = -1
+        # 未对齐的食材不能作为桥梁
+        creative_scores[~embedding_store.valid] = -1
         best_pivot_idx = np.argmax(creative_scores)
         return app_data['idx_to_name_map'][best_pivot_idx]
 
-    path_en = [start_canonical]
-    current_vec, current_canonical = start_vec, start_canonical
-    for _ in range(steps):
-        exclude_set = set(path_en) | {end_canonical}
-        pivot = find_creative_pivot(current_vec, current_canonical, end_vec, end_canonical, exclude_set)
-        path_en.append(pivot)
-        current_vec, current_canonical = helpers.get_vector_by_name(pivot, app_data)
+    with span("find_bridge.search"):
+        path_en = [start_canonical]
+        current_vec, current_canonical = start_vec, start_canonical
+        for _ in range(steps):
+            exclude_set = set(path_en) | {end_canonical}
+            pivot = find_creative_pivot(current_vec, current_canonical, end_vec, end_canonical, exclude_set)
+            path_en.append(pivot)
+            current_vec, current_canonical = embedding_store.vector(pivot), pivot
 
     path_en.append(end_canonical)
     unique_path_en = list(dict.fromkeys(path_en))
     path_zh = [app_data['canonical_to_zh_map'].get(name, name) for name in unique_path_en]
-    return {"path": path_zh}
+    result = {"path": path_zh}
+    result_cache.set(cache_key, result)
+    return result
 
 
 @router.post("/generate-concept")
-def generate_concept_api(payload: CombinationPayload):
+async def generate_concept_api(payload: CombinationPayload, app_data: dict = Depends(get_app_data)):
     ingredients = payload.combination
     if not ingredients or len(ingredients) < 2:
         raise HTTPException(status_code=400, detail="请至少提供两种食材来生成概念。")
 
-    try:
-        model = genai.GenerativeModel('gemini-2.5-flash-lite')
-        prompt = f"""
-        你是一位富有创意的顶级大厨。请为以下食材组合设计一个菜谱概念。
-        食材: {', '.join(ingredients)}
-
-        请严格按照以下JSON格式返回，不要包含任何markdown标记 (例如 ```json) 或其他解释性文字，只返回纯粹的JSON对象：
-        {{
-          "dish_name": "一个富有创意的菜名",
-          "description": "一句引人入胜的描述，说明这些食材如何协同工作，不超过100字",
-          "key_steps": ["关键步骤1", "关键步骤2", "关键步骤3"],
-          "flavor_profile": "总结这道菜的风味亮点，用3-4个词，以逗号分隔"
-        }}
-        """
-        response = model.generate_content(prompt)
-        cleaned_response_text = response.text.strip().replace("```json", "").replace("```", "")
-        concept_data = json.loads(cleaned_response_text)
-        return concept_data
-    except json.JSONDecodeError:
-        print(f"Gemini API返回了非JSON格式的内容: {response.text}")
-        raise HTTPException(status_code=500, detail="AI服务返回格式错误，请稍后再试。")
-    except Exception as e:
-        print(f"调用Gemini API时出错: {e}")
-        raise HTTPException(status_code=500, detail="无法连接AI服务，请稍后再试。")
-    
\ No newline at end of file
+    # 缓存键使用规范名，"大蒜" 与 "garlic" 共用同一个概念；食材表尚未加载或无法识别时按原名
+    canonical_names = [name.strip().lower() for name in ingredients]
+    if readiness.is_ready('ingredients'):
+        resolved = helpers.resolve_names(canonical_names, app_data)
+        canonical_names = [canonical or name for canonical, name in zip(resolved, canonical_names)]
+
+    with span("concept.generate"):
+        return await app_data['concept_service'].generate(ingredients, canonical_names)
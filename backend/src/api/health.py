@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from ..core.readiness import readiness, RETRY_AFTER_SECONDS
+from ..core.snapshots import snapshots
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Health"]
+)
+
+
+@router.get("/live")
+def liveness():
+    """进程存活即返回 200，不依赖任何数据加载。"""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+def readiness_probe():
+    """全部子系统就绪时返回 200，否则返回 503 与各子系统状态；都附带当前数据快照的版本。"""
+    subsystems = readiness.snapshot()
+    snapshot = snapshots.current.info() if snapshots.current else None
+    if readiness.all_ready():
+        return {"status": "ready", "subsystems": subsystems, "snapshot": snapshot}
+    return JSONResponse(
+        status_code=503,
+        content={"status": "loading", "subsystems": subsystems, "snapshot": snapshot},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
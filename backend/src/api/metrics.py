@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from ..core.dependencies import get_app_data
+from ..core.metrics import registry, render_family
+from ..core.readiness import readiness, READY
+from ..core.snapshots import snapshots
+
+router = APIRouter(tags=["Metrics"])
+
+
+def _service_metrics(app_data: dict) -> list:
+    """各服务自己维护的统计，抓取时读取一次快照。尚未加载的服务不输出。"""
+    caches = {}
+    if 'result_cache' in app_data:
+        caches['result'] = app_data['result_cache']
+    if 'concept_service' in app_data:
+        caches['concept'] = app_data['concept_service'].cache
+    if 'recipe_search' in app_data:
+        caches['recipes'] = app_data['recipe_search'].cache
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+
+    lines = render_family(
+        "app_cache_events_total", "counter", "结果缓存的命中、未命中与淘汰次数",
+        [({"cache": name, "event": event}, value)
+         for name, stats in cache_stats.items() for event, value in stats.items() if event != "size"]
+    )
+    lines += render_family(
+        "app_cache_entries", "gauge", "结果缓存当前的条目数",
+        [({"cache": name}, stats["size"]) for name, stats in cache_stats.items()]
+    )
+
+    if 'name_resolver' in app_data:
+        # exact 为精确匹配；fuzzy_zh / fuzzy_en 为回退到模糊匹配的次数
+        resolver_stats = app_data['name_resolver'].stats()
+        lines += render_family(
+            "app_name_resolver_total", "counter", "名称解析的缓存命中与匹配方式",
+            [({"outcome": outcome}, resolver_stats[outcome])
+             for outcome in ("hits", "negative_hits", "misses", "exact", "fuzzy_zh", "fuzzy_en", "failures")]
+        )
+
+    if 'taste_profiles' in app_data:
+        lines += render_family(
+            "app_taste_profile_total", "counter", "口味相似度缓存的命中/未命中与口味重建次数",
+            [({"event": event}, value) for event, value in dict(app_data['taste_profiles'].counters).items()]
+        )
+
+    if 'recipe_search' in app_data:
+        lines += render_family(
+            "app_recipe_source_open", "gauge", "菜谱来源的熔断器是否断开 (1 为断开或试探中)",
+            [({"source": name}, int(state["state"] != "closed"))
+             for name, state in app_data['recipe_search'].stats().items()]
+        )
+
+    # 当前快照 current="1"；重载后等待在途请求结束的旧快照 current="0"
+    lines += render_family(
+        "app_data_snapshot_active_requests", "gauge", "各数据快照上正在处理的请求数",
+        [({"generation": snapshot.generation, "data_version": snapshot.version, "current": int(snapshot is snapshots.current)}, snapshot.active)
+         for snapshot in snapshots.snapshots()]
+    )
+    lines += render_family(
+        "app_subsystem_ready", "gauge", "数据子系统是否已就绪",
+        [({"subsystem": name}, int(entry.get("state") == READY)) for name, entry in readiness.snapshot().items()]
+    )
+    return lines
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(app_data: dict = Depends(get_app_data)):
+    """Prometheus 文本格式的指标: 各路由的请求耗时、请求内各阶段耗时、缓存与名称解析统计。"""
+    body = registry.render() + "\n".join(_service_metrics(app_data)) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
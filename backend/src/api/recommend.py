@@ -1,15 +1,23 @@
 
+import math
 import re
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-from collections import Counter
-from itertools import combinations
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
 
 from ..core.dependencies import get_db, get_app_data
+from ..core.metrics import span
+from ..core.readiness import readiness, requires
+from ..core.warmup import data_version
+from ..innovative_scorer import DEFAULT_FLAVOR_WEIGHT, DEFAULT_MULTIMODAL_WEIGHT
+from ..neighbors import merge_top_n
 from ..services import helpers
 from ..database.models import User, Preference, LikedCombination
+from ..schemas.main_schemas import BatchRecommendPayload
+
+MAX_BATCH_QUERIES = 200
+PERSONALIZATION_WEIGHT = 0.35
 
 # 路由实例
 router = APIRouter(
@@ -17,7 +25,7 @@ router = APIRouter(
     tags=["Recommendation Engine"]
 )
 
-@router.get("/search-suggestions")
+@router.get("/search-suggestions", dependencies=[Depends(requires("ingredients"))])
 def get_search_suggestions(q: str, app_data: dict = Depends(get_app_data)):
     if not q:
         return {"suggestions": []}
@@ -27,6 +35,37 @@ def get_search_suggestions(q: str, app_data: dict = Depends(get_app_data)):
     return {"suggestions": [s[0] for s in suggestions]}
 
 
+def _check_weights(flavor_weight: float, multimodal_weight: float):
+    # inf 会让分数变为 inf/NaN，无法序列化为 JSON
+    weights = (flavor_weight, multimodal_weight)
+    if not all(math.isfinite(w) and w >= 0 for w in weights) or sum(weights) <= 0:
+        raise HTTPException(status_code=400, detail="风味/多模态权重必须为有限的非负数，且不能同时为 0。")
+
+
+def _innovative_from_neighbors(app_data: dict, anchor_ids: np.ndarray, blocked: np.ndarray, top_n: int, weights: tuple):
+    """
+    用风味/多模态近邻表合并出创新模式的 top-N (风味权重 * 风味 + 多模态权重 * 多模态)。
+    无法证明结果精确时返回 None，由调用方回退到完整行计算。
+    """
+    tables = app_data['neighbor_tables']
+    vocabulary = tables['flavor'].vocabulary
+    terms = [
+        (tables['flavor'], app_data['innovative_sim'], weights[0]),
+        (tables['multimodal'], app_data['multimodal_sim'], weights[1]),
+    ]
+    merged = merge_top_n([term for term in terms if term[2] > 0], anchor_ids, top_n, blocked)
+    if merged is None:
+        return None
+    positions, scores = merged
+    return [{"ingredient": vocabulary[p], "score": float(score)} for p, score in zip(positions, scores)]
+
+
+@router.get("/neighbors", dependencies=[Depends(requires("neighbors"))])
+def get_neighbor_tables(app_data: dict = Depends(get_app_data)):
+    """静态导出的 top-K 近邻表 (经典/风味/多模态)，供前端离线使用。"""
+    return FileResponse(app_data['neighbor_export_path'], media_type="application/json")
+
+
 @router.get("/recommend")
 def get_recommendations(
     mode: str,
@@ -34,6 +73,8 @@ def get_recommendations(
     exclude: str = "",
     top_n: int = 10,
     username: str = None,
+    flavor_weight: float = DEFAULT_FLAVOR_WEIGHT,
+    multimodal_weight: float = DEFAULT_MULTIMODAL_WEIGHT,
     db: Session = Depends(get_db),
     app_data: dict = Depends(get_app_data)
 ):
@@ -41,104 +82,110 @@ def get_recommendations(
     if not input_strings:
         raise HTTPException(status_code=400, detail="未提供任何有效的食材。")
 
+    # 只要求当前模式用到的数据已加载，其余子系统可以仍在后台预热
+    if mode == 'classic':
+        readiness.ensure('ingredients', 'classic')
+    elif mode == 'innovative':
+        _check_weights(flavor_weight, multimodal_weight)
+        readiness.ensure('ingredients', 'innovative', *(('embeddings',) if username else ()))
+    else:
+        # 在读取任何数据之前拒绝，预热期间也返回 400 而不是 KeyError
+        raise HTTPException(status_code=400, detail="模式无效。")
+
+    excluded_strings = [s.strip().lower() for s in re.split('[,，]', exclude) if s.strip()]
+
+    # 锚点与排除项一起解析，共用一次批量模糊匹配
+    resolved = helpers.resolve_names(input_strings + excluded_strings, app_data)
+    anchor_canonicals = helpers.require_resolved(input_strings, resolved[:len(input_strings)])
+
     anchor_ingredients_innovative = []
     translated_anchors_zh = []
 
-    for s in input_strings:
-        try:
-            _, canonical_name = helpers.get_vector_by_name(s, app_data)
-            if canonical_name not in anchor_ingredients_innovative:
-                anchor_ingredients_innovative.append(canonical_name)
-            zh_name = app_data['canonical_to_zh_map'].get(canonical_name, canonical_name)
-            if zh_name not in translated_anchors_zh:
-                translated_anchors_zh.append(zh_name)
-        except HTTPException as e:
-            raise HTTPException(status_code=404, detail=e.detail)
+    for canonical_name in anchor_canonicals:
+        if canonical_name not in anchor_ingredients_innovative:
+            anchor_ingredients_innovative.append(canonical_name)
+        zh_name = app_data['canonical_to_zh_map'].get(canonical_name, canonical_name)
+        if zh_name not in translated_anchors_zh:
+            translated_anchors_zh.append(zh_name)
 
     anchor_ingredients_classic = list(dict.fromkeys(
         app_data['canonical_to_base_map'].get(c, c) for c in anchor_ingredients_innovative
     ))
     
-    excluded_strings = [s.strip().lower() for s in re.split('[,，]', exclude) if s.strip()]
     excluded_canonicals_set = set()
-    for s in excluded_strings:
-        try:
-            _, canonical_name = helpers.get_vector_by_name(s, app_data)
-            excluded_canonicals_set.add(canonical_name)
-        except HTTPException:
+    for s, canonical_name in zip(excluded_strings, resolved[len(input_strings):]):
+        if canonical_name is None:
             print(f"警告: 无法识别要排除的食材 '{s}'，已跳过。")
-            pass
+            continue
+        excluded_canonicals_set.add(canonical_name)
+
+    taste_version, taste_similarity = None, None
+    if mode == 'innovative' and username:
+        taste_version, taste_similarity = helpers.get_user_taste_state(username, db, app_data)
+
+    # 结果只取决于规范化后的锚点/排除集合、参数与数据版本 (个性化时还有口味版本)；混合权重只影响创新模式
+    weights = (flavor_weight, multimodal_weight) if mode == 'innovative' else None
+    result_cache = app_data['result_cache']
+    cache_key = result_cache.key(
+        'recommend', data_version(app_data), mode, sorted(anchor_ingredients_innovative),
+        sorted(excluded_canonicals_set), top_n, taste_version, weights
+    )
+    recommendations_zh = result_cache.get(cache_key)
+    if recommendations_zh is None:
+        recommendations_zh = _compute_recommendations(
+            app_data, mode, anchor_ingredients_innovative, anchor_ingredients_classic,
+            excluded_canonicals_set, top_n, taste_similarity, weights
+        )
+        result_cache.set(cache_key, recommendations_zh, username=username if taste_version else None)
 
-    recommendations_en = []
+    with span("recommend.user_likes"):
+        user_preferences, liked_combo_signatures = _user_likes(username, db)
+
+    return {
+        "anchor_ingredients": translated_anchors_zh, 
+        "recommendations": recommendations_zh,
+        "liked_ingredients": list(user_preferences),
+        "liked_combinations": liked_combo_signatures
+    }
+
+
+def _compute_recommendations(
+    app_data: dict,
+    mode: str,
+    anchor_ingredients_innovative: list,
+    anchor_ingredients_classic: list,
+    excluded_canonicals_set: set,
+    top_n: int,
+    taste_similarity: np.ndarray = None,
+    weights: tuple = (DEFAULT_FLAVOR_WEIGHT, DEFAULT_MULTIMODAL_WEIGHT)
+) -> list:
+    """/recommend 的计算部分，返回已翻译成中文的推荐列表 (可 JSON 序列化，供结果缓存保存)。"""
+    recommendations_en = None
     
     if mode == 'classic':
-        anchor_canonicals_set = set(anchor_ingredients_classic)
-        matching_recipes = [
-            recipe for recipe in app_data['recipes']
-            if (isinstance(recipe, (set, list)) and
-                anchor_canonicals_set.issubset(recipe) and
-                not excluded_canonicals_set.intersection(recipe))
+        # 组合得分已在加载时预先算好，这里只做过滤和取前 N 个
+        with span("recommend.classic_filter"):
+            top_combinations = app_data['classic_combo_index'].top_n(
+                anchor_ingredients_classic, excluded_canonicals_set, top_n
+            )
+        recommendations_en = [
+            {"combination": combination, "score": score} for combination, score in top_combinations
         ]
-
-        scored_combinations = []
-        for recipe_set in matching_recipes:
-            if len(recipe_set) > 10 or len(recipe_set) <= len(anchor_canonicals_set):
-                continue
-            
-            total_score, pair_count = 0, 0
-            for ingr1, ingr2 in combinations(recipe_set, 2):
-                if ingr1 in app_data['classic_sim_df'].index and ingr2 in app_data['classic_sim_df'].index:
-                    try:
-                        score = app_data['classic_sim_df'].loc[ingr1, ingr2]
-                        total_score += score
-                        pair_count += 1
-                    except KeyError:
-                        continue
-            
-            average_score = total_score / pair_count if pair_count > 0 else 0
-            if average_score > 0:
-                scored_combinations.append({
-                    "combination": list(recipe_set),
-                    "score": average_score
-                })
-
-        sorted_combinations = sorted(scored_combinations, key=lambda x: x['score'], reverse=True)
-        
-        unique_combinations = []
-        seen_sets = set()
-        for item in sorted_combinations:
-            combination_frozenset = frozenset(item['combination'])
-            if combination_frozenset not in seen_sets:
-                unique_combinations.append(item)
-                seen_sets.add(combination_frozenset)
-        
-        recommendations_en = unique_combinations[:top_n]
     
     elif mode == 'innovative':
-        flavor_scores = app_data['innovative_sim_df'].loc[anchor_ingredients_innovative].sum()
-        multimodal_scores = app_data['multimodal_sim_df'].loc[anchor_ingredients_innovative].sum()
-        combined_scores = 0.6 * flavor_scores + 0.4 * multimodal_scores
-        
-        if username:
-            taste_vector = helpers.get_user_taste_vector(username, db, app_data)
-            if taste_vector is not None:
-                # ... (个性化逻辑不变)
-                taste_similarity = cosine_similarity([taste_vector], app_data['aligned_embeddings'])[0]
-                taste_scores = pd.Series(taste_similarity, index=app_data['name_to_idx_map'].keys())
-                personalization_weight = 0.35
-                combined_scores = (1 - personalization_weight) * combined_scores + personalization_weight * taste_scores
-
-        anchor_categories = {app_data['ingr_to_category_map'].get(ingr) for ingr in anchor_ingredients_innovative}
-        combined_scores.drop(anchor_ingredients_innovative, inplace=True, errors='ignore')
-        if excluded_canonicals_set:
-            combined_scores.drop(labels=excluded_canonicals_set, inplace=True, errors='ignore')
-        
-        valid_candidates = [
-            name for name in combined_scores.index 
-            if app_data['ingr_to_category_map'].get(name) not in anchor_categories
-        ]
-        top_results = combined_scores.loc[valid_candidates].nlargest(top_n)
-        recommendations_en = [{"ingredient": name, "score": score} for name, score in top_results.items()]
+        # 锚点、排除项与锚点同类食材在词表位置上屏蔽，两条路径共用同一个掩码
+        scorer = app_data['innovative_scorer']
+        anchor_ids = scorer.ids(anchor_ingredients_innovative)
+        blocked = scorer.blocked(anchor_ids, scorer.ids(excluded_canonicals_set))
+
+        if taste_similarity is None and readiness.is_ready('neighbors'):
+            # 非个性化请求只依赖锚点的近邻表，能证明结果精确时无需扫描完整行
+            with span("recommend.innovative_neighbors"):
+                recommendations_en = _innovative_from_neighbors(app_data, anchor_ids, blocked, top_n, weights)
+
+        if taste_similarity is not None or recommendations_en is None:
+            with span("recommend.innovative_scan"):
+                recommendations_en = _innovative_scan(scorer, anchor_ids, blocked, top_n, weights, taste_similarity)
     
     else:
         raise HTTPException(status_code=400, detail="模式无效。")
@@ -155,8 +202,19 @@ def get_recommendations(
             recommendations_zh[i]['combination_en'] = item['combination']
     else:
         recommendations_zh = [{"ingredient": app_data['canonical_to_zh_map'].get(item["ingredient"], item["ingredient"]), "score": item["score"]} for item in recommendations_en]
+    return recommendations_zh
+
+
+def _innovative_scan(scorer, anchor_ids: np.ndarray, blocked: np.ndarray, top_n: int, weights: tuple, taste_similarity: np.ndarray = None) -> list:
+    """扫描锚点的完整相似度行得到创新模式的 top-N (个性化请求或近邻表无法证明精确时使用)。"""
+    # 口味相似度已按用户口味版本缓存，按嵌入矩阵行序排列，与词表顺序一致
+    scores = scorer.scores(anchor_ids, *weights, taste_similarity, PERSONALIZATION_WEIGHT)
+    top_positions = scorer.top_n(scores, blocked, top_n)
+    return [{"ingredient": scorer.vocabulary[p], "score": float(scores[p])} for p in top_positions]
+
 
-    # 用户偏好
+def _user_likes(username: str, db: Session):
+    """用户点赞的食材集合与组合签名列表，未提供或不存在的用户返回空。"""
     user_preferences = set()
     liked_combo_signatures = []
     if username:
@@ -169,16 +227,99 @@ def get_recommendations(
             user_preferences = {item[0] for item in prefs_query}
             combo_sigs_query = db.query(LikedCombination.signature).filter(LikedCombination.user_id == user.id).all()
             liked_combo_signatures = [item[0] for item in combo_sigs_query]
+    return user_preferences, liked_combo_signatures
+
+
+def _batch_error(e: HTTPException) -> dict:
+    return {"error": {"status_code": e.status_code, "detail": e.detail}}
+
+
+@router.post("/recommend/batch")
+def get_batch_recommendations(
+    payload: BatchRecommendPayload,
+    db: Session = Depends(get_db),
+    app_data: dict = Depends(get_app_data)
+):
+    """
+    批量创新推荐：与单次 /recommend?mode=innovative 语义相同，
+    所有名称一次解析，所有查询的锚点行和通过一次 (查询数 x N) 矩阵乘法算出。
+    单个查询出错时只在该位置返回 error，不影响其余查询。
+    """
+    if len(payload.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"单次最多提交 {MAX_BATCH_QUERIES} 个查询。")
+    username = payload.username
+    readiness.ensure('ingredients', 'innovative', *(('embeddings',) if username else ()))
+
+    parsed = []
+    all_names = []
+    for query in payload.queries:
+        anchors = [s.strip().lower() for s in query.ingredients if s.strip()]
+        excludes = [s.strip().lower() for s in query.exclude if s.strip()]
+        parsed.append((anchors, excludes))
+        all_names.extend(anchors + excludes)
+    resolved = iter(helpers.resolve_names(all_names, app_data) if all_names else [])
+
+    scorer = app_data['innovative_scorer']
+    vocabulary = scorer.vocabulary
+
+    results = [None] * len(parsed)
+    scored = []  # (结果位置, 锚点规范名, 排除规范名, 查询)
+    for i, ((anchors, excludes), query) in enumerate(zip(parsed, payload.queries)):
+        anchor_resolved = [next(resolved) for _ in anchors]
+        exclude_resolved = [next(resolved) for _ in excludes]
+        if not anchors:
+            results[i] = _batch_error(HTTPException(status_code=400, detail="未提供任何有效的食材。"))
+            continue
+        try:
+            _check_weights(query.flavor_weight, query.multimodal_weight)
+            anchor_canonicals = list(dict.fromkeys(helpers.require_resolved(anchors, anchor_resolved)))
+        except HTTPException as e:
+            results[i] = _batch_error(e)
+            continue
+        for s, canonical_name in zip(excludes, exclude_resolved):
+            if canonical_name is None:
+                print(f"警告: 无法识别要排除的食材 '{s}'，已跳过。")
+        scored.append((i, anchor_canonicals, {c for c in exclude_resolved if c is not None}, query))
 
+    if scored:
+        with span("recommend_batch.score"):
+            # 所有查询的锚点行和通过每个矩阵一次矩阵乘法得到，各查询的混合权重在乘法后逐行应用
+            anchor_id_lists = [scorer.ids(anchor_canonicals) for _, anchor_canonicals, _, _ in scored]
+            combined_scores = scorer.batch_scores(
+                anchor_id_lists,
+                [query.flavor_weight for _, _, _, query in scored],
+                [query.multimodal_weight for _, _, _, query in scored],
+            )
+
+        # 口味相似度按嵌入矩阵行序排列，与词表顺序一致
+        taste_similarity = helpers.get_user_taste_scores(username, db, app_data) if username else None
+        if taste_similarity is not None:
+            combined_scores = (1 - PERSONALIZATION_WEIGHT) * combined_scores + PERSONALIZATION_WEIGHT * taste_similarity
+
+        with span("recommend_batch.rank"):
+            for row, (i, anchor_canonicals, excluded, query) in enumerate(scored):
+                scores = combined_scores[row]
+                blocked = scorer.blocked(anchor_id_lists[row], scorer.ids(excluded))
+                top_positions = scorer.top_n(scores, blocked, query.top_n)
+                zh_anchors = list(dict.fromkeys(app_data['canonical_to_zh_map'].get(c, c) for c in anchor_canonicals))
+                results[i] = {
+                    "anchor_ingredients": zh_anchors,
+                    "recommendations": [
+                        {"ingredient": app_data['canonical_to_zh_map'].get(vocabulary[p], vocabulary[p]), "score": float(scores[p])}
+                        for p in top_positions
+                    ],
+                }
+
+    with span("recommend.user_likes"):
+        user_preferences, liked_combo_signatures = _user_likes(username, db)
     return {
-        "anchor_ingredients": translated_anchors_zh, 
-        "recommendations": recommendations_zh,
+        "results": results,
         "liked_ingredients": list(user_preferences),
         "liked_combinations": liked_combo_signatures
     }
     
 
-@router.get("/generate-idea")
+@router.get("/generate-idea", dependencies=[Depends(requires("ingredients", "recipes", "classic", "flavor"))])
 def generate_recipe_idea(
     ingredients: str,
     exclude: str = "",
@@ -192,29 +333,36 @@ def generate_recipe_idea(
     if len(input_strings) < 2:
         raise HTTPException(status_code=400, detail="请至少输入两种核心食材。")
 
-    for s in input_strings:
-        try:
-            _, canonical_name = helpers.get_vector_by_name(s, app_data)
-            core_canonicals.add(canonical_name)
-            core_zh.add(app_data['canonical_to_zh_map'].get(canonical_name, canonical_name))
-        except HTTPException as e:
-            raise HTTPException(status_code=404, detail=e.detail)
-    
     excluded_strings = [s.strip().lower() for s in re.split('[,，]', exclude) if s.strip()]
+    resolved = helpers.resolve_names(input_strings + excluded_strings, app_data)
+
+    for canonical_name in helpers.require_resolved(input_strings, resolved[:len(input_strings)]):
+        core_canonicals.add(canonical_name)
+        core_zh.add(app_data['canonical_to_zh_map'].get(canonical_name, canonical_name))
+    
     excluded_canonicals_set = set()
-    for s in excluded_strings:
-        try:
-            _, canonical_name = helpers.get_vector_by_name(s, app_data)
-            excluded_canonicals_set.add(canonical_name)
-        except HTTPException:
+    for s, canonical_name in zip(excluded_strings, resolved[len(input_strings):]):
+        if canonical_name is None:
             print(f"警告 (菜谱灵感): 无法识别要排除的食材 '{s}'，已跳过。")
-            pass
+            continue
+        excluded_canonicals_set.add(canonical_name)
+
+    result_cache = app_data['result_cache']
+    cache_key = result_cache.key(
+        'generate-idea', data_version(app_data), sorted(core_canonicals),
+        sorted(excluded_canonicals_set), top_n_complements
+    )
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     anchor1, anchor2 = list(core_canonicals)[:2]
     anchor1_zh, anchor2_zh = list(core_zh)[:2]
 
-    classic_score = app_data['classic_sim_df'].loc[anchor1, anchor2] if anchor1 in app_data['classic_sim_df'].index and anchor2 in app_data['classic_sim_df'].columns else 0
-    innovative_score = app_data['innovative_sim_df'].loc[anchor1, anchor2] if anchor1 in app_data['innovative_sim_df'].index and anchor2 in app_data['innovative_sim_df'].columns else 0
+    classic_sim = app_data['classic_sim']
+    innovative_sim = app_data['innovative_sim']
+    classic_score = classic_sim.value(anchor1, anchor2) if anchor1 in classic_sim and anchor2 in classic_sim else 0
+    innovative_score = innovative_sim.value(anchor1, anchor2) if anchor1 in innovative_sim and anchor2 in innovative_sim else 0
 
     pairing_story = f" {anchor1_zh} 和 {anchor2_zh} "
     if classic_score > 0.1:
@@ -224,31 +372,45 @@ def generate_recipe_idea(
     else:
         pairing_story += f"的搭配可能会在质地、营养或功能上形成有趣的互补，值得进行一次美食冒险。"
 
-    matching_recipes = [
-        recipe for recipe in app_data['recipes'] 
-        if core_canonicals.issubset(recipe)
-    ]
+    recipe_store = app_data['recipes']
+    top_complement_ids = None
+    if len(core_canonicals) == 2 and readiness.is_ready('complements'):
+        # 两种核心食材: 直接查预先统计好的食材对互补表；排除项用尽保存的前 K 个时回退到倒排表
+        with span("generate_idea.pair_lookup"):
+            pair_index = app_data['pair_complement_index']
+            core_ids = recipe_store.ids_for(core_canonicals)
+            if len(core_ids) < 2:
+                recipe_count, top_complement_ids = 0, []
+            else:
+                recipe_count = pair_index.recipe_count(*core_ids)
+                top_complement_ids = pair_index.top_complements(
+                    *core_ids, recipe_store.ids_for(excluded_canonicals_set), top_n_complements
+                )
+
+    if top_complement_ids is None:
+        with span("generate_idea.recipe_match"):
+            matching_recipe_ids = recipe_store.match(core_canonicals)
+        recipe_count = matching_recipe_ids.size
+        if recipe_count:
+            with span("generate_idea.complements"):
+                complement_counts = recipe_store.ingredient_counts(matching_recipe_ids)
+                complement_counts[recipe_store.ids_for(core_canonicals | excluded_canonicals_set)] = 0
+                ranked_ids = np.argsort(-complement_counts, kind='stable')[:top_n_complements]
+                top_complement_ids = [i for i in ranked_ids if complement_counts[i] > 0]
 
     complements = []
-    if not matching_recipes:
+    if recipe_count == 0:
         pairing_story += " 在我们的数据中，这是一个非常罕见的组合，因此暂时无法推荐更多互补食材。"
     else:
-        complement_counter = Counter()
-        for recipe in matching_recipes:
-            complement_counter.update(recipe - core_canonicals)
-        
-        all_possible_complements = complement_counter.most_common()
-        filtered_complements = [
-            (name, count) for name, count in all_possible_complements
-            if name not in excluded_canonicals_set
-        ]
-        top_complements_en = filtered_complements[:top_n_complements]
         complements = [
-            app_data['canonical_to_zh_map'].get(name, name) for name, count in top_complements_en
+            app_data['canonical_to_zh_map'].get(recipe_store.vocabulary[i], recipe_store.vocabulary[i])
+            for i in top_complement_ids
         ]
 
-    return {
+    result = {
         "core_ingredients": list(core_zh),
         "pairing_story": pairing_story,
         "complementary_ingredients": complements
-    }
\ No newline at end of file
+    }
+    result_cache.set(cache_key, result)
+    return result
\ No newline at end of file
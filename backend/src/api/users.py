@@ -1,104 +1,177 @@
-
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+import asyncio
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 from pydantic import BaseModel
+from typing import Optional
 
-from ..core.dependencies import get_db, get_app_data
+from ..core.dependencies import get_async_db, get_app_data, get_session_user
+from ..core.readiness import readiness, requires
 from ..database.models import User, Preference, LikedCombination, CombinationIngredient
 from ..schemas.main_schemas import CombinationPayload
 from ..services import helpers
+from ..services.sessions import issue_session, revoke_session
+from ..services.taste_profiles import mark_taste_profile_stale
+
+# 会话令牌的有效期 (秒)
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL", "3600"))
 
 router = APIRouter(
     prefix="/api/users",
     tags=["User Management"]
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _update_taste_profile(db: Session, user: User, app_data: dict, apply):
+    """在当前事务中同步更新物化口味；嵌入尚未加载时只标记为待重建。"""
+    if readiness.is_ready('embeddings'):
+        apply(app_data['taste_profiles'])
+    else:
+        mark_taste_profile_stale(db, user)
+
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def _conflict() -> HTTPException:
+    return HTTPException(status_code=409, detail="偏好正在被同时修改，请稍后再试。")
+
+
+async def _get_user(db: AsyncSession, username: str) -> User:
+    user = (await db.execute(select(User).filter(User.username == username))).scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+def _check_session(username: str, session_user: Optional[User]):
+    """带了会话令牌时，令牌必须属于路径中的用户；不带令牌的请求保持原有行为。"""
+    if session_user is not None and session_user.username != username:
+        raise HTTPException(status_code=403, detail="无权修改其他用户的偏好。")
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
 
 class UserLogin(BaseModel):
     username: str
     password: str
 
 @router.post("/login")
-def login_or_register(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_or_register(
+    user_data: UserLogin,
+    db: AsyncSession = Depends(get_async_db),
+    app_data: dict = Depends(get_app_data)
+):
     username = user_data.username
     password = user_data.password
     
     if not username or not password:
          raise HTTPException(status_code=400, detail="用户名和密码不能为空")
 
-    db_user = db.query(User).filter(User.username == username).first()
+    db_user = (await db.execute(select(User).filter(User.username == username))).scalars().first()
     
+    # bcrypt 在专用进程池中执行，登录高峰不会拖慢同一进程中的推荐请求
+    password_hasher = app_data['password_hasher']
     if db_user:
-        if not verify_password(password, db_user.hashed_password):
+        if not await password_hasher.verify(password, db_user.hashed_password):
              raise HTTPException(status_code=400, detail="密码错误")
-        return {"id": db_user.id, "username": db_user.username, "message": "登录成功"}
+        message = "登录成功"
     
     else:
-        hashed_password = get_password_hash(password)
-        new_user = User(username=username, hashed_password=hashed_password)
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        return {"id": new_user.id, "username": new_user.username, "message": "注册并登录成功"}
-
-@router.post("/{username}/preferences")
-def toggle_preference(
+        hashed_password = await password_hasher.hash(password)
+        db_user = User(username=username, hashed_password=hashed_password)
+        db.add(db_user)
+        await db.flush()
+        message = "注册并登录成功"
+
+    # 之后的请求携带令牌即可，只需一次主键查询，无需再校验密码
+    token, expires_at = await issue_session(db, db_user, SESSION_TTL_SECONDS)
+    await db.commit()
+    return {
+        "id": db_user.id, "username": db_user.username, "message": message,
+        "token": token, "token_type": "bearer", "expires_at": expires_at,
+    }
+
+
+@router.get("/session")
+async def get_session(session_user: Optional[User] = Depends(get_session_user)):
+    """校验会话令牌并返回其用户。"""
+    if session_user is None:
+        raise HTTPException(status_code=401, detail="缺少会话令牌", headers={"WWW-Authenticate": "Bearer"})
+    return {"id": session_user.id, "username": session_user.username}
+
+
+@router.post("/logout")
+async def logout(
+    authorization: Optional[str] = Header(None),
+    session_user: Optional[User] = Depends(get_session_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if session_user is not None:
+        await revoke_session(db, authorization.partition(" ")[2].strip())
+        await db.commit()
+    return {"status": "success"}
+
+@router.post("/{username}/preferences", dependencies=[Depends(requires("ingredients"))])
+async def toggle_preference(
     username: str,
     ingredient: str = Query(...),
-    db: Session = Depends(get_db),
-    app_data: dict = Depends(get_app_data)
+    db: AsyncSession = Depends(get_async_db),
+    app_data: dict = Depends(get_app_data),
+    session_user: Optional[User] = Depends(get_session_user)
 ):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    try:
-        _, canonical_name = helpers.get_vector_by_name(ingredient, app_data)
-    except HTTPException as e:
-        raise e
-
-    existing_pref = db.query(Preference).filter(
-        Preference.user_id == user.id,
-        Preference.ingredient_name == canonical_name
-    ).first()
+    _check_session(username, session_user)
+    user = await _get_user(db, username)
+    user_id = user.id
+
+    # 只需规范名，不依赖嵌入是否已加载；模糊匹配在线程中执行
+    resolved = await asyncio.to_thread(helpers.resolve_names, [ingredient], app_data)
+    canonical_name, = helpers.require_resolved([ingredient], resolved)
+
+    # 口味的乐观锁冲突时整个事务回滚并重试一次
+    for _ in range(2):
+        existing_pref = (await db.execute(select(Preference).filter(
+            Preference.user_id == user_id,
+            Preference.ingredient_name == canonical_name
+        ))).scalars().first()
+
+        if existing_pref:
+            await db.delete(existing_pref)
+            action, delta = "unliked", -1
+        else:
+            new_pref = Preference(ingredient_name=canonical_name, user_id=user_id)
+            db.add(new_pref)
+            action, delta = "liked", 1
 
-    if existing_pref:
-        db.delete(existing_pref)
-        db.commit()
-        return {"status": "success", "action": "unliked", "ingredient": canonical_name}
-    else:
-        new_pref = Preference(ingredient_name=canonical_name, user_id=user.id)
-        db.add(new_pref)
-        db.commit()
-        return {"status": "success", "action": "liked", "ingredient": canonical_name}
+        try:
+            # 物化口味的维护逻辑是同步的，通过 run_sync 在同一个事务里执行
+            await db.run_sync(lambda sync_db: _update_taste_profile(
+                sync_db, user, app_data, lambda profiles: profiles.apply_preference(sync_db, user, canonical_name, delta)
+            ))
+            await db.commit()
+        except (StaleDataError, IntegrityError):
+            # 乐观锁冲突，或并发的首次点赞同时插入了口味行/同一条点赞：回滚后按最新状态重试
+            await db.rollback()
+            continue
+        app_data['result_cache'].invalidate_user(username)
+        return {"status": "success", "action": action, "ingredient": canonical_name}
+    raise _conflict()
 
 
-@router.post("/{username}/combinations/toggle")
-def toggle_combination_preference(
+@router.post("/{username}/combinations/toggle", dependencies=[Depends(requires("ingredients"))])
+async def toggle_combination_preference(
     username: str,
     payload: CombinationPayload,
-    db: Session = Depends(get_db),
-    app_data: dict = Depends(get_app_data) # <--- 注入 app_data
+    db: AsyncSession = Depends(get_async_db),
+    app_data: dict = Depends(get_app_data),
+    session_user: Optional[User] = Depends(get_session_user)
 ):
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    _check_session(username, session_user)
+    user = await _get_user(db, username)
+    user_id = user.id
 
-    canonical_names = []
-    for ingr in payload.combination:
-        try:
-            _, canonical = helpers.get_vector_by_name(ingr, app_data)
-            canonical_names.append(canonical)
-        except HTTPException:
-            continue
+    canonical_names = [
+        canonical for canonical in await asyncio.to_thread(helpers.resolve_names, payload.combination, app_data)
+        if canonical is not None
+    ]
 
     if not canonical_names:
         raise HTTPException(status_code=400, detail="组合中没有有效的食材。")
@@ -106,19 +179,32 @@ def toggle_combination_preference(
     canonical_names.sort()
     signature = ",".join(canonical_names)
 
-    existing_combo = db.query(LikedCombination).filter(
-        LikedCombination.user_id == user.id,
-        LikedCombination.signature == signature
-    ).first()
+    for _ in range(2):
+        # 删除组合时需要级联删除其食材，提前一起加载，避免异步会话中的懒加载
+        existing_combo = (await db.execute(
+            select(LikedCombination)
+            .options(selectinload(LikedCombination.ingredients))
+            .filter(LikedCombination.user_id == user_id, LikedCombination.signature == signature)
+        )).scalars().first()
+
+        if existing_combo:
+            await db.delete(existing_combo)
+            action, delta = "unliked", -1
+        else:
+            new_combo = LikedCombination(signature=signature, user_id=user_id)
+            for name in canonical_names:
+                new_combo.ingredients.append(CombinationIngredient(ingredient_name=name))
+            db.add(new_combo)
+            action, delta = "liked", 1
 
-    if existing_combo:
-        db.delete(existing_combo)
-        db.commit()
-        return {"status": "success", "action": "unliked", "signature": signature}
-    else:
-        new_combo = LikedCombination(signature=signature, user_id=user.id)
-        for name in canonical_names:
-            new_combo.ingredients.append(CombinationIngredient(ingredient_name=name))
-        db.add(new_combo)
-        db.commit()
-        return {"status": "success", "action": "liked", "signature": signature}
\ No newline at end of file
+        try:
+            await db.run_sync(lambda sync_db: _update_taste_profile(
+                sync_db, user, app_data, lambda profiles: profiles.apply_combination(sync_db, user, canonical_names, delta)
+            ))
+            await db.commit()
+        except (StaleDataError, IntegrityError):
+            await db.rollback()
+            continue
+        app_data['result_cache'].invalidate_user(username)
+        return {"status": "success", "action": action, "signature": signature}
+    raise _conflict()
@@ -0,0 +1,305 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from .dataloader import RECIPE_FILES
+from .dataset_bundle import DatasetBundle
+from .embedding_store import EmbeddingStore
+from .matrix_store import (
+    MATRIX_FORMAT_VERSION, SparseSimilarityMatrix, default_block_rows, load_or_build_similarity_matrix,
+    load_similarity_matrix, save_similarity_matrix, save_sparse_similarity_matrix, similarity_matrix_data_path,
+    similarity_matrix_exists, similarity_matrix_format_version,
+)
+from .similarity_engine import (
+    calculate_cooccurrence_similarity, calculate_cooccurrence_similarity_top_k,
+    calculate_flavor_similarity, calculate_flavor_similarity_top_k,
+)
+
+# --- 路径 ---
+DATA_DIR = Path("./data/flavor_network_data")
+I18N_DIR = Path("./i18n")
+CACHE_DIR = Path("./cache")
+CLASSIC_SIM_CACHE_PATH = CACHE_DIR / "classic_similarity"
+INNOVATIVE_SIM_CACHE_PATH = CACHE_DIR / "innovative_similarity"
+MULTIMODAL_SIM_CACHE_PATH = CACHE_DIR / "multimodal_similarity"
+ALIGNED_EMB_PATH = Path("./data/aligned_multimodal_embeddings.npy")
+MANIFEST_PATH = CACHE_DIR / "manifest.json"
+DATASET_BUNDLE_PATH = CACHE_DIR / "dataset.npz"
+
+MANIFEST_FORMAT_VERSION = 1
+
+# 服务端遇到缺失/过期产物时的处理方式:
+#   warn   - 过期产物照常使用并打印警告，缺失产物视为加载失败 (默认)
+#   strict - 过期或缺失都视为加载失败
+#   build  - 缺失或过期时在本机重新计算 (仅用于本地开发)
+ARTIFACT_POLICIES = ("warn", "strict", "build")
+
+
+def similarity_top_k() -> int:
+    """
+    相似度矩阵的存储格式: SIMILARITY_TOP_K 为 0 (默认) 时保存完整的 N x N 稠密矩阵；
+    大于 0 时每行只保留 top-K 个正值 (SparseSimilarityMatrix)，内存与 N x K 成正比，用于很大的食材表。
+    """
+    return int(os.getenv("SIMILARITY_TOP_K", "0"))
+
+INGR_INFO_PATH = DATA_DIR / "ingr_comp" / "ingr_info.tsv"
+COMPOUND_PATHS = [DATA_DIR / "ingr_comp" / "comp_info.tsv", DATA_DIR / "ingr_comp" / "ingr_comp.tsv"]
+RECIPE_PATHS = [DATA_DIR / "scirep-cuisines-detail" / f for f in RECIPE_FILES]
+TRANSLATION_PATH = I18N_DIR / "translation.json"
+
+# 产物名 -> (矩阵路径, 输入文件)
+ARTIFACTS = {
+    'classic': (CLASSIC_SIM_CACHE_PATH, [INGR_INFO_PATH] + RECIPE_PATHS),
+    'flavor': (INNOVATIVE_SIM_CACHE_PATH, [INGR_INFO_PATH] + COMPOUND_PATHS),
+    'multimodal': (MULTIMODAL_SIM_CACHE_PATH, [INGR_INFO_PATH, ALIGNED_EMB_PATH]),
+}
+
+# 数据包包含全部解析后的输入
+DATASET_INPUTS = [INGR_INFO_PATH] + COMPOUND_PATHS + RECIPE_PATHS + [TRANSLATION_PATH, ALIGNED_EMB_PATH]
+
+_manifest_lock = threading.Lock()
+
+
+class ArtifactMismatchError(RuntimeError):
+    """预计算产物缺失，或与当前输入数据的指纹不一致。"""
+
+
+def file_fingerprint(path: Path, known: dict = None) -> dict:
+    """
+    计算文件的 sha256 指纹。若 known 记录的大小与修改时间与当前文件一致，直接沿用其中的哈希，
+    避免每次启动都重新读取大文件。
+    """
+    if not Path(path).exists():
+        return {"sha256": None, "size": None, "mtime_ns": None}
+    stat = Path(path).stat()
+    if known and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+        return dict(known)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return {"sha256": digest.hexdigest(), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def fingerprint_paths(paths: List[Path], recorded: dict = None) -> Dict[str, dict]:
+    recorded = recorded or {}
+    return {str(path): file_fingerprint(path, recorded.get(str(path))) for path in paths}
+
+
+def input_fingerprints(name: str, recorded: dict = None) -> Dict[str, dict]:
+    return fingerprint_paths(ARTIFACTS[name][1], recorded)
+
+
+def _same_inputs(recorded: dict, current: dict) -> bool:
+    return recorded.keys() == current.keys() and all(
+        recorded[path]["sha256"] == fingerprint["sha256"] for path, fingerprint in current.items()
+    )
+
+
+def open_dataset_bundle(rebuild: bool = False) -> DatasetBundle:
+    """
+    打开解析好的数据包；不存在、版本不符或输入已变化时重新解析原始文件并写出新的数据包。
+    """
+    bundle = None
+    if DATASET_BUNDLE_PATH.exists() and not rebuild:
+        bundle = DatasetBundle.load(DATASET_BUNDLE_PATH)
+        if bundle is not None and not _same_inputs(bundle.inputs, fingerprint_paths(DATASET_INPUTS, bundle.inputs)):
+            print("输入数据已变化，数据包需要重新生成。")
+            bundle = None
+    if bundle is None:
+        print("正在解析原始数据并生成数据包...")
+        inputs = fingerprint_paths(DATASET_INPUTS)
+        bundle = DatasetBundle.from_sources(DATA_DIR, I18N_DIR, ALIGNED_EMB_PATH, inputs)
+        CACHE_DIR.mkdir(exist_ok=True)
+        bundle.save(DATASET_BUNDLE_PATH)
+    return bundle
+
+
+def output_fingerprint(name: str, top_k: int = 0) -> dict:
+    data_path = similarity_matrix_data_path(ARTIFACTS[name][0], sparse=top_k > 0)
+    stat = data_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def artifact_version(name: str, top_k: int = 0) -> str:
+    """产物的版本标记: 存储格式 (top_k) 加上输出文件的大小与修改时间，重新构建或改变格式后随之变化。"""
+    fingerprint = output_fingerprint(name, top_k)
+    return f"{name}:top_k={top_k}:{fingerprint['size']}:{fingerprint['mtime_ns']}"
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict:
+    if not Path(path).exists():
+        return {"format_version": MANIFEST_FORMAT_VERSION, "artifacts": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != MANIFEST_FORMAT_VERSION:
+        return {"format_version": MANIFEST_FORMAT_VERSION, "artifacts": {}}
+    return manifest
+
+
+def record_artifact(name: str, inputs: Dict[str, dict], path: Path = MANIFEST_PATH, top_k: int = 0):
+    """
+    把产物的输入指纹、存储格式与输出标记写入清单 (读-改-写，原子替换)。
+    锁只在同一进程内有效；多进程构建时由主进程统一写入 (见 compute_artifact)。
+    """
+    with _manifest_lock:
+        manifest = load_manifest(path)
+        manifest["artifacts"][name] = {
+            "inputs": inputs,
+            "top_k": top_k,
+            "output": output_fingerprint(name, top_k),
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        tmp_path = Path(path).with_name(f"{Path(path).name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def artifact_problems(name: str, manifest: dict, top_k: int = None) -> List[str]:
+    """返回产物与清单、输入数据之间的不一致之处，空列表表示产物是最新的。top_k 缺省时取 SIMILARITY_TOP_K。"""
+    top_k = similarity_top_k() if top_k is None else top_k
+    matrix_path, _ = ARTIFACTS[name]
+    data_path = similarity_matrix_data_path(matrix_path, sparse=top_k > 0)
+    if not similarity_matrix_exists(matrix_path, sparse=top_k > 0):
+        return [f"产物 {data_path.name} 不存在"]
+    if similarity_matrix_format_version(matrix_path, sparse=top_k > 0) != MATRIX_FORMAT_VERSION:
+        return [f"产物 {data_path.name} 的格式版本过旧，无法加载"]
+    entry = manifest["artifacts"].get(name)
+    if entry is None:
+        return [f"清单中没有 {name} 的记录"]
+    if entry.get("top_k", 0) != top_k:
+        return [f"清单中 {name} 的存储格式为 top_k={entry.get('top_k', 0)}，当前配置为 top_k={top_k}"]
+
+    problems = []
+    if entry["output"] != output_fingerprint(name, top_k):
+        problems.append(f"{data_path.name} 在构建后被修改过")
+    current = input_fingerprints(name, entry["inputs"])
+    for path, fingerprint in current.items():
+        recorded = entry["inputs"].get(path)
+        if recorded is None or recorded["sha256"] != fingerprint["sha256"]:
+            problems.append(f"输入 {path} 已变化")
+    return problems
+
+
+# --- 构建函数 (模块级，便于在子进程中执行；输入统一从数据包读取) ---
+
+def build_classic_matrix() -> pd.DataFrame:
+    bundle = open_dataset_bundle()
+    ingr_info, _, _ = bundle.ingredient_data()
+    return calculate_cooccurrence_similarity(bundle.recipe_store(ingr_info), ingr_info)
+
+
+def build_flavor_matrix() -> pd.DataFrame:
+    ingr_info, _, ingr_comp = open_dataset_bundle().ingredient_data()
+    return calculate_flavor_similarity(ingr_comp, ingr_info)
+
+
+def build_multimodal_matrix() -> pd.DataFrame:
+    bundle = open_dataset_bundle()
+    ingr_info, _, _ = bundle.ingredient_data()
+    target_names = ingr_info.sort_values('id')['name'].tolist()
+    store = EmbeddingStore(bundle.embeddings, target_names)
+    multimodal_sim_matrix = store.score(store.vectors, invalid_value=0.0)
+    return pd.DataFrame(multimodal_sim_matrix, index=target_names, columns=target_names)
+
+
+BUILDERS: Dict[str, Callable[[], pd.DataFrame]] = {
+    'classic': build_classic_matrix,
+    'flavor': build_flavor_matrix,
+    'multimodal': build_multimodal_matrix,
+}
+
+
+# --- top-K 稀疏版本: 逐块计算，完整的 N x N 矩阵从不出现 ---
+
+def build_classic_top_k(k: int) -> SparseSimilarityMatrix:
+    bundle = open_dataset_bundle()
+    ingr_info, _, _ = bundle.ingredient_data()
+    return calculate_cooccurrence_similarity_top_k(bundle.recipe_store(ingr_info), ingr_info, k)
+
+
+def build_flavor_top_k(k: int) -> SparseSimilarityMatrix:
+    ingr_info, _, ingr_comp = open_dataset_bundle().ingredient_data()
+    return calculate_flavor_similarity_top_k(ingr_comp, ingr_info, k)
+
+
+def build_multimodal_top_k(k: int) -> SparseSimilarityMatrix:
+    bundle = open_dataset_bundle()
+    ingr_info, _, _ = bundle.ingredient_data()
+    target_names = ingr_info.sort_values('id')['name'].tolist()
+    store = EmbeddingStore(bundle.embeddings, target_names)
+    step = default_block_rows(len(store))
+    blocks = (
+        (start, store.score(store.vectors[start:start + step], invalid_value=0.0))
+        for start in range(0, len(store), step)
+    )
+    return SparseSimilarityMatrix.from_blocks(blocks, target_names, k)
+
+
+TOP_K_BUILDERS: Dict[str, Callable[[int], SparseSimilarityMatrix]] = {
+    'classic': build_classic_top_k,
+    'flavor': build_flavor_top_k,
+    'multimodal': build_multimodal_top_k,
+}
+
+
+def compute_artifact(name: str, build: Callable[[], pd.DataFrame] = None, top_k: int = None) -> Tuple[str, Dict[str, dict], int]:
+    """
+    计算并保存一个相似度矩阵，不写清单。返回 (产物名, 输入指纹, top_k)，交给 record_artifact 记录；
+    构建进程池的各个 worker 只调用它，清单由主进程写入。
+    top_k 缺省时取 SIMILARITY_TOP_K；build 只用于稠密格式，top-K 格式总是使用 TOP_K_BUILDERS。
+    """
+    top_k = similarity_top_k() if top_k is None else top_k
+    inputs = input_fingerprints(name)
+    if top_k > 0:
+        save_sparse_similarity_matrix(TOP_K_BUILDERS[name](top_k), ARTIFACTS[name][0])
+    else:
+        df = (build or BUILDERS[name])()
+        save_similarity_matrix(df, ARTIFACTS[name][0])
+    return name, inputs, top_k
+
+
+def build_artifact(name: str, build: Callable[[], pd.DataFrame] = None, top_k: int = None) -> str:
+    """在当前进程中计算并保存一个相似度矩阵，同时更新清单。返回产物名。"""
+    name, inputs, top_k = compute_artifact(name, build, top_k)
+    record_artifact(name, inputs, top_k=top_k)
+    return name
+
+
+def open_artifact(name: str, build: Callable[[], pd.DataFrame] = None, policy: str = None):
+    """
+    服务端打开预计算矩阵，返回 (矩阵, 产物版本)。产物过期或缺失时按 ARTIFACT_POLICY 警告或拒绝，
+    只有 build 策略才会在本机重新计算。产物版本取自实际打开的文件，计入结果缓存的数据版本。
+    """
+    policy = policy or os.getenv("ARTIFACT_POLICY", "warn")
+    if policy not in ARTIFACT_POLICIES:
+        raise ValueError(f"未知的 ARTIFACT_POLICY: {policy}，可选值: {', '.join(ARTIFACT_POLICIES)}")
+    matrix_path, _ = ARTIFACTS[name]
+    top_k = similarity_top_k()
+    sparse = top_k > 0
+
+    legacy_path = matrix_path.with_suffix(".feather")
+    if not sparse and not similarity_matrix_exists(matrix_path) and legacy_path.exists():
+        # 旧版 .feather 缓存只做格式转换，其输入指纹未知，不写入清单
+        matrix = load_or_build_similarity_matrix(matrix_path, build or BUILDERS[name])
+        return matrix, artifact_version(name)
+
+    problems = artifact_problems(name, load_manifest(), top_k)
+    if problems:
+        message = f"产物 '{name}' 与清单不一致: {'; '.join(problems)}"
+        if policy == "build":
+            print(f"{message}，正在本机重新计算...")
+            build_artifact(name, build, top_k)
+        elif policy == "warn" and similarity_matrix_format_version(matrix_path, sparse) == MATRIX_FORMAT_VERSION:
+            print(f"警告: {message}，仍使用现有产物。请运行 `python build_artifacts.py` 重新构建。")
+        else:
+            raise ArtifactMismatchError(f"{message}。请先运行 `python build_artifacts.py`。")
+    version = artifact_version(name, top_k)
+    return load_similarity_matrix(matrix_path, sparse), version
@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Iterable, List, Tuple
+
+from .matrix_store import SimilarityMatrix
+from .recipe_store import RecipeStore
+
+CLASSIC_MAX_RECIPE_SIZE = 10
+
+
+def _contains(sorted_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """values 中每个元素是否出现在升序数组 sorted_ids 中。"""
+    if sorted_ids.size == 0:
+        return np.zeros(values.size, dtype=bool)
+    pos = np.searchsorted(sorted_ids, values)
+    pos[pos == sorted_ids.size] = 0
+    return sorted_ids[pos] == values
+
+
+class ClassicComboIndex:
+    """
+    经典模式的组合打分索引。
+
+    每份食谱的得分 (食材两两经典相似度的平均值) 与查询无关，因此在加载时一次算好，
+    同时合并食材完全相同的重复食谱。去重后的食谱按得分降序重新编号，
+    于是倒排表中升序的食谱ID就是得分降序，查询时顺着最短的倒排表走，凑满 top_n 即可提前结束。
+    """
+
+    def __init__(self, store: RecipeStore, scores: np.ndarray):
+        self.store = store
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.sizes = store.recipe_sizes
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @classmethod
+    def build(cls, recipe_store: RecipeStore, classic_sim: SimilarityMatrix, max_size: int = CLASSIC_MAX_RECIPE_SIZE) -> "ClassicComboIndex":
+        """
+        从完整食谱存储构建索引。只保留 2 到 max_size 种食材、且平均得分大于 0 的食谱；
+        得分相同的食谱保持在原文件中首次出现的先后顺序。
+        """
+        print("正在构建经典组合索引...")
+        vocab_to_matrix = classic_sim.positions(recipe_store.vocabulary)
+        sizes = recipe_store.recipe_sizes
+
+        groups = []
+        for size in range(2, max_size + 1):
+            recipe_ids = np.flatnonzero(sizes == size)
+            if recipe_ids.size == 0:
+                continue
+            members = recipe_store.gather(recipe_ids).reshape(-1, size)
+            # 食谱内的ID已排序，相同食材集合的行完全一致
+            members, first_index = np.unique(members, axis=0, return_index=True)
+            first_seen = recipe_ids[first_index]
+
+            positions = vocab_to_matrix[members]
+            total = np.zeros(len(members))
+            for i in range(size):
+                for j in range(i + 1, size):
+                    total += classic_sim.pairs(positions[:, i], positions[:, j])
+            average = total / (size * (size - 1) / 2)
+
+            keep = average > 0
+            groups.append((members[keep], average[keep], first_seen[keep]))
+
+        members_list = [m for m, _, _ in groups]
+        scores = np.concatenate([a for _, a, _ in groups]) if groups else np.empty(0)
+        first_seen = np.concatenate([f for _, _, f in groups]) if groups else np.empty(0, dtype=np.int64)
+        lengths = np.concatenate([np.full(len(m), m.shape[1]) for m in members_list]) if groups else np.empty(0, dtype=np.int64)
+        flat_starts = np.concatenate([[0], np.cumsum(lengths)])
+        flat = np.concatenate([m.ravel() for m in members_list]) if groups else np.empty(0, dtype=np.int32)
+
+        # 按得分降序、首次出现先后排序并重新编号
+        order = np.lexsort((first_seen, -scores))
+        ordered_lengths = lengths[order]
+        indptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(ordered_lengths, out=indptr[1:])
+        offsets = np.repeat(flat_starts[order] - indptr[:-1], ordered_lengths)
+        indices = flat[offsets + np.arange(indptr[-1])]
+
+        index = cls(RecipeStore(indptr, indices, recipe_store.vocabulary), scores[order])
+        print(f"经典组合索引构建完成: {len(index)} 个不重复组合。")
+        return index
+
+    def top_n(self, anchors: Iterable[str], excludes: Iterable[str], top_n: int, chunk_size: int = 256) -> List[Tuple[List[str], float]]:
+        """
+        返回包含全部锚点、不含排除食材、且食材数多于锚点数的前 top_n 个组合 (得分降序)。
+        """
+        store = self.store
+        anchors = set(anchors)
+        anchor_ids = store.ids_for(anchors)
+        if len(anchor_ids) < len(anchors) or top_n <= 0:
+            return []
+
+        if anchor_ids:
+            postings = sorted((store.postings(i) for i in anchor_ids), key=len)
+            driver, others = postings[0], postings[1:]
+        else:
+            driver, others = np.arange(len(store), dtype=np.int32), []
+        excluded = [store.postings(i) for i in store.ids_for(excludes)]
+
+        selected = []
+        start = 0
+        while start < driver.size and len(selected) < top_n:
+            candidates = driver[start:start + chunk_size]
+            keep = self.sizes[candidates] > len(anchors)
+            for posting in others:
+                keep &= _contains(posting, candidates)
+            for posting in excluded:
+                keep &= ~_contains(posting, candidates)
+            selected.extend(candidates[keep][:top_n - len(selected)])
+            start += chunk_size
+            chunk_size *= 2
+
+        return [
+            ([store.vocabulary[i] for i in store.recipe_ingredient_ids(recipe_id)], float(self.scores[recipe_id]))
+            for recipe_id in selected
+        ]
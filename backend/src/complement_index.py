@@ -0,0 +1,120 @@
+import numpy as np
+from typing import Iterable, Optional
+
+from .recipe_store import RecipeStore
+
+PAIR_COMPLEMENT_K = 20
+
+
+class PairComplementIndex:
+    """
+    食材对 -> 互补食材的共现统计。
+
+    对每个至少在一份食谱中同时出现的食材对 (a < b)，记录同时包含两者的食谱数，
+    以及与它们共现次数最多的 K 个第三种食材。互补食材按次数降序、同次数时按食材ID升序排列，
+    与 generate-idea 在完整匹配结果上做稳定排序的顺序一致，因此保存的是完整排名的精确前缀。
+    两种核心食材的请求只需一次二分查找；前缀被排除项用尽时由调用方回退到倒排表。
+    """
+
+    def __init__(self, pair_keys: np.ndarray, recipe_counts: np.ndarray, indptr: np.ndarray,
+                 complements: np.ndarray, counts: np.ndarray, truncated: np.ndarray, n_vocab: int, k: int):
+        self.pair_keys = pair_keys
+        self.recipe_counts = recipe_counts
+        self.indptr = indptr
+        self.complements = complements
+        self.counts = counts
+        self.truncated = truncated
+        self.n_vocab = n_vocab
+        self.k = k
+
+    def __len__(self) -> int:
+        return len(self.pair_keys)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.pair_keys, self.recipe_counts, self.indptr, self.complements, self.counts, self.truncated))
+
+    @classmethod
+    def build(cls, recipe_store: RecipeStore, k: int = PAIR_COMPLEMENT_K) -> "PairComplementIndex":
+        """
+        按食材对中较小的ID a 逐个统计: 只展开包含 a 的食谱 (倒排表)，
+        峰值内存取决于最常见食材的食谱数，而不是全部三元组的数量。
+        """
+        print("正在构建食材对互补索引...")
+        n = len(recipe_store.vocabulary)
+        sizes = recipe_store.recipe_sizes
+        pair_keys, recipe_counts, kept_sizes, complements, counts, truncated = [], [], [], [], [], []
+
+        for a in range(n):
+            recipe_ids = recipe_store.postings(a)
+            if recipe_ids.size == 0:
+                continue
+            members = recipe_store.gather(recipe_ids).astype(np.int64)
+            recipe_of = np.repeat(np.arange(recipe_ids.size), sizes[recipe_ids])
+            # 每个 (食谱, b > a) 展开为该食谱的全部食材，去掉 a、b 后即为第三种食材
+            is_b = members > a
+            b_values, b_recipes = members[is_b], recipe_of[is_b]
+            if b_values.size == 0:
+                continue
+            partners, pair_recipe_counts = np.unique(b_values, return_counts=True)
+            triple_b = np.repeat(b_values, sizes[recipe_ids[b_recipes]])
+            triple_c = recipe_store.gather(recipe_ids[b_recipes]).astype(np.int64)
+            valid = (triple_c != a) & (triple_c != triple_b)
+            triples, triple_counts = np.unique(triple_b[valid] * n + triple_c[valid], return_counts=True)
+
+            # 每个食材对内按 (次数降序, 食材ID升序) 排序，保留前 K 个
+            group = np.searchsorted(partners, triples // n)
+            triple_c = triples % n
+            order = np.lexsort((triple_c, -triple_counts, group))
+            group_sizes = np.bincount(group, minlength=partners.size)
+            group_starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+            order = order[np.arange(order.size) - group_starts[group[order]] < k]
+
+            pair_keys.append(a * n + partners)
+            recipe_counts.append(pair_recipe_counts)
+            kept_sizes.append(np.minimum(group_sizes, k))
+            truncated.append(group_sizes > k)
+            complements.append(triple_c[order])
+            counts.append(triple_counts[order])
+
+        def join(chunks, dtype):
+            return np.concatenate(chunks).astype(dtype) if chunks else np.empty(0, dtype=dtype)
+
+        kept_sizes = join(kept_sizes, np.int64)
+        indptr = np.zeros(kept_sizes.size + 1, dtype=np.int64)
+        np.cumsum(kept_sizes, out=indptr[1:])
+        index = cls(
+            join(pair_keys, np.int64), join(recipe_counts, np.int32), indptr,
+            join(complements, np.int32), join(counts, np.int32), join(truncated, bool), n, k
+        )
+        print(f"食材对互补索引构建完成: {len(index)} 个食材对，{index.nbytes / 2 ** 20:.1f} MB。")
+        return index
+
+    def _pair_position(self, a: int, b: int) -> Optional[int]:
+        key = min(a, b) * self.n_vocab + max(a, b)
+        pos = int(np.searchsorted(self.pair_keys, key))
+        if pos < len(self.pair_keys) and self.pair_keys[pos] == key:
+            return pos
+        return None
+
+    def recipe_count(self, a: int, b: int) -> int:
+        """同时包含 a、b 的食谱数。"""
+        pos = self._pair_position(a, b)
+        return 0 if pos is None else int(self.recipe_counts[pos])
+
+    def top_complements(self, a: int, b: int, excluded: Iterable[int], top_n: int) -> Optional[np.ndarray]:
+        """
+        与 a、b 共现次数最多的 top_n 个第三种食材ID (跳过 excluded)，顺序同完整计算。
+
+        保存的前 K 个被排除项用尽、而该食材对还有更多互补食材时返回 None，由调用方回退到倒排表。
+        """
+        pos = self._pair_position(a, b)
+        if pos is None:
+            return np.empty(0, dtype=np.int32)
+        complements = self.complements[self.indptr[pos]:self.indptr[pos + 1]]
+        excluded = np.fromiter(excluded, dtype=np.int64)
+        if excluded.size:
+            complements = complements[~np.isin(complements, excluded)]
+        if complements.size < top_n and self.truncated[pos]:
+            return None
+        return complements[:max(top_n, 0)]
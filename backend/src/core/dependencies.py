@@ -1,21 +1,58 @@
-
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Generator
-from .lifespan import app_data
-from ..database.database import SessionLocal
+from typing import AsyncGenerator, Generator, Optional
+from .snapshots import snapshots
+from ..database.database import AsyncSessionLocal, LazySession
+from ..database.models import User
+from ..services.sessions import session_user
 
-def get_app_data() -> dict:
+async def get_app_data() -> AsyncGenerator[dict, None]:
     """
-    Dependency to get the global application data dictionary.
+    Dependency to get the application data snapshot for this request.
+    The snapshot is pinned until the request finishes, so a hot reload never
+    mixes data versions within one request; a replaced snapshot is released
+    once its last request has finished.
     """
-    return app_data
+    snapshot = snapshots.acquire()
+    try:
+        yield snapshot.data
+    finally:
+        snapshots.release(snapshot)
 
 def get_db() -> Generator[Session, None, None]:
     """
-    Dependency to get a new database session for each request.
+    Dependency to get a database session for each request.
+    The session is only created if the endpoint actually uses it.
     """
-    db = SessionLocal()
+    db = LazySession()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency to get an async database session for each request.
+    A connection is checked out of the pool on first use.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_session_user(
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[User]:
+    """
+    Dependency to resolve the session token sent as `Authorization: Bearer <token>`.
+    Returns None when no token is sent; an invalid or expired token is rejected with 401.
+    """
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="无效的认证信息", headers={"WWW-Authenticate": "Bearer"})
+    user = await session_user(db, token.strip())
+    if user is None:
+        raise HTTPException(status_code=401, detail="会话已过期，请重新登录", headers={"WWW-Authenticate": "Bearer"})
+    return user
@@ -1,96 +1,109 @@
-
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from pathlib import Path
-import pandas as pd
-import numpy as np
+import asyncio
 import os
+import httpx
 import google.generativeai as genai
-from sklearn.metrics.pairwise import cosine_similarity
 
-from ..database.database import create_db_and_tables
-from ..dataloader import load_ingredient_data, load_recipes_data, load_translation_data
-from ..similarity_engine import calculate_cooccurrence_similarity, calculate_flavor_similarity
+from ..artifacts import CACHE_DIR
+from ..database.database import async_engine, create_db_and_tables
+from ..services.concepts import CONCEPT_BACKENDS, ConceptService, StubBackend
+from ..services.passwords import PasswordHasher
+from ..services.recipe_search import RecipeSearchService, default_sources
+from ..services.result_cache import ResultCache
+from .snapshots import snapshots
+from .warmup import warm_up
+
+RESULT_CACHE_PATH = CACHE_DIR / "result_cache.json"
+CONCEPT_CACHE_PATH = CACHE_DIR / "concept_cache.json"
 
-app_data = {}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Manages the application's startup and shutdown events.
+
+    Data subsystems are loaded by a background warm-up task so the server
+    binds immediately; see /health/ready for their progress. Long-lived
+    services are created here once and shared by every data snapshot, so a
+    hot reload (POST /admin/reload) only rebuilds the data subsystems.
     """
     print("--- Server Starting Up ---")
+    services = {}
     
     create_db_and_tables()
 
-    # --- API Key ---
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    if not GOOGLE_API_KEY:
-        raise ValueError("Please set the GOOGLE_API_KEY environment variable")
-    genai.configure(api_key=GOOGLE_API_KEY)
+    # --- 菜谱概念生成后端 ---
+    # CONCEPT_BACKEND=stub 使用本地确定性后端，无需网络与 API Key，可用于压测
+    concept_backend_name = os.getenv("CONCEPT_BACKEND", "gemini")
+    if concept_backend_name not in CONCEPT_BACKENDS:
+        raise ValueError(f"Unknown CONCEPT_BACKEND: {concept_backend_name} (choose from {', '.join(CONCEPT_BACKENDS)})")
+    if concept_backend_name == "stub":
+        concept_backend = StubBackend(latency=float(os.getenv("CONCEPT_STUB_LATENCY", "0")))
+    else:
+        # --- API Key ---
+        GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+        if not GOOGLE_API_KEY:
+            raise ValueError("Please set the GOOGLE_API_KEY environment variable")
+        genai.configure(api_key=GOOGLE_API_KEY)
+        concept_backend = CONCEPT_BACKENDS[concept_backend_name]()
 
-    # --- 路径 ---
-    DATA_DIR = Path("./data/flavor_network_data")
-    I18N_DIR = Path("./i18n")
-    CACHE_DIR = Path("./cache")
-    CACHE_DIR.mkdir(exist_ok=True)
-    CLASSIC_SIM_CACHE_PATH = CACHE_DIR / "classic_similarity.feather"
-    INNOVATIVE_SIM_CACHE_PATH = CACHE_DIR / "innovative_similarity.feather"
-    MULTIMODAL_SIM_CACHE_PATH = CACHE_DIR / "multimodal_similarity.feather"
-    ALIGNED_EMB_PATH = Path("./data/aligned_multimodal_embeddings.npy")
+    # --- 结果缓存 ---
+    # RESULT_CACHE_PERSIST=1 时在关闭时保存、启动时恢复，重启后缓存仍是热的
+    persist_result_cache = os.getenv("RESULT_CACHE_PERSIST", "0") == "1"
+    result_cache = ResultCache(
+        max_entries=int(os.getenv("RESULT_CACHE_SIZE", "4096")),
+        ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+    )
+    if persist_result_cache:
+        result_cache.load(RESULT_CACHE_PATH)
+    services['result_cache'] = result_cache
 
-    ingr_info, _, ingr_comp = load_ingredient_data(DATA_DIR)
-    alias_map, zh_map, base_map = load_translation_data(I18N_DIR)
-    
-    app_data['ingr_info_df'] = ingr_info
-    app_data['alias_to_canonical_map'] = alias_map
-    app_data['canonical_to_zh_map'] = zh_map
-    app_data['canonical_to_base_map'] = base_map
-    app_data['ingr_to_category_map'] = pd.Series(ingr_info.category.values, index=ingr_info.name).to_dict()
+    # 概念与数据版本无关，缓存长期有效并总是持久化
+    concept_cache = ResultCache(
+        max_entries=int(os.getenv("CONCEPT_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("CONCEPT_CACHE_TTL", str(30 * 24 * 3600))),
+    )
+    concept_cache.load(CONCEPT_CACHE_PATH)
+    services['concept_service'] = ConceptService(
+        concept_backend, concept_cache,
+        max_concurrency=int(os.getenv("CONCEPT_MAX_CONCURRENCY", "4")),
+        timeout=float(os.getenv("CONCEPT_TIMEOUT", "20")),
+    )
 
-    # --- Cache ---
-    if os.path.exists(CLASSIC_SIM_CACHE_PATH):
-        app_data['classic_sim_df'] = pd.read_feather(CLASSIC_SIM_CACHE_PATH).set_index('index')
-    else:
-        recipes = load_recipes_data(DATA_DIR, ingr_info)
-        classic_sim_df = calculate_cooccurrence_similarity(recipes, ingr_info)
-        app_data['classic_sim_df'] = classic_sim_df
-        classic_sim_df.reset_index().to_feather(CLASSIC_SIM_CACHE_PATH)
-    
-    # Innovative
-    if os.path.exists(INNOVATIVE_SIM_CACHE_PATH):
-        app_data['innovative_sim_df'] = pd.read_feather(INNOVATIVE_SIM_CACHE_PATH).set_index('index')
-    else:
-        innovative_sim_df = calculate_flavor_similarity(ingr_comp, ingr_info)
-        app_data['innovative_sim_df'] = innovative_sim_df
-        innovative_sim_df.reset_index().to_feather(INNOVATIVE_SIM_CACHE_PATH)
-        
-    # Multimodal
-    if os.path.exists(MULTIMODAL_SIM_CACHE_PATH):
-        app_data['multimodal_sim_df'] = pd.read_feather(MULTIMODAL_SIM_CACHE_PATH).set_index('index')
-    else:
-        aligned_embeddings = np.load(ALIGNED_EMB_PATH)
-        multimodal_sim_matrix = cosine_similarity(aligned_embeddings)
-        ingr_info_df_sorted = app_data['ingr_info_df'].copy().sort_values('id')
-        target_names = ingr_info_df_sorted['name'].tolist()
-        multimodal_sim_df = pd.DataFrame(multimodal_sim_matrix, index=target_names, columns=target_names)
-        app_data['multimodal_sim_df'] = multimodal_sim_df
-        multimodal_sim_df.reset_index().to_feather(MULTIMODAL_SIM_CACHE_PATH)
+    # --- 密码哈希进程池 ---
+    password_hasher = PasswordHasher(
+        max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None,
+        max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "0")) or None,
+    )
+    password_hasher.start()
+    services['password_hasher'] = password_hasher
 
-    app_data['aligned_embeddings'] = np.load(ALIGNED_EMB_PATH)
-    ingr_info_df_sorted = app_data['ingr_info_df'].copy().sort_values('id')
-    app_data['name_to_idx_map'] = {name: i for i, name in enumerate(ingr_info_df_sorted['name'])}
-    app_data['idx_to_name_map'] = {i: name for i, name in enumerate(ingr_info_df_sorted['name'])}
-    
-    app_data['ingredient_name_list'] = list(app_data['name_to_idx_map'].keys())
-    app_data['search_list_zh'] = list(app_data['canonical_to_zh_map'].values())
-    app_data['zh_to_canonical_map'] = {v: k for k, v in app_data['canonical_to_zh_map'].items()}
-    
-    app_data['recipes'] = load_recipes_data(DATA_DIR, app_data['ingr_info_df'])
+    # --- 菜谱搜索 ---
+    # 所有请求共用一个长连接客户端，各来源的结果按食材集合缓存
+    http_client = httpx.AsyncClient(
+        timeout=15.0, limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    )
+    services['recipe_search'] = RecipeSearchService(
+        http_client, default_sources(),
+        ResultCache(
+            max_entries=int(os.getenv("RECIPE_CACHE_SIZE", "2048")),
+            ttl_seconds=float(os.getenv("RECIPE_CACHE_TTL", "21600")),
+        ),
+    )
 
-    print("--- Server is Ready! ---")
+    snapshot = snapshots.start(services)
+    warm_up_task = asyncio.create_task(warm_up(snapshot.data))
     
     yield
     
     print("--- Server Shutting Down ---")
-    app_data.clear()
\ No newline at end of file
+    warm_up_task.cancel()
+    password_hasher.shutdown()
+    CACHE_DIR.mkdir(exist_ok=True)
+    if persist_result_cache:
+        result_cache.save(RESULT_CACHE_PATH)
+    concept_cache.save(CONCEPT_CACHE_PATH)
+    await http_client.aclose()
+    await async_engine.dispose()
+    snapshots.close()
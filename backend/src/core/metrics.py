@@ -0,0 +1,163 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+# 默认分桶 (秒)，覆盖从亚毫秒的缓存命中到十几秒的外部调用
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    """
+    固定分桶的直方图。每次 observe 只做一次二分查找和几次加法；
+    累积计数在导出时才计算。
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}  # 标签 -> [各桶计数..., +Inf 桶计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {values[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """指标注册表，按注册顺序导出为 Prometheus 文本格式。"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, help_text: str, label_names: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def render_family(name: str, metric_type: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> List[str]:
+    """
+    把各服务自己维护的统计 (结果缓存、名称解析等的 counters) 在导出时渲染为一组指标，
+    这些统计本来就在累加，请求路径上没有额外开销。
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时 (按路由模板)", ("method", "route", "status")
+)
+SPAN_LATENCY = registry.histogram(
+    "app_span_duration_seconds", "请求内各阶段的耗时", ("span",)
+)
+
+
+@contextmanager
+def span(name: str):
+    """记录一个命名阶段的耗时: `with span("recommend.resolve"): ...`。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_LATENCY.observe(time.perf_counter() - start, name)
+
+
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件，按路由模板 (而不是原始路径) 记录每个 HTTP 请求的耗时与状态码，
+    不缓冲响应体，流式响应同样适用。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            # 未匹配到路由的请求合并为一类，避免随机路径撑大标签集合
+            route_path = getattr(route, "path", "<unmatched>")
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], route_path, str(status))
@@ -0,0 +1,88 @@
+import threading
+import time
+from fastapi import HTTPException
+from typing import Callable, Dict, Iterable
+
+RETRY_AFTER_SECONDS = 5
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """
+    记录各个数据子系统的加载状态 (pending -> loading -> ready / failed)。
+    """
+
+    def __init__(self):
+        self._status: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, names: Iterable[str]):
+        with self._lock:
+            for name in names:
+                self._status[name] = {"state": PENDING}
+
+    def replace(self, other: "Readiness"):
+        """整体换成另一份状态 (热重载切换快照时使用)，不经过 pending 的中间状态。"""
+        status = other.snapshot()
+        with self._lock:
+            self._status = status
+
+    def mark_loading(self, name: str):
+        with self._lock:
+            self._status[name] = {"state": LOADING, "started_at": time.time()}
+
+    def mark_ready(self, name: str):
+        with self._lock:
+            entry = self._status.setdefault(name, {})
+            entry["state"] = READY
+            entry["ready_at"] = time.time()
+            if "started_at" in entry:
+                entry["load_seconds"] = round(entry["ready_at"] - entry["started_at"], 3)
+
+    def mark_failed(self, name: str, error: str):
+        with self._lock:
+            entry = self._status.setdefault(name, {})
+            entry["state"] = FAILED
+            entry["error"] = error
+
+    def is_ready(self, *names: str) -> bool:
+        with self._lock:
+            return all(self._status.get(name, {}).get("state") == READY for name in names)
+
+    def all_ready(self) -> bool:
+        with self._lock:
+            return bool(self._status) and all(entry["state"] == READY for entry in self._status.values())
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._status.items()}
+
+    def ensure(self, *names: str):
+        """所需子系统未就绪时抛出 503，并带上 Retry-After 头。"""
+        if self.is_ready(*names):
+            return
+        snapshot = self.snapshot()
+        not_ready = {name: snapshot.get(name, {}).get("state", PENDING) for name in names
+                     if snapshot.get(name, {}).get("state") != READY}
+        raise HTTPException(
+            status_code=503,
+            detail={"message": "服务正在加载数据，请稍后再试。", "subsystems": not_ready},
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
+
+readiness = Readiness()
+
+
+def requires(*names: str) -> Callable[[], None]:
+    """
+    路由依赖：声明端点需要的数据子系统。
+    用法: @router.get(..., dependencies=[Depends(requires("embeddings"))])
+    """
+    def dependency():
+        readiness.ensure(*names)
+    return dependency
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import List, Optional
+
+from .readiness import Readiness, readiness
+from .warmup import data_version, warm_up
+
+
+def _remove_snapshot_files(data: dict):
+    """删除快照加载时写出的带代号文件 (见 warmup.snapshot_output_path)。"""
+    for path in data.get('snapshot_files', ()):
+        Path(path).unlink(missing_ok=True)
+
+
+class DataSnapshot:
+    """
+    一份完整的数据快照: 长期服务 (结果缓存、概念服务等) 加上全部数据子系统的加载结果。
+
+    快照切换后不再修改；active 为正在使用它的请求数，旧快照在 active 归零后释放。
+    """
+
+    def __init__(self, data: dict, generation: int):
+        self.data = data
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.active = 0
+        self.retired = False
+
+    @property
+    def version(self) -> Optional[str]:
+        return data_version(self.data)
+
+    def info(self) -> dict:
+        return {
+            "generation": self.generation,
+            "data_version": self.version,
+            "loaded_at": self.loaded_at,
+            "active_requests": self.active,
+        }
+
+
+class SnapshotManager:
+    """
+    管理当前数据快照与热重载。
+
+    每个请求通过 acquire/release 固定一份快照，重载在后台构建新快照，全部子系统成功后才原子切换；
+    切换前开始的请求继续使用旧快照，旧快照等这些请求结束后释放。重载失败时保留当前快照。
+    """
+
+    def __init__(self):
+        self.current: Optional[DataSnapshot] = None
+        self.draining: List[DataSnapshot] = []
+        self.services: dict = {}
+        self.reload_status: dict = {"state": "idle"}
+        self._reload_task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def start(self, services: dict) -> DataSnapshot:
+        """启动时创建第一份快照，数据子系统由 warm_up 在后台逐个写入。"""
+        self.services = services
+        self.current = DataSnapshot(dict(services), generation=1)
+        return self.current
+
+    def acquire(self) -> DataSnapshot:
+        with self._lock:
+            snapshot = self.current
+            snapshot.active += 1
+            return snapshot
+
+    def release(self, snapshot: DataSnapshot):
+        with self._lock:
+            snapshot.active -= 1
+            if snapshot.retired and snapshot.active == 0:
+                self._drop(snapshot)
+
+    def _drop(self, snapshot: DataSnapshot):
+        # 清空字典即释放对矩阵、嵌入等大对象的引用；长期服务仍由新快照引用
+        self.draining.remove(snapshot)
+        _remove_snapshot_files(snapshot.data)
+        snapshot.data.clear()
+        print(f"--- 数据快照 #{snapshot.generation} 已释放 ---")
+
+    def swap(self, snapshot: DataSnapshot):
+        with self._lock:
+            old, self.current = self.current, snapshot
+            old.retired = True
+            self.draining.append(old)
+            if old.active == 0:
+                self._drop(old)
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_task is not None and not self._reload_task.done()
+
+    def start_reload(self) -> bool:
+        """在后台开始一次重载；已有重载在进行时返回 False。"""
+        if self.reloading:
+            return False
+        generation = self.current.generation + 1
+        progress = Readiness()
+        self.reload_status = {"state": "loading", "generation": generation, "started_at": time.time(), "progress": progress}
+        self._reload_task = asyncio.create_task(self._reload(generation, progress))
+        return True
+
+    async def _reload(self, generation: int, progress: Readiness):
+        print(f"--- 开始重载数据 (快照 #{generation}) ---")
+        data = dict(self.services, snapshot_generation=generation)
+        try:
+            ok = await warm_up(data, progress)
+        except asyncio.CancelledError:
+            _remove_snapshot_files(data)
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            ok = False
+            progress.mark_failed("reload", f"{type(e).__name__}: {e}")
+        status = {"generation": generation, "started_at": self.reload_status["started_at"],
+                  "finished_at": time.time(), "subsystems": progress.snapshot()}
+        if not ok:
+            _remove_snapshot_files(data)
+            self.reload_status = {"state": "failed", **status}
+            print(f"--- 数据重载失败，继续使用快照 #{self.current.generation} ---")
+            return
+        self.swap(DataSnapshot(data, generation))
+        readiness.replace(progress)
+        self.reload_status = {"state": "succeeded", **status}
+        print(f"--- 已切换到数据快照 #{generation} (data_version={data_version(data)}) ---")
+
+    def status(self) -> dict:
+        reload_status = dict(self.reload_status)
+        if isinstance(reload_status.get("progress"), Readiness):
+            reload_status["subsystems"] = reload_status.pop("progress").snapshot()
+        with self._lock:
+            return {
+                "current": self.current.info() if self.current else None,
+                "draining": [snapshot.info() for snapshot in self.draining],
+                "reload": reload_status,
+            }
+
+    def snapshots(self) -> List[DataSnapshot]:
+        with self._lock:
+            return ([self.current] if self.current else []) + list(self.draining)
+
+    def close(self):
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+        with self._lock:
+            for snapshot in [self.current] + self.draining:
+                if snapshot is not None:
+                    _remove_snapshot_files(snapshot.data)
+                    snapshot.data.clear()
+            self.current = None
+            self.draining = []
+
+
+snapshots = SnapshotManager()
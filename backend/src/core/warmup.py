@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import os
+import traceback
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+from .readiness import Readiness, readiness
+from ..artifacts import (
+    CACHE_DIR, CLASSIC_SIM_CACHE_PATH, INNOVATIVE_SIM_CACHE_PATH, MULTIMODAL_SIM_CACHE_PATH,
+    open_artifact, open_dataset_bundle,
+)
+from ..combo_index import ClassicComboIndex
+from ..complement_index import PairComplementIndex
+from ..embedding_store import EmbeddingStore
+from ..innovative_scorer import InnovativeScorer
+from ..neighbors import export_neighbor_tables, load_or_build_neighbor_table
+from ..services.name_resolver import NameResolver
+from ..services.taste_profiles import TasteProfiles
+from ..similarity_engine import calculate_cooccurrence_similarity, calculate_flavor_similarity
+
+
+# 打开相似度产物的子系统各自记录产物版本，与数据包版本一起组成结果缓存的数据版本
+ARTIFACT_VERSION_KEYS = ('classic_artifact_version', 'flavor_artifact_version', 'multimodal_artifact_version')
+
+
+def data_version(app_data: dict) -> str:
+    """
+    结果缓存键与快照信息使用的数据版本: 数据包版本 (原始输入文件) 加上已打开的相似度产物版本。
+    输入不变而产物被重新构建 (如 warn 策略下先用了过期矩阵)，或 SIMILARITY_TOP_K 改变时，版本也会不同。
+    """
+    parts = [app_data.get('bundle_version')] + [app_data.get(key) for key in ARTIFACT_VERSION_KEYS]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+
+
+# 每个加载函数读取已就绪的 app_data，返回要写入 app_data 的新条目
+
+def load_ingredients(app_data: dict) -> dict:
+    """食材信息、翻译、名称映射与名称解析服务。所有输入都从解析好的数据包中读取。"""
+    bundle = open_dataset_bundle()
+    ingr_info, _, ingr_comp = bundle.ingredient_data()
+    alias_map, zh_map, base_map = bundle.translation_data()
+    ingr_to_category = pd.Series(ingr_info.category.values, index=ingr_info.name).to_dict()
+
+    # 行号统一使用按ID排序的词表，与嵌入矩阵一致
+    names = ingr_info.sort_values('id')['name'].tolist()
+    search_list_zh = list(zh_map.values())
+    zh_to_canonical = {v: k for k, v in zh_map.items()}
+    return {
+        'dataset_bundle': bundle,
+        'bundle_version': bundle.version,
+        'ingr_info_df': ingr_info,
+        'ingr_comp_dict': ingr_comp,
+        'alias_to_canonical_map': alias_map,
+        'canonical_to_zh_map': zh_map,
+        'canonical_to_base_map': base_map,
+        'ingr_to_category_map': ingr_to_category,
+        'name_to_idx_map': {name: i for i, name in enumerate(names)},
+        'idx_to_name_map': {i: name for i, name in enumerate(names)},
+        'ingredient_name_list': names,
+        'ingredient_categories': np.array([ingr_to_category.get(name) for name in names], dtype=object),
+        'search_list_zh': search_list_zh,
+        'zh_to_canonical_map': zh_to_canonical,
+        'name_resolver': NameResolver(alias_map, names, search_list_zh, zh_to_canonical),
+    }
+
+
+def load_embeddings(app_data: dict) -> dict:
+    aligned_embeddings = app_data['dataset_bundle'].embeddings
+    embedding_store = EmbeddingStore(aligned_embeddings, app_data['ingredient_name_list'])
+    # 嵌入内容变化后，已物化的用户口味需要重建
+    embedding_version = hashlib.sha256(np.ascontiguousarray(aligned_embeddings).tobytes()).hexdigest()[:16]
+    return {
+        'aligned_embeddings': aligned_embeddings,
+        'embedding_store': embedding_store,
+        'taste_profiles': TasteProfiles(embedding_store, embedding_version),
+    }
+
+
+def load_recipes(app_data: dict) -> dict:
+    return {'recipes': app_data['dataset_bundle'].recipe_store(app_data['ingr_info_df'])}
+
+
+def load_complements(app_data: dict) -> dict:
+    return {'pair_complement_index': PairComplementIndex.build(app_data['recipes'])}
+
+
+def load_classic(app_data: dict) -> dict:
+    # 相似度矩阵由 build_artifacts.py 离线构建，以只读内存映射打开，多个 worker 共享同一份页缓存
+    classic_sim, version = open_artifact(
+        'classic',
+        lambda: calculate_cooccurrence_similarity(app_data['recipes'], app_data['ingr_info_df'])
+    )
+    return {
+        'classic_sim': classic_sim,
+        'classic_artifact_version': version,
+        'classic_combo_index': ClassicComboIndex.build(app_data['recipes'], classic_sim),
+    }
+
+
+def load_flavor(app_data: dict) -> dict:
+    innovative_sim, version = open_artifact(
+        'flavor',
+        lambda: calculate_flavor_similarity(app_data['ingr_comp_dict'], app_data['ingr_info_df'])
+    )
+    return {'innovative_sim': innovative_sim, 'flavor_artifact_version': version}
+
+
+def load_multimodal(app_data: dict) -> dict:
+    multimodal_sim, version = open_artifact('multimodal')
+    return {'multimodal_sim': multimodal_sim, 'multimodal_artifact_version': version}
+
+
+def load_innovative(app_data: dict) -> dict:
+    """创新模式打分内核: 预先编码食材类别，并对齐词表与两个矩阵的行列位置。"""
+    return {'innovative_scorer': InnovativeScorer(
+        app_data['innovative_sim'], app_data['multimodal_sim'],
+        app_data['ingredient_name_list'], app_data['ingredient_categories']
+    )}
+
+
+def snapshot_output_path(app_data: dict, path: Path) -> Path:
+    """
+    加载过程中写出的文件路径。首份快照直接使用 path；热重载的快照写到带进程号与代号的文件
+    (如 neighbors.<pid>.g2.json)，切换前或重载失败时不影响当前快照正在提供的文件。
+    代号由每个 worker 各自从 1 计数，进程号使不同 worker 的同一代号互不覆盖、释放时也不会删掉别人的文件。
+    这些文件记录在 snapshot_files 中，快照释放时删除。
+    """
+    generation = app_data.get('snapshot_generation', 1)
+    if generation <= 1:
+        return path
+    output_path = path.with_name(f"{path.stem}.{os.getpid()}.g{generation}{path.suffix}")
+    app_data.setdefault('snapshot_files', []).append(output_path)
+    return output_path
+
+
+def load_neighbors(app_data: dict) -> dict:
+    """Top-K 近邻表及其静态导出。"""
+    vocabulary = app_data['ingredient_name_list']
+    tables = {}
+    for mode, key, matrix_path in [
+        ('classic', 'classic_sim', CLASSIC_SIM_CACHE_PATH),
+        ('flavor', 'innovative_sim', INNOVATIVE_SIM_CACHE_PATH),
+        ('multimodal', 'multimodal_sim', MULTIMODAL_SIM_CACHE_PATH),
+    ]:
+        # 仍然有效的共享缓存直接读取；需要重建时写到本快照自己的文件
+        cache_path = CACHE_DIR / f"neighbors_{mode}.npz"
+        tables[mode] = load_or_build_neighbor_table(
+            cache_path, app_data[key], matrix_path, vocabulary, save_path=snapshot_output_path(app_data, cache_path)
+        )
+    export_path = snapshot_output_path(app_data, CACHE_DIR / "neighbors.json")
+    export_neighbor_tables(tables, export_path, display_names=app_data['canonical_to_zh_map'])
+    return {'neighbor_tables': tables, 'neighbor_export_path': export_path}
+
+
+# 子系统名 -> (加载函数, 依赖的子系统)
+SUBSYSTEMS = {
+    'ingredients': (load_ingredients, ()),
+    'embeddings': (load_embeddings, ('ingredients',)),
+    'recipes': (load_recipes, ('ingredients',)),
+    'complements': (load_complements, ('recipes',)),
+    'classic': (load_classic, ('ingredients', 'recipes')),
+    'flavor': (load_flavor, ('ingredients',)),
+    'multimodal': (load_multimodal, ('ingredients',)),
+    'innovative': (load_innovative, ('flavor', 'multimodal')),
+    'neighbors': (load_neighbors, ('classic', 'flavor', 'multimodal')),
+}
+
+
+async def warm_up(app_data: dict, registry: Readiness = readiness) -> bool:
+    """
+    在后台按依赖顺序加载全部子系统，互不依赖的子系统在线程池中并行加载。
+    某个子系统失败时，依赖它的子系统也标记为失败，其余子系统照常加载。
+    registry 记录加载进度；热重载时传入独立的实例，不影响正在服务的快照。返回是否全部就绪。
+    """
+    CACHE_DIR.mkdir(exist_ok=True)
+    registry.register(SUBSYSTEMS)
+    tasks = {}
+
+    async def run(name: str):
+        loader, dependencies = SUBSYSTEMS[name]
+        for dependency in dependencies:
+            if not await tasks[dependency]:
+                registry.mark_failed(name, f"依赖的子系统 '{dependency}' 加载失败")
+                return False
+        registry.mark_loading(name)
+        try:
+            entries = await asyncio.to_thread(loader, app_data)
+        except Exception as e:
+            traceback.print_exc()
+            registry.mark_failed(name, f"{type(e).__name__}: {e}")
+            print(f"--- 子系统 '{name}' 加载失败 ---")
+            return False
+        app_data.update(entries)
+        registry.mark_ready(name)
+        print(f"--- 子系统 '{name}' 已就绪 ---")
+        return True
+
+    for name in SUBSYSTEMS:
+        tasks[name] = asyncio.ensure_future(run(name))
+    await asyncio.gather(*tasks.values())
+
+    ready = registry.all_ready()
+    if ready and registry is readiness:
+        print("--- Server is Ready! ---")
+    return ready
@@ -1,14 +1,62 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from .models import Base
 
 DATABASE_URL = "sqlite:///./food_app.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./food_app.db"
+
+# WAL 下读写互不阻塞；NORMAL 在 WAL 模式下仍能保证崩溃后的一致性
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # 约 16MB
+}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 
 engine = create_engine(
     DATABASE_URL, connect_args={"check_same_thread": False}
 )
+event.listen(engine, "connect", _apply_sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 用户/偏好接口使用的异步引擎，等待数据库时不占用线程池
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=5, max_overflow=10)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+class LazySession:
+    """
+    首次访问属性时才创建真正的 Session；从未使用过则不创建，也无需关闭。
+    不查询用户数据的请求 (如不带 username 的推荐) 因此完全不接触数据库。
+    """
+
+    def __init__(self, factory=SessionLocal):
+        self._factory = factory
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
 def create_db_and_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
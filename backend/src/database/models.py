@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, LargeBinary
 from sqlalchemy.orm import relationship, declarative_base
 
 # 基础类
@@ -12,6 +12,8 @@ class User(Base):
     
     preferences = relationship("Preference", back_populates="user", cascade="all, delete-orphan")
     liked_combinations = relationship("LikedCombination", back_populates="user", cascade="all, delete-orphan")
+    taste_profile = relationship("UserTasteProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    sessions = relationship("UserSession", back_populates="user", cascade="all, delete-orphan")
 
 class Preference(Base):
     __tablename__ = "preferences"
@@ -37,4 +39,36 @@ class CombinationIngredient(Base):
     ingredient_name = Column(String, index=True)
     combination_id = Column(Integer, ForeignKey("liked_combinations.id"))
     
-    combination = relationship("LikedCombination", back_populates="ingredients")
\ No newline at end of file
+    combination = relationship("LikedCombination", back_populates="ingredients")
+
+class UserTasteProfile(Base):
+    """
+    物化的用户口味: 单个点赞食材向量之和、各点赞组合平均向量之和及各自的数量。
+    口味向量 = (preference_sum + combination_sum) / (preference_count + combination_count)。
+    embedding_version 与当前嵌入不一致 (或为空) 时需要从点赞记录重建。
+    """
+    __tablename__ = "user_taste_profiles"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    preference_sum = Column(LargeBinary)
+    preference_count = Column(Integer, default=0)
+    combination_sum = Column(LargeBinary)
+    combination_count = Column(Integer, default=0)
+    embedding_version = Column(String, nullable=True)
+    version = Column(Integer, nullable=False)
+
+    # 乐观锁: 并发修改同一份口味时，后提交的一方会得到 StaleDataError
+    __mapper_args__ = {"version_id_col": version}
+
+    user = relationship("User", back_populates="taste_profile")
+
+class UserSession(Base):
+    """
+    登录后签发的短期会话令牌。只保存令牌的 sha256，数据库泄露时令牌本身不可用。
+    expires_at 为 Unix 时间戳 (秒)。
+    """
+    __tablename__ = "user_sessions"
+    token_hash = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    expires_at = Column(Float, nullable=False)
+
+    user = relationship("User", back_populates="sessions")
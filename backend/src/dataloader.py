@@ -1,8 +1,15 @@
 import pandas as pd
+import numpy as np
+import os
 from pathlib import Path
 from collections import defaultdict
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
 import json
+from typing import Dict, Iterator, List, Tuple
+
+from .recipe_store import RecipeStore
 
 def load_ingredient_data(data_path: Path):
     """
@@ -43,71 +50,119 @@ def load_ingredient_data(data_path: Path):
     ingr_comp_df['ingr_id'] = pd.to_numeric(ingr_comp_df['ingr_id'])
     ingr_comp_df['comp_id'] = pd.to_numeric(ingr_comp_df['comp_id'])
     
-    ingr_comp_dict = defaultdict(set)
-    for index, row in ingr_comp_df.iterrows():
-        ingr_comp_dict[row['ingr_id']].add(row['comp_id'])
+    ingr_comp_dict = defaultdict(set, ingr_comp_df.groupby('ingr_id')['comp_id'].agg(set).to_dict())
         
     print(f"加载完成: {len(ingr_info_df)} 种食材, {len(comp_info_df)} 种风味化合物。")
     return ingr_info_df, comp_info_df, ingr_comp_dict
 
 
-def load_recipes_data(data_path: Path, ingr_info_df: pd.DataFrame):
+RECIPE_FILES = ['allr_recipes.txt', 'epic_recipes.txt', 'menu_recipes.txt']
+
+
+def recipe_vocabulary(ingr_info_df: pd.DataFrame) -> List[str]:
+    """食谱存储使用的词表: 按食材ID排序的标准名称，与嵌入矩阵的行顺序保持一致。"""
+    return ingr_info_df.sort_values('id')['name'].tolist()
+
+
+def _recipe_name_index(ingr_info_df: pd.DataFrame) -> Dict[str, int]:
+    """把食谱文件中带空格的食材名直接映射到词表位置。"""
+    vocab_index = {name: i for i, name in enumerate(recipe_vocabulary(ingr_info_df))}
+    return {name.replace('_', ' '): vocab_index[name] for name in ingr_info_df['name']}
+
+
+def _iter_recipe_file(path: Path, name_to_index: Dict[str, int]) -> Iterator[List[int]]:
+    """
+    解析单个食谱文件，逐份产出排序去重后的词表位置列表 (见 recipe_vocabulary)。
+    不可识别的食材会被忽略，没有任何可识别食材的食谱会被丢弃；读取出错时保留已解析的部分。
+    iter_recipe_chunks 与并行加载共用这一份解析规则。
+    """
+    print(f"正在处理文件: {path.name}")
+    try:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                parts = line.strip().split('\t')
+                
+                if len(parts) < 2:
+                    continue
+
+                current_recipe = {
+                    name_to_index[name] for name in parts[1:] if name in name_to_index
+                }
+                
+                # 只有当食谱中至少有一个可识别的食材时，才将其添加到最终列表中
+                if current_recipe:
+                    yield sorted(current_recipe)
+
+    except Exception as e:
+        print(f"读取文件 {path.name} 时发生严重错误: {e}")
+
+
+def _parse_recipe_file(path: Path, name_to_index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """解析单个食谱文件，返回 (每份食谱的食材数, 扁平的词表位置数组)。放在模块级以便在子进程中执行。"""
+    lengths, flat = [], []
+    for recipe in _iter_recipe_file(path, name_to_index):
+        flat.extend(recipe)
+        lengths.append(len(recipe))
+    return np.asarray(lengths, dtype=np.int64), np.asarray(flat, dtype=np.int32)
+
+
+def iter_recipe_chunks(data_path: Path, ingr_info_df: pd.DataFrame, chunk_size: int = 50000) -> Iterator[List[List[int]]]:
     """
-    加载所有食谱数据，并将其转换为包含食材标准名称集合的列表。
+    逐文件、逐块地解析食谱，每次产出最多 chunk_size 份食谱。
+
+    每份食谱是排序去重后的词表位置列表，解析规则见 _iter_recipe_file。
+    """
+    recipes_path = data_path / "scirep-cuisines-detail"
+    name_to_index = _recipe_name_index(ingr_info_df)
+
+    chunk = []
+    for file_name in RECIPE_FILES:
+        for recipe in _iter_recipe_file(recipes_path / file_name, name_to_index):
+            chunk.append(recipe)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def load_recipes_data(data_path: Path, ingr_info_df: pd.DataFrame, workers: int = None) -> RecipeStore:
+    """
+    加载所有食谱数据，并将其转换为紧凑的 RecipeStore。
+
+    各食谱文件在独立进程中并行解析，结果按 RECIPE_FILES 的顺序拼接，
+    与逐行顺序解析得到的食谱编号完全一致。
 
     Args:
         data_path (Path): 指向 flavor_network_data 目录的路径对象。
         ingr_info_df (pd.DataFrame): 从 load_ingredient_data 加载的食材信息DataFrame。
+        workers (int, optional): 解析进程数，默认每个文件一个 (不超过 CPU 数)；为 1 时在当前进程解析。
 
     Returns:
-        List[Set[str]]: 一个食谱列表，其中每个食谱是一个包含食材标准名称的集合。
+        RecipeStore: 以 CSR 保存食材ID的食谱存储，带 食材 -> 食谱 倒排索引。
+                     词表为按ID排序的食材标准名称。
     """
     print("开始加载食谱数据...")
-    recipes_path = data_path / "scirep-cuisines-detail"
-    
-    # 查找字典
-    # name_to_id: 用于将在文件中找到的、带空格的食材名映射到ID
-    name_to_id = {
-        name.replace('_', ' '): ing_id 
-        for ing_id, name in zip(ingr_info_df['id'], ingr_info_df['name'])
-    }
-    id_to_name = pd.Series(ingr_info_df.name.values, index=ingr_info_df.id).to_dict()
-    
-    recipe_files = ['allr_recipes.txt', 'epic_recipes.txt', 'menu_recipes.txt']
-    # 最终结果是一个列表
-    recipes_list_of_sets = []
-    
-    for file_name in recipe_files:
-        print(f"正在处理文件: {file_name}")
-        try:
-            with open(recipes_path / file_name, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    parts = line.strip().split('\t')
-                    
-                    if len(parts) < 2:
-                        continue
-
-                    ingredient_names_from_file = parts[1:]
-                    current_recipe_as_names = set()
-                    
-                    for name in ingredient_names_from_file:
-                        ingr_id = name_to_id.get(name)
-                        if ingr_id is not None:
-                            # 查找ID对应的标准名称
-                            canonical_name = id_to_name.get(ingr_id)
-                            if canonical_name:
-                                current_recipe_as_names.add(canonical_name)
-                    
-                    # 只有当食谱中至少有一个可识别的食材时，才将其添加到最终列表中
-                    if current_recipe_as_names:
-                        recipes_list_of_sets.append(current_recipe_as_names)
-
-        except Exception as e:
-            print(f"读取文件 {file_name} 时发生严重错误: {e}")
-
-    print(f"加载完成: {len(recipes_list_of_sets)} 份食谱。")
+    recipe_paths = [data_path / "scirep-cuisines-detail" / file_name for file_name in RECIPE_FILES]
+    name_to_index = _recipe_name_index(ingr_info_df)
+    workers = workers or min(len(recipe_paths), os.cpu_count() or 1)
+
+    if workers > 1:
+        # 服务端在线程中调用本函数，用 spawn 避免 fork 多线程进程
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+            parsed = list(executor.map(_parse_recipe_file, recipe_paths, repeat(name_to_index)))
+    else:
+        parsed = [_parse_recipe_file(path, name_to_index) for path in recipe_paths]
+
+    lengths = np.concatenate([p[0] for p in parsed])
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate([p[1] for p in parsed])
+    store = RecipeStore(indptr, indices, recipe_vocabulary(ingr_info_df))
+    print(f"加载完成: {len(store)} 份食谱。")
     
-    return recipes_list_of_sets
+    return store
 
 def load_translation_data(i18n_path: Path):
     """加载翻译和别名数据。"""
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+
+from .dataloader import load_ingredient_data, load_recipes_data, load_translation_data, recipe_vocabulary
+from .recipe_store import RecipeStore
+
+BUNDLE_FORMAT_VERSION = 1
+
+
+class DatasetBundle:
+    """
+    解析后的全部输入数据: 食材表、化合物表、食材-化合物 CSR、食谱 CSR、翻译词典与对齐嵌入。
+
+    以单个未压缩的 .npz 保存，字符串列存为定长 unicode 数组，读取时无需 pickle，也不再解析任何文本文件。
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: dict):
+        self.arrays = arrays
+        self.meta = meta
+
+    @classmethod
+    def from_sources(cls, data_path: Path, i18n_path: Path, embeddings_path: Path, inputs: dict = None) -> "DatasetBundle":
+        """解析原始文本数据。inputs 为输入文件指纹，写入元数据供之后判断新旧。"""
+        ingr_info, comp_info, ingr_comp = load_ingredient_data(data_path)
+        alias_map, zh_map, base_map = load_translation_data(i18n_path)
+        recipes = load_recipes_data(data_path, ingr_info)
+
+        comp_ingr_ids = np.array(sorted(ingr_comp), dtype=np.int64)
+        comp_lengths = [len(ingr_comp[i]) for i in comp_ingr_ids]
+        comp_indptr = np.zeros(len(comp_ingr_ids) + 1, dtype=np.int64)
+        np.cumsum(comp_lengths, out=comp_indptr[1:])
+        comp_indices = np.array([c for i in comp_ingr_ids for c in sorted(ingr_comp[i])], dtype=np.int64)
+
+        arrays = {
+            'ingr_id': ingr_info['id'].to_numpy(dtype=np.int64),
+            'ingr_name': ingr_info['name'].to_numpy(dtype=str),
+            'ingr_category': ingr_info['category'].astype(str).to_numpy(dtype=str),
+            'comp_id': comp_info['id'].to_numpy(dtype=np.int64),
+            'comp_name': comp_info['name'].astype(str).to_numpy(dtype=str),
+            'comp_cas': comp_info['cas'].astype(str).to_numpy(dtype=str),
+            'comp_pubchem': comp_info['pubchem'].astype(str).to_numpy(dtype=str),
+            'ingr_comp_ingr_ids': comp_ingr_ids,
+            'ingr_comp_indptr': comp_indptr,
+            'ingr_comp_indices': comp_indices,
+            'recipe_indptr': recipes.indptr,
+            'recipe_indices': recipes.indices,
+            'embeddings': np.load(embeddings_path),
+        }
+        meta = {
+            'format_version': BUNDLE_FORMAT_VERSION,
+            'inputs': inputs or {},
+            'alias_to_canonical': alias_map,
+            'canonical_to_zh': zh_map,
+            'canonical_to_base': base_map,
+        }
+        return cls(arrays, meta)
+
+    def save(self, path: Path):
+        """原子替换写出。冷缓存时多个 worker 可能同时生成数据包，临时文件按进程区分，互不覆盖。"""
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        meta = np.array(json.dumps(self.meta, ensure_ascii=False))
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, meta=meta, **self.arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["DatasetBundle"]:
+        """读取数据包；版本不符时返回 None。"""
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            if meta.get('format_version') != BUNDLE_FORMAT_VERSION:
+                return None
+            arrays = {key: npz[key] for key in npz.files if key != 'meta'}
+        return cls(arrays, meta)
+
+    @property
+    def inputs(self) -> dict:
+        return self.meta['inputs']
+
+    @property
+    def version(self) -> str:
+        """由全部输入文件的哈希得到的版本标记。只反映输入文件，服务时的数据版本还包含相似度产物 (见 warmup.data_version)。"""
+        digests = sorted((path, fingerprint['sha256'] or '') for path, fingerprint in self.inputs.items())
+        return hashlib.sha256(json.dumps(digests).encode()).hexdigest()[:16]
+
+    def ingredient_data(self):
+        """与 load_ingredient_data 相同的返回值: (ingr_info_df, comp_info_df, ingr_comp_dict)。"""
+        a = self.arrays
+        ingr_info_df = pd.DataFrame({'id': a['ingr_id'], 'name': a['ingr_name'].astype(object), 'category': a['ingr_category'].astype(object)})
+        comp_info_df = pd.DataFrame({
+            'id': a['comp_id'], 'name': a['comp_name'].astype(object),
+            'cas': a['comp_cas'].astype(object), 'pubchem': a['comp_pubchem'].astype(object),
+        })
+        indptr, indices = a['ingr_comp_indptr'], a['ingr_comp_indices']
+        ingr_comp_dict = defaultdict(set, {
+            int(ingr_id): set(indices[indptr[i]:indptr[i + 1]].tolist())
+            for i, ingr_id in enumerate(a['ingr_comp_ingr_ids'])
+        })
+        return ingr_info_df, comp_info_df, ingr_comp_dict
+
+    def translation_data(self):
+        """与 load_translation_data 相同的返回值。"""
+        return self.meta['alias_to_canonical'], self.meta['canonical_to_zh'], self.meta['canonical_to_base']
+
+    def recipe_store(self, ingr_info_df: pd.DataFrame) -> RecipeStore:
+        return RecipeStore(self.arrays['recipe_indptr'], self.arrays['recipe_indices'], recipe_vocabulary(ingr_info_df))
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self.arrays['embeddings']
@@ -0,0 +1,53 @@
+import numpy as np
+from typing import Sequence
+
+
+class EmbeddingStore:
+    """
+    预先单位化的食材嵌入。
+
+    `align_and_inject.py` 会为未对齐的食材写入全零行，这些行在 `valid` 中为 False，
+    打分时统一用 invalid_value 填充，而不是得到未定义的余弦值。
+    查询打分就是一次 (m x d) @ (d x N) 的矩阵乘法，不再对整个嵌入矩阵重复归一化。
+    """
+
+    def __init__(self, embeddings: np.ndarray, names: Sequence[str]):
+        if len(embeddings) != len(names):
+            raise ValueError(f"嵌入行数 {len(embeddings)} 与食材数量 {len(names)} 不一致。")
+        self.vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.names = list(names)
+        self.name_to_idx = {name: i for i, name in enumerate(self.names)}
+
+        norms = np.linalg.norm(self.vectors, axis=1)
+        self.valid = norms > 0
+        self.unit = np.zeros_like(self.vectors)
+        self.unit[self.valid] = self.vectors[self.valid] / norms[self.valid, None]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def vector(self, name: str) -> np.ndarray:
+        return self.vectors[self.name_to_idx[name]]
+
+    @staticmethod
+    def normalize(queries: np.ndarray) -> np.ndarray:
+        """逐行单位化查询向量，零向量保持为零。"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        return np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+
+    def score(self, queries: np.ndarray, invalid_value: float = -np.inf) -> np.ndarray:
+        """
+        计算查询与所有食材的余弦相似度。
+
+        Args:
+            queries: 单个向量 (d,) 或一批向量 (m, d)。
+            invalid_value: 未对齐 (零向量) 食材的填充值，默认 -inf 使其不会被选中。
+
+        Returns:
+            与输入对应的 (N,) 或 (m, N) float32 数组。
+        """
+        single = np.ndim(queries) == 1
+        scores = self.normalize(queries) @ self.unit.T
+        scores[:, ~self.valid] = invalid_value
+        return scores[0] if single else scores
@@ -0,0 +1,109 @@
+import numpy as np
+from typing import List, Optional, Sequence
+
+from .matrix_store import SimilarityMatrix
+
+DEFAULT_FLAVOR_WEIGHT = 0.6
+DEFAULT_MULTIMODAL_WEIGHT = 0.4
+
+
+class InnovativeScorer:
+    """
+    创新模式的打分内核，所有数组都按词表 (ingredient_name_list) 的整数位置对齐。
+
+    食材类别在加载时编码为整数数组，词表到两个矩阵行列的位置映射也预先算好；
+    请求时只做锚点行求和、加权混合、布尔掩码屏蔽 (锚点、排除项、锚点同类食材) 和一次部分选择，
+    不再构造按标签对齐的 Series，也没有逐个候选的 Python 循环。
+    """
+
+    def __init__(self, flavor_sim: SimilarityMatrix, multimodal_sim: SimilarityMatrix, vocabulary: Sequence[str], categories: Sequence[Optional[str]]):
+        self.flavor_sim = flavor_sim
+        self.multimodal_sim = multimodal_sim
+        self.vocabulary = list(vocabulary)
+        self.vocab_index = {name: i for i, name in enumerate(self.vocabulary)}
+        # 类别编码从 1 开始，0 表示没有类别 (与其他无类别食材视为同一类，和原先按类别名比较一致)
+        codes = {}
+        self.category_codes = np.array(
+            [0 if category is None else codes.setdefault(category, len(codes) + 1) for category in categories],
+            dtype=np.int32
+        )
+        self.n_categories = len(codes) + 1
+        self.flavor_positions = self._alignment(flavor_sim)
+        self.multimodal_positions = self._alignment(multimodal_sim)
+
+    def _alignment(self, matrix: SimilarityMatrix) -> Optional[np.ndarray]:
+        """词表位置 -> 矩阵位置；两者顺序一致时返回 None，打分时省去一次重排。"""
+        positions = matrix.positions(self.vocabulary)
+        return None if np.array_equal(positions, np.arange(len(positions))) else positions
+
+    def ids(self, names: Sequence[str]) -> np.ndarray:
+        return np.array([self.vocab_index[name] for name in names if name in self.vocab_index], dtype=np.int64)
+
+    @staticmethod
+    def _anchor_sum(matrix: SimilarityMatrix, alignment: Optional[np.ndarray], anchor_ids: np.ndarray) -> np.ndarray:
+        if alignment is None:
+            return matrix.rows_at(anchor_ids).sum(axis=0)
+        return matrix.rows_at(alignment[anchor_ids]).sum(axis=0)[alignment]
+
+    def scores(self, anchor_ids: np.ndarray, flavor_weight: float = DEFAULT_FLAVOR_WEIGHT,
+               multimodal_weight: float = DEFAULT_MULTIMODAL_WEIGHT,
+               taste_scores: np.ndarray = None, taste_weight: float = 0.0) -> np.ndarray:
+        """
+        flavor_weight * 风味行和 + multimodal_weight * 多模态行和；给出口味分数 (按词表顺序) 时
+        再与之按 taste_weight 混合。权重为 0 的矩阵不读取。
+        """
+        scores = np.zeros(len(self.vocabulary), dtype=np.float32)
+        if flavor_weight:
+            scores = flavor_weight * self._anchor_sum(self.flavor_sim, self.flavor_positions, anchor_ids)
+        if multimodal_weight:
+            scores = scores + multimodal_weight * self._anchor_sum(self.multimodal_sim, self.multimodal_positions, anchor_ids)
+        if taste_scores is not None:
+            scores = (1 - taste_weight) * scores + taste_weight * taste_scores
+        return scores
+
+    def batch_scores(self, anchor_id_lists: List[np.ndarray], flavor_weights: np.ndarray, multimodal_weights: np.ndarray) -> np.ndarray:
+        """多组锚点一起打分: 每个矩阵只做一次 (查询数 x N) 的矩阵乘法，返回按词表顺序的 (查询数 x N) 分数。"""
+        scores = np.zeros((len(anchor_id_lists), len(self.vocabulary)), dtype=np.float32)
+        for matrix, alignment, weights in [
+            (self.flavor_sim, self.flavor_positions, np.asarray(flavor_weights, dtype=np.float32)),
+            (self.multimodal_sim, self.multimodal_positions, np.asarray(multimodal_weights, dtype=np.float32)),
+        ]:
+            if not weights.any():
+                continue
+            # 每个查询一行锚点指示向量
+            indicator = np.zeros((len(anchor_id_lists), len(matrix)), dtype=np.float32)
+            for row, anchor_ids in enumerate(anchor_id_lists):
+                indicator[row, anchor_ids if alignment is None else alignment[anchor_ids]] = 1
+            row_sums = matrix.combine_rows(indicator)
+            if alignment is not None:
+                row_sums = row_sums[:, alignment]
+            scores = scores + weights[:, None] * row_sums
+        return scores
+
+    def blocked(self, anchor_ids: np.ndarray, excluded_ids: np.ndarray = None) -> np.ndarray:
+        """不参与排名的食材: 锚点、排除项，以及与任一锚点同类的食材。"""
+        blocked_categories = np.zeros(self.n_categories, dtype=bool)
+        blocked_categories[self.category_codes[anchor_ids]] = True
+        blocked = blocked_categories[self.category_codes]
+        blocked[anchor_ids] = True
+        if excluded_ids is not None:
+            blocked[excluded_ids] = True
+        return blocked
+
+    @staticmethod
+    def top_n(scores: np.ndarray, blocked: np.ndarray, top_n: int) -> np.ndarray:
+        """
+        未屏蔽食材中分数最高的 top_n 个位置，按分数降序。
+
+        先用 np.partition 找到第 top_n 名的分数，只对不低于它的候选排序；
+        稳定排序使同分时按词表顺序排列，与 Series.nlargest 的结果一致。
+        """
+        candidates = np.flatnonzero(~blocked)
+        if top_n <= 0 or candidates.size == 0:
+            return candidates[:0]
+        candidate_scores = scores[candidates]
+        if top_n < candidates.size:
+            kth = candidates.size - top_n
+            keep = candidate_scores >= np.partition(candidate_scores, kth)[kth]
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+        return candidates[np.argsort(-candidate_scores, kind='stable')[:top_n]]
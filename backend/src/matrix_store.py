@@ -0,0 +1,295 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+# 2: top-K 稀疏矩阵保存为对称形式 (max(A, A.T))；更早版本的文件需要重新构建
+MATRIX_FORMAT_VERSION = 2
+# 分块计算时每块最多约 6400 万个 float32 (256 MB)
+BLOCK_ELEMENT_BUDGET = 1 << 26
+
+
+def default_block_rows(n: int) -> int:
+    """分块计算 N 列的相似度时，每块的行数。"""
+    return max(1, min(n, BLOCK_ELEMENT_BUDGET // max(n, 1)))
+
+
+class SimilarityMatrix:
+    """
+    方阵相似度矩阵的轻量访问器：按标签取行/取值，底层数组可以是 np.memmap。
+
+    行与列共用同一组标签。以只读 memmap 打开时，同一台机器上的所有 worker
+    共享操作系统页缓存中的同一份数据，启动时也无需解析。
+    """
+
+    def __init__(self, values: np.ndarray, labels: Sequence[str]):
+        if values.shape != (len(labels), len(labels)):
+            raise ValueError(f"矩阵形状 {values.shape} 与标签数量 {len(labels)} 不一致。")
+        self.values = values
+        self._set_labels(labels)
+
+    def _set_labels(self, labels: Sequence[str]):
+        self.labels = list(labels)
+        self.label_to_pos = {label: i for i, label in enumerate(self.labels)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SimilarityMatrix":
+        return cls(np.ascontiguousarray(df.values, dtype=np.float32), df.index.tolist())
+
+    def __contains__(self, label) -> bool:
+        return label in self.label_to_pos
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def position(self, label: str) -> int:
+        return self.label_to_pos[label]
+
+    def positions(self, labels: Iterable[str]) -> np.ndarray:
+        return np.array([self.label_to_pos[label] for label in labels], dtype=np.int64)
+
+    def row(self, label: str) -> np.ndarray:
+        return self.values[self.label_to_pos[label]]
+
+    def rows(self, labels: Iterable[str]) -> np.ndarray:
+        return self.rows_at(self.positions(labels))
+
+    def rows_at(self, positions: np.ndarray) -> np.ndarray:
+        """按行位置取若干整行 (len(positions) x N)。"""
+        return self.values[positions]
+
+    def value(self, label1: str, label2: str) -> float:
+        return float(self.values[self.label_to_pos[label1], self.label_to_pos[label2]])
+
+    def block(self, row_positions: np.ndarray, col_positions: np.ndarray) -> np.ndarray:
+        """行列位置交叉处的稠密子矩阵 (len(row_positions) x len(col_positions))。"""
+        return np.asarray(self.values[np.ix_(row_positions, col_positions)], dtype=np.float32)
+
+    def pairs(self, positions1: np.ndarray, positions2: np.ndarray) -> np.ndarray:
+        """逐对取值: 第 i 个结果为 (positions1[i], positions2[i]) 处的相似度。"""
+        return self.values[positions1, positions2]
+
+    def combine_rows(self, weights: np.ndarray) -> np.ndarray:
+        """按权重组合各行: weights (m x N) @ 矩阵，一次得到 m 组行的加权和。"""
+        return weights @ self.values
+
+    def sum_rows(self, labels: Iterable[str]) -> pd.Series:
+        """对若干行求和，返回以标签为索引的 Series (等价于 df.loc[labels].sum())。"""
+        return pd.Series(self.rows(labels).sum(axis=0), index=self.labels)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values, index=self.labels, columns=self.labels)
+
+
+class SparseSimilarityMatrix(SimilarityMatrix):
+    """
+    每行只保留 top-K 个正相似度 (另加对角线) 的 CSR 矩阵，其余位置视为 0。
+
+    接口与 SimilarityMatrix 相同，推荐与搭配代码无需区分两者；内存与 N x K 成正比，
+    不随食材数量平方增长。构建时取 max(A, A.T) 对称化: (a, b) 只要在任一方向进入了 top-K 就在两行中都保存，
+    于是按行读取 (row/rows_at/block/combine_rows) 与逐对取值 (pairs/value) 得到的值总是一致，
+    每行最多 2K 个非零值 (另加对角线)。
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, labels: Sequence[str], k: int):
+        n = len(labels)
+        if len(indptr) != n + 1:
+            raise ValueError(f"行指针长度 {len(indptr)} 与标签数量 {n} 不一致。")
+        self.csr = sparse.csr_matrix((np.asarray(data, dtype=np.float32), indices, indptr), shape=(n, n))
+        self.csr.sort_indices()
+        self.k = k
+        self._set_labels(labels)
+        # 行内列号升序，row * N + col 在全局上也是升序，逐对取值只需一次二分查找
+        row_of = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.csr.indptr))
+        self._keys = row_of * n + self.csr.indices
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[Tuple[int, np.ndarray]], labels: Sequence[str], k: int) -> "SparseSimilarityMatrix":
+        """
+        从按行分块的稠密相似度 (起始行, 块) 逐块提取每行 top-K 个正值，
+        峰值内存只与块大小 x N 相关，完整的 N x N 矩阵从不出现。
+        """
+        n = len(labels)
+        k = max(0, min(k, n - 1))
+        rows, cols, values = [], [], []
+        for start, block in blocks:
+            block = np.array(block, dtype=np.float32)
+            local = np.arange(block.shape[0])
+            diagonal = block[local, start + local].copy()
+            block[local, start + local] = -np.inf
+
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k] if k else np.empty((len(local), 0), dtype=np.int64)
+            top_scores = np.take_along_axis(block, top, axis=1)
+            keep_row, keep_slot = np.nonzero(top_scores > 0)
+            rows += [start + keep_row, start + local[diagonal != 0]]
+            cols += [top[keep_row, keep_slot], start + local[diagonal != 0]]
+            values += [top_scores[keep_row, keep_slot], diagonal[diagonal != 0]]
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        values = np.concatenate(values) if values else np.empty(0, dtype=np.float32)
+        top_k = sparse.csr_matrix((values, (rows, cols)), shape=(n, n), dtype=np.float32)
+        return cls.symmetrized(top_k, labels, k)
+
+    @classmethod
+    def symmetrized(cls, csr: sparse.csr_matrix, labels: Sequence[str], k: int) -> "SparseSimilarityMatrix":
+        """保存的都是正值，未保存的位置为 0，逐元素取 max(A, A.T) 即把只在一个方向保存的值补到另一行。"""
+        csr = sparse.csr_matrix(csr.maximum(csr.T), dtype=np.float32)
+        csr.sort_indices()
+        return cls(csr.indptr.astype(np.int64), csr.indices.astype(np.int32), csr.data, labels, k)
+
+    @property
+    def shape(self):
+        return self.csr.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.csr.data.nbytes + self.csr.indices.nbytes + self.csr.indptr.nbytes + self._keys.nbytes
+
+    def row(self, label: str) -> np.ndarray:
+        return self.csr[self.label_to_pos[label]].toarray().ravel()
+
+    def rows_at(self, positions: np.ndarray) -> np.ndarray:
+        return self.csr[positions].toarray()
+
+    def _lookup(self, positions1: np.ndarray, positions2: np.ndarray):
+        """返回 (值, 是否存储)，未存储的位置值为 0。"""
+        values = np.zeros(len(positions1), dtype=np.float32)
+        if self._keys.size == 0:
+            return values, np.zeros(len(positions1), dtype=bool)
+        query = positions1 * len(self.labels) + positions2
+        found_at = np.minimum(np.searchsorted(self._keys, query), self._keys.size - 1)
+        found = self._keys[found_at] == query
+        values[found] = self.csr.data[found_at[found]]
+        return values, found
+
+    def pairs(self, positions1: np.ndarray, positions2: np.ndarray) -> np.ndarray:
+        values, _ = self._lookup(np.asarray(positions1, dtype=np.int64), np.asarray(positions2, dtype=np.int64))
+        return values
+
+    def value(self, label1: str, label2: str) -> float:
+        return float(self.pairs([self.label_to_pos[label1]], [self.label_to_pos[label2]])[0])
+
+    def block(self, row_positions: np.ndarray, col_positions: np.ndarray) -> np.ndarray:
+        return self.csr[np.asarray(row_positions)][:, np.asarray(col_positions)].toarray()
+
+    def combine_rows(self, weights: np.ndarray) -> np.ndarray:
+        return np.asarray((self.csr.T @ weights.T).T, dtype=np.float32)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.csr.toarray(), index=self.labels, columns=self.labels)
+
+
+def _matrix_paths(path: Path):
+    path = Path(path)
+    return path.with_suffix(".f32"), path.with_suffix(".labels.json")
+
+
+def similarity_matrix_data_path(path: Path, sparse: bool = False) -> Path:
+    """矩阵的数据文件: 稠密格式为 <path>.f32，top-K 稀疏格式为 <path>.topk.npz。"""
+    return Path(path).with_suffix(".topk.npz") if sparse else _matrix_paths(path)[0]
+
+
+def similarity_matrix_exists(path: Path, sparse: bool = False) -> bool:
+    if sparse:
+        return similarity_matrix_data_path(path, sparse=True).exists()
+    data_path, labels_path = _matrix_paths(path)
+    return data_path.exists() and labels_path.exists()
+
+
+def similarity_matrix_format_version(path: Path, sparse: bool = False) -> Optional[int]:
+    """已保存矩阵的格式版本，只读取元数据；矩阵不存在时返回 None。"""
+    if not similarity_matrix_exists(path, sparse):
+        return None
+    if sparse:
+        with np.load(similarity_matrix_data_path(path, sparse=True)) as data:
+            return json.loads(str(data['meta'])).get("format_version")
+    with open(_matrix_paths(path)[1], 'r', encoding='utf-8') as f:
+        return json.load(f).get("format_version")
+
+
+def save_similarity_matrix(df: pd.DataFrame, path: Path):
+    """
+    以原始 float32 (行优先) 格式保存矩阵，并写出一个小的标签索引 sidecar。
+
+    `path` 不带后缀，例如 cache/classic_similarity 会生成
+    classic_similarity.f32 与 classic_similarity.labels.json。
+    先写数据、后写标签，且都经过临时文件原子替换，标签文件存在即代表矩阵完整。
+    临时文件名带进程号，多个进程同时保存 (如多个 worker 在 build 策略下重建) 时互不覆盖。
+    """
+    data_path, labels_path = _matrix_paths(path)
+    values = np.ascontiguousarray(df.values, dtype=np.float32)
+
+    tmp_data_path = data_path.with_name(f"{data_path.name}.{os.getpid()}.tmp")
+    values.tofile(tmp_data_path)
+    os.replace(tmp_data_path, data_path)
+
+    meta = {
+        "format_version": MATRIX_FORMAT_VERSION,
+        "dtype": "float32",
+        "shape": list(values.shape),
+        "labels": df.index.tolist(),
+    }
+    tmp_labels_path = labels_path.with_name(f"{labels_path.name}.{os.getpid()}.tmp")
+    with open(tmp_labels_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_labels_path, labels_path)
+
+
+def save_sparse_similarity_matrix(matrix: SparseSimilarityMatrix, path: Path):
+    """把 top-K 稀疏矩阵写成单个未压缩的 <path>.topk.npz (按进程区分的临时文件，原子替换)。"""
+    data_path = similarity_matrix_data_path(path, sparse=True)
+    tmp_path = data_path.with_name(f"{data_path.name}.{os.getpid()}.tmp.npz")
+    meta = {"format_version": MATRIX_FORMAT_VERSION, "k": matrix.k, "symmetric": True, "labels": matrix.labels}
+    np.savez(
+        tmp_path,
+        indptr=matrix.csr.indptr, indices=matrix.csr.indices, data=matrix.csr.data,
+        meta=np.array(json.dumps(meta, ensure_ascii=False))
+    )
+    os.replace(tmp_path, data_path)
+
+
+def load_sparse_similarity_matrix(path: Path) -> SparseSimilarityMatrix:
+    data_path = similarity_matrix_data_path(path, sparse=True)
+    with np.load(data_path) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get("format_version") != MATRIX_FORMAT_VERSION:
+            raise ValueError(f"不支持的矩阵格式版本: {meta.get('format_version')} ({data_path})")
+        return SparseSimilarityMatrix(data['indptr'], data['indices'], data['data'], meta["labels"], meta["k"])
+
+
+def load_similarity_matrix(path: Path, sparse: bool = False) -> SimilarityMatrix:
+    """以只读 np.memmap 打开由 save_similarity_matrix 写出的矩阵；sparse 为 True 时读取 top-K 稀疏矩阵。"""
+    if sparse:
+        return load_sparse_similarity_matrix(path)
+    data_path, labels_path = _matrix_paths(path)
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("format_version") != MATRIX_FORMAT_VERSION:
+        raise ValueError(f"不支持的矩阵格式版本: {meta.get('format_version')} ({labels_path})")
+
+    values = np.memmap(data_path, dtype=meta["dtype"], mode='r', shape=tuple(meta["shape"]))
+    return SimilarityMatrix(values, meta["labels"])
+
+
+def load_or_build_similarity_matrix(path: Path, build: Callable[[], pd.DataFrame]) -> SimilarityMatrix:
+    """
+    打开缓存的相似度矩阵；旧版 .feather 缓存会被转换一次；都不存在时调用 build() 计算并保存。
+    """
+    path = Path(path)
+    if not similarity_matrix_exists(path):
+        legacy_path = path.with_suffix(".feather")
+        if legacy_path.exists():
+            print(f"正在把旧版缓存 {legacy_path.name} 转换为内存映射格式...")
+            df = pd.read_feather(legacy_path).set_index('index')
+        else:
+            df = build()
+        save_similarity_matrix(df, path)
+    return load_similarity_matrix(path)
@@ -0,0 +1,209 @@
+import json
+import os
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .matrix_store import SimilarityMatrix, SparseSimilarityMatrix, similarity_matrix_data_path
+
+NEIGHBOR_TOP_K = 100
+NEIGHBOR_FORMAT_VERSION = 1
+
+
+class NeighborTable:
+    """
+    每个食材的 top-K 近邻表 (不含自身)，以紧凑数组保存。
+
+    行号与近邻ID都是 `vocabulary` 中的位置，因此不同相似度矩阵的近邻表可以直接合并。
+    `scores` 每行降序，第 K 个分数是该行所有未入表食材的分数上界。
+    """
+
+    def __init__(self, ids: np.ndarray, scores: np.ndarray, vocabulary: Sequence[str]):
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.vocabulary = list(vocabulary)
+        self.vocab_index = {name: i for i, name in enumerate(self.vocabulary)}
+        self.matrix_positions = None
+
+    @property
+    def k(self) -> int:
+        return self.ids.shape[1]
+
+    @property
+    def thresholds(self) -> np.ndarray:
+        """不在近邻表中的食材，其分数不会超过该行第 K 个分数。"""
+        return self.scores[:, -1]
+
+    @classmethod
+    def build(cls, matrix: SimilarityMatrix, vocabulary: Sequence[str], k: int = NEIGHBOR_TOP_K, block_size: int = 1024) -> "NeighborTable":
+        """按行分块地从相似度矩阵中提取 top-K 近邻，峰值内存只与 block_size x N 相关。"""
+        vocabulary = list(vocabulary)
+        positions = matrix.positions(vocabulary)
+        n = len(vocabulary)
+        k = min(k, n - 1)
+        if isinstance(matrix, SparseSimilarityMatrix):
+            table = cls._from_sparse(matrix, vocabulary, positions, k)
+            table.attach(matrix)
+            return table
+
+        ids = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float32)
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            rows = np.arange(start, stop)
+            block = matrix.block(positions[rows], positions)
+            block[rows - start, rows] = -np.inf
+
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            ids[start:stop] = np.take_along_axis(top, order, axis=1)
+            scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+        table = cls(ids, scores, vocabulary)
+        table.attach(matrix)
+        return table
+
+    @classmethod
+    def _from_sparse(cls, matrix: SparseSimilarityMatrix, vocabulary: List[str], positions: np.ndarray, k: int) -> "NeighborTable":
+        """
+        稀疏矩阵每行只存了 top-K 个值 (对称化后最多 2K 个)，直接按行排序即可，不做 N x N 的扫描。
+        存储不足 K 个的行以分数 0 (即未存储食材的分数) 补齐，近邻ID填自身，合并时会被当作锚点排除。
+        """
+        n = len(vocabulary)
+        to_vocab = np.empty(n, dtype=np.int64)
+        to_vocab[positions] = np.arange(n)
+        csr = matrix.csr[positions]
+        lengths = np.diff(csr.indptr)
+        width = max(int(lengths.max(initial=0)), k)
+
+        row_of = np.repeat(np.arange(n), lengths)
+        slot = np.arange(csr.indices.size) - np.repeat(csr.indptr[:-1], lengths)
+        padded_ids = np.repeat(np.arange(n)[:, None], width, axis=1)
+        padded_scores = np.zeros((n, width), dtype=np.float32)
+        padded_ids[row_of, slot] = to_vocab[csr.indices]
+        padded_scores[row_of, slot] = csr.data
+        padded_scores[padded_ids == np.arange(n)[:, None]] = -np.inf
+
+        order = np.argsort(-padded_scores, axis=1, kind='stable')[:, :k]
+        ids = np.take_along_axis(padded_ids, order, axis=1)
+        scores = np.maximum(np.take_along_axis(padded_scores, order, axis=1), 0)
+        ids = np.where(scores > 0, ids, np.arange(n)[:, None])
+        return cls(ids, scores, vocabulary)
+
+    def attach(self, matrix: SimilarityMatrix):
+        """关联完整矩阵，合并结果的精确分数从这里读取。"""
+        self.matrix_positions = matrix.positions(self.vocabulary)
+
+    def save(self, path: Path, source_stamp: str = ""):
+        tmp_path = Path(path).with_name(f"{Path(path).name}.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_path,
+            ids=self.ids, scores=self.scores,
+            vocabulary=np.array(json.dumps(self.vocabulary, ensure_ascii=False)),
+            meta=np.array(json.dumps({"format_version": NEIGHBOR_FORMAT_VERSION, "source_stamp": source_stamp}))
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, source_stamp: str = "") -> Optional["NeighborTable"]:
+        """读取缓存的近邻表；格式版本或来源标记不一致时返回 None。"""
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get("format_version") != NEIGHBOR_FORMAT_VERSION or meta.get("source_stamp") != source_stamp:
+                return None
+            return cls(data['ids'], data['scores'], json.loads(str(data['vocabulary'])))
+
+
+def matrix_source_stamp(path: Path, sparse: bool = False) -> str:
+    """用矩阵文件的大小与修改时间标记近邻表的来源，矩阵重建 (或换成另一种格式) 后旧近邻表自动失效。"""
+    stat = similarity_matrix_data_path(path, sparse).stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_or_build_neighbor_table(path: Path, matrix: SimilarityMatrix, matrix_path: Path, vocabulary: Sequence[str], k: int = NEIGHBOR_TOP_K,
+                                 save_path: Path = None) -> NeighborTable:
+    """读取 path 处仍然有效的近邻表，否则重新构建并写到 save_path (缺省为 path)。"""
+    source_stamp = matrix_source_stamp(matrix_path, isinstance(matrix, SparseSimilarityMatrix))
+    table = NeighborTable.load(path, source_stamp) if Path(path).exists() else None
+    if table is None or table.k != min(k, len(vocabulary) - 1) or table.vocabulary != list(vocabulary):
+        save_path = save_path or path
+        print(f"正在构建近邻表 {Path(save_path).name} (K={k})...")
+        table = NeighborTable.build(matrix, vocabulary, k)
+        table.save(save_path, source_stamp)
+    else:
+        table.attach(matrix)
+    return table
+
+
+def merge_top_n(
+    terms: List[Tuple[NeighborTable, SimilarityMatrix, float]],
+    anchors: Sequence[int],
+    top_n: int,
+    excluded: np.ndarray
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    基于近邻表的多锚点 top-N 合并。
+
+    候选分数为 sum(weight * matrix[anchor, candidate])。只对各锚点近邻表的并集读取精确分数；
+    任何不在并集中的食材，其分数不超过 sum(weight * 第K个分数)。
+    只有第 N 名不低于这个上界时结果才是精确的，否则返回 None，由调用方回退到完整行计算。
+
+    Args:
+        terms: (近邻表, 对应的完整矩阵, 权重) 列表，权重必须为正，近邻表共享同一 vocabulary。
+        anchors: 锚点在 vocabulary 中的位置。锚点本身总是被排除。
+        top_n: 需要的结果数量。
+        excluded: 长度为词表大小的布尔数组，为 True 的食材不参与排名。
+
+    Returns:
+        (位置数组, 分数数组)，按分数降序；或 None。
+    """
+    anchors = np.asarray(anchors, dtype=np.int64)
+    if anchors.size == 0 or top_n <= 0:
+        return None
+
+    excluded = excluded.copy()
+    excluded[anchors] = True
+
+    candidates = np.unique(np.concatenate([table.ids[anchors].ravel() for table, _, _ in terms]))
+    candidates = candidates[~excluded[candidates]]
+    if candidates.size < top_n:
+        return None
+
+    scores = np.zeros(candidates.size)
+    unseen_upper = 0.0
+    for table, matrix, weight in terms:
+        rows = matrix.block(table.matrix_positions[anchors], table.matrix_positions[candidates])
+        scores += weight * rows.sum(axis=0, dtype=np.float64)
+        unseen_upper += weight * float(table.thresholds[anchors].sum(dtype=np.float64))
+
+    order = np.argsort(-scores, kind='stable')[:top_n]
+    # 还有未出现在任何近邻表中的候选时，第 N 名必须不低于它们的上界
+    if (~excluded).sum() > candidates.size and scores[order[-1]] < unseen_upper:
+        return None
+    return candidates[order], scores[order]
+
+
+def export_neighbor_tables(tables: Dict[str, NeighborTable], path: Path, k: int = 20, display_names: Dict[str, str] = None):
+    """
+    把近邻表导出为静态 JSON，供前端直接加载。
+
+    结构: {"k": k, "ingredients": [...], "display_names": [...], "modes": {mode: {"ids": [[...]], "scores": [[...]]}}}
+    """
+    vocabulary = next(iter(tables.values())).vocabulary
+    payload = {
+        "k": k,
+        "ingredients": vocabulary,
+        "display_names": [(display_names or {}).get(name, name) for name in vocabulary],
+        "modes": {
+            mode: {
+                "ids": table.ids[:, :k].tolist(),
+                "scores": np.round(table.scores[:, :k].astype(np.float64), 4).tolist(),
+            }
+            for mode, table in tables.items()
+        },
+    }
+    tmp_path = Path(path).with_name(f"{Path(path).name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
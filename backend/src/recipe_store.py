@@ -0,0 +1,115 @@
+import numpy as np
+from typing import Iterable, Iterator, List, Sequence, Set
+
+
+class RecipeStore:
+    """
+    紧凑的食谱存储。
+
+    食谱以 CSR 布局保存：`indptr[r]:indptr[r+1]` 是第 r 份食谱在 `indices` 中的区间，
+    `indices` 里是排序去重后的 int32 食材ID (即 `vocabulary` 中的位置)。
+    同时维护一份 食材 -> 食谱 的倒排表 (同样是 CSR)，锚点/排除过滤由倒排表求交完成，
+    只触达真正匹配的食谱，而不是逐个扫描全部食谱。
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, vocabulary: Sequence[str]):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.vocabulary = list(vocabulary)
+        self.name_to_id = {name: i for i, name in enumerate(self.vocabulary)}
+        self._build_postings()
+
+    @classmethod
+    def from_id_lists(cls, recipes: Iterable[Sequence[int]], vocabulary: Sequence[str]) -> "RecipeStore":
+        """由 "每份食谱一个食材ID序列" 构建存储，空食谱会被丢弃。"""
+        lengths = [0]
+        chunks = []
+        for ids in recipes:
+            ids = np.unique(np.asarray(ids, dtype=np.int32))
+            if ids.size == 0:
+                continue
+            chunks.append(ids)
+            lengths.append(ids.size)
+        indptr = np.cumsum(lengths, dtype=np.int64)
+        indices = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+        return cls(indptr, indices, vocabulary)
+
+    def _build_postings(self):
+        n_vocab = len(self.vocabulary)
+        recipe_ids = np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.indptr))
+        # 稳定排序保证每条倒排表内的食谱ID仍是升序
+        order = np.argsort(self.indices, kind="stable")
+        self.posting_indices = recipe_ids[order]
+        counts = np.bincount(self.indices, minlength=n_vocab)
+        self.posting_indptr = np.zeros(n_vocab + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.posting_indptr[1:])
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __getitem__(self, recipe_id: int) -> Set[str]:
+        return {self.vocabulary[i] for i in self.recipe_ingredient_ids(recipe_id)}
+
+    def __iter__(self) -> Iterator[Set[str]]:
+        for recipe_id in range(len(self)):
+            yield self[recipe_id]
+
+    @property
+    def recipe_sizes(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    @property
+    def nbytes(self) -> int:
+        return (self.indptr.nbytes + self.indices.nbytes +
+                self.posting_indptr.nbytes + self.posting_indices.nbytes)
+
+    def recipe_ingredient_ids(self, recipe_id: int) -> np.ndarray:
+        return self.indices[self.indptr[recipe_id]:self.indptr[recipe_id + 1]]
+
+    def postings(self, ingredient_id: int) -> np.ndarray:
+        """包含该食材的所有食谱ID (升序)。"""
+        return self.posting_indices[self.posting_indptr[ingredient_id]:self.posting_indptr[ingredient_id + 1]]
+
+    def ids_for(self, names: Iterable[str]) -> List[int]:
+        """把食材名称转为ID，词表外的名称会被忽略。"""
+        return [self.name_to_id[n] for n in names if n in self.name_to_id]
+
+    def match(self, anchors: Iterable[str], excludes: Iterable[str] = ()) -> np.ndarray:
+        """
+        返回包含全部锚点食材、且不包含任何排除食材的食谱ID (升序)。
+
+        倒排表按长度从短到长依次求交，代价只与匹配食谱的数量相关。
+        """
+        anchors = set(anchors)
+        anchor_ids = self.ids_for(anchors)
+        if len(anchor_ids) < len(anchors):
+            # 有锚点不在词表中，任何食谱都不可能包含它
+            return np.empty(0, dtype=np.int32)
+
+        if anchor_ids:
+            postings = sorted((self.postings(i) for i in anchor_ids), key=len)
+            result = postings[0]
+            for posting in postings[1:]:
+                if result.size == 0:
+                    break
+                result = np.intersect1d(result, posting, assume_unique=True)
+        else:
+            result = np.arange(len(self), dtype=np.int32)
+
+        for ingredient_id in self.ids_for(excludes):
+            if result.size == 0:
+                break
+            result = result[~np.isin(result, self.postings(ingredient_id), assume_unique=True)]
+        return result
+
+    def gather(self, recipe_ids: np.ndarray) -> np.ndarray:
+        """把若干食谱的食材ID拼接成一个扁平数组。"""
+        recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        starts = self.indptr[recipe_ids]
+        lengths = self.indptr[recipe_ids + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.indices[offsets + np.arange(lengths.sum())]
+
+    def ingredient_counts(self, recipe_ids: np.ndarray) -> np.ndarray:
+        """统计每个食材在给定食谱中出现的次数，返回长度为词表大小的数组。"""
+        return np.bincount(self.gather(recipe_ids), minlength=len(self.vocabulary))
@@ -1,15 +1,30 @@
-import pandas as pd
+import numpy as np
 from typing import List, Dict
 
-def recommend(similarity_df: pd.DataFrame, anchor_ingredients: List[str], top_n: int) -> List[dict]:
+from .matrix_store import SimilarityMatrix
+from .neighbors import NeighborTable, merge_top_n
+
+def recommend(similarity: SimilarityMatrix, anchor_ingredients: List[str], top_n: int, neighbors: NeighborTable = None) -> List[dict]:
     """
     通用的推荐函数，根据给定的相似度矩阵进行推荐。
+    提供近邻表时先尝试近邻合并，无法保证精确时才回退到完整行求和。
     """
-    valid_anchors = [ingr for ingr in anchor_ingredients if ingr in similarity_df.index]
+    valid_anchors = [ingr for ingr in anchor_ingredients if ingr in similarity]
     if not valid_anchors:
         return []
 
-    combined_scores = similarity_df.loc[valid_anchors].sum(axis=0)
+    if neighbors is not None:
+        anchor_positions = [neighbors.vocab_index[ingr] for ingr in valid_anchors]
+        excluded = np.zeros(len(neighbors.vocabulary), dtype=bool)
+        merged = merge_top_n([(neighbors, similarity, 1.0)], anchor_positions, top_n, excluded)
+        if merged is not None:
+            positions, scores = merged
+            return [
+                {"ingredient": neighbors.vocabulary[p], "score": float(score)}
+                for p, score in zip(positions, scores)
+            ]
+
+    combined_scores = similarity.sum_rows(valid_anchors)
     combined_scores = combined_scores.drop(labels=valid_anchors, errors='ignore')
     top_recommendations = combined_scores.nlargest(top_n)
     
@@ -19,14 +34,15 @@ def recommend(similarity_df: pd.DataFrame, anchor_ingredients: List[str], top_n:
     ]
     return result
 
-def recommend_classic(similarity_df: pd.DataFrame, anchor_ingredients: List[str], top_n: int) -> List[dict]:
-    return recommend(similarity_df, anchor_ingredients, top_n)
+def recommend_classic(similarity: SimilarityMatrix, anchor_ingredients: List[str], top_n: int, neighbors: NeighborTable = None) -> List[dict]:
+    return recommend(similarity, anchor_ingredients, top_n, neighbors)
 
 def recommend_innovative_filtered(
-    similarity_df: pd.DataFrame, 
+    similarity: SimilarityMatrix, 
     anchor_ingredients: List[str], 
     top_n: int, 
-    category_map: Dict[str, str]
+    category_map: Dict[str, str],
+    neighbors: NeighborTable = None
 ) -> List[dict]:
     """
     在创新推荐中，过滤掉与锚点食材同类的结果。
@@ -34,7 +50,7 @@ def recommend_innovative_filtered(
     anchor_categories = {category_map.get(ingr) for ingr in anchor_ingredients if ingr in category_map}
     
     initial_pool_size = top_n * 10 # 增加初始池的大小，因为很多会被过滤掉
-    initial_recommendations = recommend(similarity_df, anchor_ingredients, initial_pool_size)
+    initial_recommendations = recommend(similarity, anchor_ingredients, initial_pool_size, neighbors)
     
     filtered_recommendations = []
     for item in initial_recommendations:
@@ -50,5 +66,5 @@ def recommend_innovative_filtered(
             
     return filtered_recommendations
 
-def recommend_innovative(similarity_df: pd.DataFrame, anchor_ingredients: List[str], top_n: int, category_map: Dict[str, str]) -> List[dict]:
-    return recommend_innovative_filtered(similarity_df, anchor_ingredients, top_n, category_map)
\ No newline at end of file
+def recommend_innovative(similarity: SimilarityMatrix, anchor_ingredients: List[str], top_n: int, category_map: Dict[str, str], neighbors: NeighborTable = None) -> List[dict]:
+    return recommend_innovative_filtered(similarity, anchor_ingredients, top_n, category_map, neighbors)
\ No newline at end of file
@@ -1,8 +1,27 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+
+from ..innovative_scorer import DEFAULT_FLAVOR_WEIGHT, DEFAULT_MULTIMODAL_WEIGHT
 
 class CombinationPayload(BaseModel):
     """
     用于接收包含食材列表的请求体。
     """
-    combination: List[str]
\ No newline at end of file
+    combination: List[str]
+
+
+class RecommendQuery(BaseModel):
+    """批量推荐中的一组锚点/排除食材。"""
+    ingredients: List[str]
+    exclude: List[str] = []
+    top_n: int = 10
+    flavor_weight: float = DEFAULT_FLAVOR_WEIGHT
+    multimodal_weight: float = DEFAULT_MULTIMODAL_WEIGHT
+
+
+class BatchRecommendPayload(BaseModel):
+    """
+    批量创新推荐的请求体，username 对所有查询生效。
+    """
+    queries: List[RecommendQuery]
+    username: Optional[str] = None
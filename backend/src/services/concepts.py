@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import random
+from fastapi import HTTPException
+from typing import Dict, List, Optional, Type
+
+from .result_cache import ResultCache
+
+CONCEPT_PROMPT = """
+        你是一位富有创意的顶级大厨。请为以下食材组合设计一个菜谱概念。
+        食材: {ingredients}
+
+        请严格按照以下JSON格式返回，不要包含任何markdown标记 (例如 ```json) 或其他解释性文字，只返回纯粹的JSON对象：
+        {{
+          "dish_name": "一个富有创意的菜名",
+          "description": "一句引人入胜的描述，说明这些食材如何协同工作，不超过100字",
+          "key_steps": ["关键步骤1", "关键步骤2", "关键步骤3"],
+          "flavor_profile": "总结这道菜的风味亮点，用3-4个词，以逗号分隔"
+        }}
+        """
+
+
+class ConceptFormatError(ValueError):
+    """模型返回的内容不是合法的概念 JSON。"""
+
+
+class ConceptBackend:
+    """菜谱概念的生成后端。name 会写入缓存键，不同后端的结果互不混用。"""
+    name = "base"
+
+    async def generate(self, ingredients: List[str]) -> dict:
+        raise NotImplementedError
+
+
+class GeminiBackend(ConceptBackend):
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-2.5-flash-lite"):
+        import google.generativeai as genai
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, ingredients: List[str]) -> dict:
+        response = await self.model.generate_content_async(CONCEPT_PROMPT.format(ingredients=', '.join(ingredients)))
+        cleaned_response_text = response.text.strip().replace("```json", "").replace("```", "")
+        try:
+            return json.loads(cleaned_response_text)
+        except json.JSONDecodeError:
+            raise ConceptFormatError(response.text)
+
+
+class StubBackend(ConceptBackend):
+    """
+    本地确定性后端: 同一组食材总是得到同样的概念，不访问网络。
+    用于压测与离线开发；latency 秒模拟模型的响应时间。
+    """
+    name = "stub"
+
+    STYLES = ["慢炖", "香煎", "冷盘", "烤制", "清蒸", "快炒"]
+    FLAVORS = ["鲜香", "酸甜", "浓郁", "清爽", "微辣", "烟熏", "回甘"]
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def generate(self, ingredients: List[str]) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        seed = hashlib.sha256(json.dumps(ingredients, ensure_ascii=False).encode()).digest()
+        rng = random.Random(seed)
+        style = rng.choice(self.STYLES)
+        return {
+            "dish_name": f"{style}{'配'.join(ingredients[:3])}",
+            "description": f"以{style}的方式组合{'、'.join(ingredients)}，让各自的风味相互衬托。",
+            "key_steps": [f"准备{name}" for name in ingredients[:2]] + [f"{style}至入味后装盘"],
+            "flavor_profile": ", ".join(rng.sample(self.FLAVORS, 3)),
+        }
+
+
+# 后端名 -> 类，由 CONCEPT_BACKEND 环境变量选择
+CONCEPT_BACKENDS: Dict[str, Type[ConceptBackend]] = {
+    'gemini': GeminiBackend,
+    'stub': StubBackend,
+}
+
+
+class ConceptService:
+    """
+    异步的菜谱概念生成: 信号量限制同时进行的模型调用数，每次请求有总的截止时间 (含排队)，
+    结果按排序后的规范名组合缓存并可持久化；同一组合的并发请求共用一次调用。
+    """
+
+    def __init__(self, backend: ConceptBackend, cache: ResultCache, max_concurrency: int = 4, timeout: float = 20.0):
+        self.backend = backend
+        self.cache = cache
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _forget(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        # 所有等待者都已超时时也要取走异常，避免 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def cache_key(self, canonical_names: List[str]) -> str:
+        return self.cache.key('concept', self.backend.name, sorted(canonical_names))
+
+    async def _generate(self, ingredients: List[str]) -> dict:
+        async with self._slots:
+            return await self.backend.generate(ingredients)
+
+    async def _call(self, key: str, ingredients: List[str]) -> dict:
+        # 截止时间从排队时算起 (与发起它的请求相同)，包含等待并发名额的时间:
+        # 等待者都已超时时，仍在排队的调用随之取消，过载时不会在名额前堆积无人等待的调用
+        concept = await asyncio.wait_for(self._generate(ingredients), timeout=self.timeout)
+        # 在共用的调用里写缓存: 与等待者超时几乎同时返回的结果也不会被丢弃
+        self.cache.set(key, concept)
+        return concept
+
+    async def generate(self, ingredients: List[str], canonical_names: Optional[List[str]] = None) -> dict:
+        """ingredients 原样写入提示词；canonical_names 用于缓存键，缺省时使用 ingredients。"""
+        key = self.cache_key(canonical_names or ingredients)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(key, ingredients))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        try:
+            # shield: 某个请求超时不会取消其他请求共用的调用
+            concept = await asyncio.wait_for(asyncio.shield(task), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="AI服务响应超时，请稍后再试。")
+        except ConceptFormatError as e:
+            print(f"{self.backend.name} 返回了非JSON格式的内容: {e}")
+            raise HTTPException(status_code=500, detail="AI服务返回格式错误，请稍后再试。")
+        except Exception as e:
+            print(f"调用 {self.backend.name} 生成概念时出错: {e}")
+            raise HTTPException(status_code=500, detail="无法连接AI服务，请稍后再试。")
+        return concept
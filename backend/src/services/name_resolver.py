@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from rapidfuzz import process, fuzz
+
+
+class NameResolver:
+    """
+    食材名称解析服务：别名/规范名精确匹配 -> 中文模糊匹配 -> 英文规范名模糊匹配。
+
+    成功的解析结果放在有界 LRU 中，无法识别的字符串进入负缓存，
+    同一请求里的所有未命中字符串只做一次 `process.cdist` 批量模糊匹配。
+    """
+
+    def __init__(
+        self,
+        alias_to_canonical: Dict[str, str],
+        known_names: Iterable[str],
+        search_list_zh: List[str],
+        zh_to_canonical: Dict[str, str],
+        cache_size: int = 4096,
+        negative_cache_size: int = 4096,
+        score_cutoff: float = 85,
+    ):
+        self.alias_to_canonical = alias_to_canonical
+        self.search_list_en = list(known_names)
+        self.known_names = set(self.search_list_en)
+        self.search_list_zh = list(search_list_zh)
+        self.zh_to_canonical = zh_to_canonical
+        self.cache_size = cache_size
+        self.negative_cache_size = negative_cache_size
+        self.score_cutoff = score_cutoff
+
+        self._cache = OrderedDict()
+        self._negative_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "hits": 0, "negative_hits": 0, "misses": 0,
+            "exact": 0, "fuzzy_zh": 0, "fuzzy_en": 0, "failures": 0,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "cache_size": len(self._cache), "negative_cache_size": len(self._negative_cache)}
+
+    def resolve(self, name: str) -> Optional[str]:
+        return self.resolve_many([name])[0]
+
+    def resolve_many(self, names: List[str]) -> List[Optional[str]]:
+        """把一批输入解析为规范名称，无法识别的位置返回 None。"""
+        normalized = [name.strip().lower() for name in names]
+        resolved = {}
+        pending = []
+
+        with self._lock:
+            for name in dict.fromkeys(normalized):
+                if name in self._cache:
+                    self._cache.move_to_end(name)
+                    resolved[name] = self._cache[name]
+                    self.counters["hits"] += 1
+                elif name in self._negative_cache:
+                    self._negative_cache.move_to_end(name)
+                    resolved[name] = None
+                    self.counters["negative_hits"] += 1
+                else:
+                    self.counters["misses"] += 1
+                    canonical_name = self.alias_to_canonical.get(name, name)
+                    if canonical_name in self.known_names:
+                        resolved[name] = canonical_name
+                        self.counters["exact"] += 1
+                    else:
+                        pending.append(name)
+
+        matches = self._fuzzy_match(pending) if pending else {}
+
+        with self._lock:
+            for name, (canonical_name, kind) in matches.items():
+                resolved[name] = canonical_name
+                self.counters[kind] += 1
+            for name, canonical_name in resolved.items():
+                if canonical_name is None:
+                    self._remember(self._negative_cache, name, None, self.negative_cache_size)
+                else:
+                    self._remember(self._cache, name, canonical_name, self.cache_size)
+
+        return [resolved[name] for name in normalized]
+
+    def _fuzzy_match(self, names: List[str]) -> Dict[str, Tuple[Optional[str], str]]:
+        """
+        对中文名与英文规范名一起做一次 cdist；中文匹配优先，与逐个 extractOne 的语义一致。
+        返回 {输入: (规范名或 None, 计数器名)}。
+        """
+        choices = self.search_list_zh + self.search_list_en
+        scores = process.cdist(names, choices, scorer=fuzz.WRatio, score_cutoff=self.score_cutoff, workers=-1)
+        n_zh = len(self.search_list_zh)
+
+        results = {}
+        for row, name in enumerate(names):
+            zh_scores, en_scores = scores[row, :n_zh], scores[row, n_zh:]
+            matched_zh = self.search_list_zh[int(np.argmax(zh_scores))] if zh_scores.size and zh_scores.max() >= self.score_cutoff else None
+            if matched_zh is not None and self.zh_to_canonical.get(matched_zh) in self.known_names:
+                results[name] = (self.zh_to_canonical[matched_zh], "fuzzy_zh")
+                print(f"模糊匹配(中文)成功: '{name}' -> '{matched_zh}' ({results[name][0]})")
+            elif en_scores.size and en_scores.max() >= self.score_cutoff:
+                results[name] = (self.search_list_en[int(np.argmax(en_scores))], "fuzzy_en")
+                print(f"模糊匹配(英文)成功: '{name}' -> '{results[name][0]}'")
+            else:
+                results[name] = (None, "failures")
+                print(f"匹配失败: 无法为 '{name}' 找到任何相似食材。")
+        return results
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key: str, value, max_size: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
@@ -0,0 +1,68 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from ..core.readiness import RETRY_AFTER_SECONDS
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# 模块级函数，便于在子进程中执行
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    """
+    在专用的进程池中执行 bcrypt，登录高峰时不占用事件循环和共享线程池，也不与推荐计算争抢 GIL。
+
+    进程数与排队数都有上限: 超过 max_pending 个请求同时等待时，
+    新请求最多再等 queue_timeout 秒，仍排不上则返回 503，由客户端稍后重试。
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, queue_timeout: float = 2.0):
+        self.max_workers = max_workers or min(2, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.max_workers * 8
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._slots = asyncio.Semaphore(self.max_pending)
+
+    def start(self):
+        # spawn 启动的子进程不继承父进程的线程与数据库连接
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="登录请求过多，请稍后再试。",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        try:
+            self.start()
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._slots.release()
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
@@ -0,0 +1,290 @@
+import asyncio
+import os
+import time
+import urllib.parse
+from urllib.parse import urlparse
+from parsel import Selector
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from ..core.metrics import registry, span
+from .result_cache import ResultCache
+
+SOURCE_RESULTS = registry.counter("app_recipe_source_requests_total", "菜谱来源的抓取结果 (cached/ok/failed/skipped)", ("source", "status"))
+
+
+def get_source_from_url(url: str) -> str:
+    domain = urlparse(url).netloc.lower()
+
+    # 常见菜谱网站映射
+    if "douguo.com" in domain: return "豆果美食"
+    if "meishijie.cc" in domain: return "美食杰"
+    if "meishichina.com" in domain: return "美食天下"
+    if "xiachufang.com" in domain: return "下厨房"
+    if "bilibili.com" in domain: return "Bilibili"
+    if "zhihu.com" in domain: return "知乎"
+    if "youtube.com" in domain: return "YouTube"
+    if "hongchufu.com" in domain: return "红厨网"
+    if "xiangha.com" in domain: return "香哈菜谱"
+    if "baidu.com" in domain: return "百度经验"
+
+    # 如果都不匹配，返回域名本身 (去掉 www.)
+    return domain.replace("www.", "")
+
+
+# --- 解析函数: (client, base_url, query) -> [{"title", "url", "source"}]，请求失败时抛出异常 ---
+
+# --- 1. 下厨房直连 ---
+async def search_xiachufang(client: httpx.AsyncClient, base_url: str, query: str) -> List[dict]:
+    encoded_query = urllib.parse.quote(query)
+    url = f"{base_url}/search/?keyword={encoded_query}"
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    }
+    response = await client.get(url, headers=headers, follow_redirects=True)
+    response.raise_for_status()
+    selector = Selector(text=response.text)
+    results = []
+    links = selector.css(".normal-recipe-list .recipe .info .name a")
+    for link in links[:6]:
+        title = link.xpath("string(.)").get("").strip()
+        href = link.css("::attr(href)").get()
+        if title and href:
+            results.append({"title": title, "url": f"{base_url}{href}", "source": "下厨房"})
+    return results
+
+
+# --- 2. Bing 通用聚合搜索 ---
+async def search_bing_general(client: httpx.AsyncClient, base_url: str, query: str) -> List[dict]:
+    search_query = f"{query} 做法"
+    encoded_query = urllib.parse.quote(search_query)
+
+    url = f"{base_url}/search?q={encoded_query}"
+
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
+    }
+
+    response = await client.get(url, headers=headers, follow_redirects=True)
+    response.raise_for_status()
+    selector = Selector(text=response.text)
+    results = []
+
+    items = selector.css("li.b_algo")
+
+    for item in items[:10]:
+        link_node = item.css("h2 a")
+        title = link_node.xpath("string(.)").get("").strip()
+        href = link_node.css("::attr(href)").get()
+
+        if title and href and href.startswith("http"):
+
+            if "xiachufang.com" in href:
+                continue
+
+            if "bing.com" in href or "microsoft.com" in href:
+                continue
+
+            clean_title = title.split(" - ")[0].split("_")[0].split("|")[0]
+            results.append({"title": clean_title, "url": href, "source": get_source_from_url(href)})
+    return results
+
+
+class RateLimiter:
+    """令牌桶: 平均每秒 rate 次，最多连续 burst 次；没有令牌时等待。"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    连续失败 failure_threshold 次后断开，reset_timeout 秒内直接跳过该来源；
+    之后放行一个试探请求，成功则恢复，失败则再次断开。
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def admit(self) -> Optional[str]:
+        """放行时返回 "closed"，或 "probe" 表示本请求就是半开状态下的试探请求；不放行时返回 None。"""
+        state = self.state
+        if state == "closed":
+            return "closed"
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return "probe"
+        return None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release_probe(self):
+        """试探请求被取消 (如客户端断开) 时由该试探请求调用，下一个请求可以重新试探。"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class RecipeSource:
+    """一个菜谱来源: 解析函数、可配置的站点地址、并发与频率限制、熔断器。"""
+
+    def __init__(self, name: str, search: Callable, base_url: str, concurrency: int = 4, rate: float = 2.0, burst: int = 4,
+                 failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.name = name
+        self.search = search
+        self.base_url = base_url.rstrip("/")
+        self.slots = asyncio.Semaphore(concurrency)
+        self.rate_limiter = RateLimiter(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    async def fetch(self, client: httpx.AsyncClient, query: str) -> List[dict]:
+        async with self.slots:
+            await self.rate_limiter.acquire()
+            return await self.search(client, self.base_url, query)
+
+
+# 来源名 -> (解析函数, 默认站点地址)；站点地址可用 RECIPE_SOURCE_<NAME>_URL 覆盖，便于指向本地的替身服务
+RECIPE_SOURCES = {
+    'xiachufang': (search_xiachufang, "https://www.xiachufang.com"),
+    'bing': (search_bing_general, "https://cn.bing.com"),
+}
+
+
+def default_sources() -> List[RecipeSource]:
+    return [
+        RecipeSource(name, search, os.getenv(f"RECIPE_SOURCE_{name.upper()}_URL", base_url))
+        for name, (search, base_url) in RECIPE_SOURCES.items()
+    ]
+
+
+class RecipeSearchService:
+    """
+    菜谱链接搜索。所有请求共用一个长连接的 httpx 客户端；
+    每个来源的结果按规范化后的食材集合单独缓存，失败的来源不写缓存，下次请求会重新抓取。
+    """
+
+    def __init__(self, client: httpx.AsyncClient, sources: List[RecipeSource], cache: ResultCache):
+        self.client = client
+        self.sources = sources
+        self.cache = cache
+
+    @staticmethod
+    def normalize(ingredients: List[str]) -> List[str]:
+        return sorted({name.strip().lower() for name in ingredients if name.strip()})
+
+    async def _search_source(self, source: RecipeSource, query: str) -> Tuple[str, List[dict]]:
+        """返回 (状态, 结果)，状态为 cached / ok / failed / skipped (已熔断)。"""
+        status, results = await self._fetch_source(source, query)
+        SOURCE_RESULTS.inc(source.name, status)
+        return status, results
+
+    async def _fetch_source(self, source: RecipeSource, query: str) -> Tuple[str, List[dict]]:
+        key = self.cache.key('recipes', source.name, query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return "cached", cached
+        admitted = source.breaker.admit()
+        if admitted is None:
+            print(f"[Crawler] {source.name} 已熔断，跳过")
+            return "skipped", []
+        try:
+            with span(f"recipes.source.{source.name}"):
+                results = await source.fetch(self.client, query)
+        except asyncio.CancelledError:
+            # 只有试探请求自己被取消时才释放；熔断器闭合时放行的其他请求不能清掉别人的试探标记
+            if admitted == "probe":
+                source.breaker.release_probe()
+            raise
+        except Exception as e:
+            source.breaker.record_failure()
+            print(f"[Crawler] {source.name} Error: {type(e).__name__}: {e}")
+            return "failed", []
+        source.breaker.record_success()
+        print(f"[Crawler] {source.name} found: {len(results)}")
+        self.cache.set(key, results)
+        return "ok", results
+
+    @staticmethod
+    def _dedupe(results: List[dict], seen_urls: set) -> List[dict]:
+        unique_recipes = []
+        for r in results:
+            normalized = r["url"].rstrip("/")
+            if normalized not in seen_urls:
+                unique_recipes.append(r)
+                seen_urls.add(normalized)
+        return unique_recipes
+
+    async def search(self, ingredients: List[str]) -> List[dict]:
+        """返回按 URL 去重后的结果 (保持来源顺序)。"""
+        query = " ".join(self.normalize(ingredients))
+        results_list = await asyncio.gather(*(self._search_source(source, query) for source in self.sources))
+        seen_urls = set()
+        return [r for _, results in results_list for r in self._dedupe(results, seen_urls)]
+
+    async def stream(self, ingredients: List[str]) -> AsyncIterator[dict]:
+        """
+        各来源并发抓取，每完成一个就产出一批与之前各批去重后的结果，最后产出汇总。
+        首批结果只取决于最快的来源，增加来源不会推迟它。调用方提前关闭生成器时，未完成的抓取会被取消。
+        """
+        query = " ".join(self.normalize(ingredients))
+        started = time.perf_counter()
+
+        async def run(source: RecipeSource):
+            status, results = await self._search_source(source, query)
+            return source.name, status, results, time.perf_counter() - started
+
+        tasks = [asyncio.ensure_future(run(source)) for source in self.sources]
+        seen_urls = set()
+        summary = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name, status, results, elapsed = await next_done
+                batch = self._dedupe(results, seen_urls)
+                summary[name] = {"status": status, "count": len(batch), "elapsed_ms": round(elapsed * 1000, 1)}
+                yield {"event": "batch", "source": name, "status": status, "recipes": batch}
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield {
+            "event": "summary", "total": len(seen_urls),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1), "sources": summary,
+        }
+
+    def stats(self) -> Dict[str, dict]:
+        return {source.name: {"state": source.breaker.state, "failures": source.breaker.failures} for source in self.sources}
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+RESULT_CACHE_FORMAT_VERSION = 1
+
+
+class ResultCache:
+    """
+    推荐/创意接口的结果缓存，LRU + TTL 淘汰。
+
+    键在名称解析之后构造 (见 key)，因此 "大蒜, garlic" 与 "garlic" 命中同一条目；
+    键中应包含数据版本，数据更新后旧条目自然不再命中并被淘汰。
+    个性化条目带上用户名，用户修改偏好时通过 invalidate_user 删除。
+    值必须可 JSON 序列化，以便在关闭时保存、启动时恢复。
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (过期时间, 用户名, 值)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    @staticmethod
+    def key(*parts) -> str:
+        """由规范化后的参数构造键；集合类参数应先排序。"""
+        return json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[2]
+
+    def set(self, key: str, value: Any, username: str = None):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, username, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def invalidate_user(self, username: str):
+        """删除某个用户的全部个性化条目。"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[1] == username]
+            for key in stale:
+                del self._entries[key]
+            self.counters["invalidated"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "size": len(self._entries)}
+
+    def save(self, path: Path):
+        """把未过期的条目写入 JSON 文件 (原子替换；多个 worker 关闭时同时保存，临时文件按进程区分)。"""
+        now = time.time()
+        with self._lock:
+            entries = [[key, expires_at, username, value]
+                       for key, (expires_at, username, value) in self._entries.items() if expires_at >= now]
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"format_version": RESULT_CACHE_FORMAT_VERSION, "entries": entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        print(f"结果缓存已保存: {len(entries)} 条。")
+
+    def load(self, path: Path):
+        """从 save 写出的文件恢复条目，已过期的条目会被跳过；文件损坏时忽略。"""
+        path = Path(path)
+        if not path.exists():
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取结果缓存 {path.name} 失败，已忽略: {e}")
+            return
+        if data.get("format_version") != RESULT_CACHE_FORMAT_VERSION:
+            return
+        now = time.time()
+        with self._lock:
+            for key, expires_at, username, value in data["entries"]:
+                if expires_at >= now:
+                    self._entries[key] = (expires_at, username, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        print(f"结果缓存已恢复: {len(self._entries)} 条。")
@@ -0,0 +1,35 @@
+import hashlib
+import secrets
+import time
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Tuple
+
+from ..database.models import User, UserSession
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def issue_session(db: AsyncSession, user: User, ttl_seconds: float) -> Tuple[str, float]:
+    """为用户签发新令牌并顺带清理其过期会话，返回 (令牌, 过期时间戳)。调用方负责提交。"""
+    now = time.time()
+    await db.execute(delete(UserSession).where(UserSession.user_id == user.id, UserSession.expires_at < now))
+    token = secrets.token_urlsafe(32)
+    expires_at = now + ttl_seconds
+    db.add(UserSession(token_hash=_token_hash(token), user_id=user.id, expires_at=expires_at))
+    return token, expires_at
+
+
+async def session_user(db: AsyncSession, token: str) -> Optional[User]:
+    """按主键查找未过期的令牌，返回其用户；令牌无效或已过期时返回 None。"""
+    return (await db.execute(
+        select(User)
+        .join(UserSession, UserSession.user_id == User.id)
+        .filter(UserSession.token_hash == _token_hash(token), UserSession.expires_at >= time.time())
+    )).scalars().first()
+
+
+async def revoke_session(db: AsyncSession, token: str):
+    await db.execute(delete(UserSession).where(UserSession.token_hash == _token_hash(token)))
@@ -0,0 +1,196 @@
+import threading
+import numpy as np
+from collections import OrderedDict, defaultdict
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Iterable, Optional, Tuple
+
+from ..database.models import User, Preference, LikedCombination, CombinationIngredient, UserTasteProfile
+from ..embedding_store import EmbeddingStore
+
+
+def _to_blob(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float64).tobytes()
+
+
+def _from_blob(blob: Optional[bytes], dim: int) -> np.ndarray:
+    if not blob:
+        return np.zeros(dim, dtype=np.float64)
+    return np.frombuffer(blob, dtype=np.float64).copy()
+
+
+def mark_taste_profile_stale(db: Session, user: User):
+    """嵌入尚未加载时无法增量更新，只把口味标记为待重建。"""
+    profile = db.get(UserTasteProfile, user.id)
+    if profile is not None:
+        profile.embedding_version = None
+
+
+class TasteProfiles:
+    """
+    物化的用户口味服务。
+
+    每个用户在 user_taste_profiles 表中保存 "点赞食材向量之和/数量" 与 "点赞组合平均向量之和/数量"，
+    点赞/取消点赞时增量加减；个性化请求只需读一行并做一次向量混合。
+    口味对全部食材的相似度向量按 (用户, 版本号) 缓存在进程内，版本号随每次修改递增，多个 worker 之间也不会读到旧值。
+    """
+
+    def __init__(self, embedding_store: EmbeddingStore, embedding_version: str, cache_size: int = 1024):
+        self.embedding_store = embedding_store
+        self.embedding_version = embedding_version
+        self.dim = embedding_store.vectors.shape[1]
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "rebuilds": 0}
+
+    # --- 向量 ---
+
+    def ingredient_vector(self, name: str) -> Optional[np.ndarray]:
+        """未知或未对齐的食材返回 None，不参与口味计算。"""
+        idx = self.embedding_store.name_to_idx.get(name)
+        if idx is None or not self.embedding_store.valid[idx]:
+            return None
+        return self.embedding_store.vectors[idx].astype(np.float64)
+
+    def combination_mean(self, names: Iterable[str]) -> Optional[np.ndarray]:
+        vectors = [v for v in (self.ingredient_vector(name) for name in names) if v is not None]
+        return np.mean(vectors, axis=0) if vectors else None
+
+    # --- 物化口味的维护 ---
+
+    def rebuild(self, db: Session, user: User) -> UserTasteProfile:
+        """从点赞记录重新计算口味 (两次查询，组合食材一次取回，不逐个懒加载)。"""
+        # 会话关闭了 autoflush，先把本事务中新增/删除的点赞写入，重建时才能读到
+        db.flush()
+        self.counters["rebuilds"] += 1
+        preference_sum = np.zeros(self.dim)
+        preference_count = 0
+        for (name,) in db.query(Preference.ingredient_name).filter(Preference.user_id == user.id):
+            vector = self.ingredient_vector(name)
+            if vector is not None:
+                preference_sum += vector
+                preference_count += 1
+
+        combinations = defaultdict(list)
+        rows = (
+            db.query(CombinationIngredient.combination_id, CombinationIngredient.ingredient_name)
+            .join(LikedCombination, CombinationIngredient.combination_id == LikedCombination.id)
+            .filter(LikedCombination.user_id == user.id)
+        )
+        for combination_id, name in rows:
+            combinations[combination_id].append(name)
+        combination_sum = np.zeros(self.dim)
+        combination_count = 0
+        for names in combinations.values():
+            mean = self.combination_mean(names)
+            if mean is not None:
+                combination_sum += mean
+                combination_count += 1
+
+        profile = db.get(UserTasteProfile, user.id) or UserTasteProfile(user_id=user.id)
+        profile.preference_sum = _to_blob(preference_sum)
+        profile.preference_count = preference_count
+        profile.combination_sum = _to_blob(combination_sum)
+        profile.combination_count = combination_count
+        profile.embedding_version = self.embedding_version
+        db.add(profile)
+        return profile
+
+    def apply_preference(self, db: Session, user: User, name: str, delta: int):
+        """
+        在调用方的事务中增量更新口味: delta=+1 为点赞，-1 为取消点赞。
+        调用前应已增删对应的 Preference (重建时会读到最新状态)。
+        """
+        profile = db.get(UserTasteProfile, user.id)
+        if profile is None or profile.embedding_version != self.embedding_version:
+            self.rebuild(db, user)
+            return
+        vector = self.ingredient_vector(name)
+        if vector is None:
+            return
+        count = profile.preference_count + delta
+        total = _from_blob(profile.preference_sum, self.dim) + delta * vector
+        profile.preference_count = count
+        # 计数归零时清掉累计的浮点误差
+        profile.preference_sum = _to_blob(total if count > 0 else np.zeros(self.dim))
+
+    def apply_combination(self, db: Session, user: User, names: Iterable[str], delta: int):
+        """与 apply_preference 相同，更新点赞组合部分。"""
+        profile = db.get(UserTasteProfile, user.id)
+        if profile is None or profile.embedding_version != self.embedding_version:
+            self.rebuild(db, user)
+            return
+        mean = self.combination_mean(names)
+        if mean is None:
+            return
+        count = profile.combination_count + delta
+        total = _from_blob(profile.combination_sum, self.dim) + delta * mean
+        profile.combination_count = count
+        profile.combination_sum = _to_blob(total if count > 0 else np.zeros(self.dim))
+
+    # --- 读取 ---
+
+    def _load(self, db: Session, username: str) -> Optional[UserTasteProfile]:
+        """一次查询读取用户口味；尚未物化或嵌入已变化时就地重建。"""
+        profile = db.query(UserTasteProfile).join(User).filter(User.username == username).first()
+        if profile is not None and profile.embedding_version == self.embedding_version:
+            return profile
+
+        user = profile.user if profile is not None else db.query(User).filter(User.username == username).first()
+        if user is None:
+            return None
+        try:
+            profile = self.rebuild(db, user)
+            db.commit()
+        except (StaleDataError, IntegrityError):
+            # 另一个请求刚刚更新 (或首次创建) 过，直接读取它的结果
+            db.rollback()
+            profile = db.get(UserTasteProfile, user.id)
+        return profile
+
+    def _vector_of(self, profile: UserTasteProfile) -> Optional[np.ndarray]:
+        count = profile.preference_count + profile.combination_count
+        if count == 0:
+            return None
+        total = _from_blob(profile.preference_sum, self.dim) + _from_blob(profile.combination_sum, self.dim)
+        return (total / count).astype(self.embedding_store.vectors.dtype)
+
+    def taste_vector(self, db: Session, username: str) -> Optional[np.ndarray]:
+        """用户的平均口味向量，没有任何有效点赞时返回 None。"""
+        profile = self._load(db, username)
+        return self._vector_of(profile) if profile is not None else None
+
+    def taste_scores(self, db: Session, username: str) -> Optional[np.ndarray]:
+        """口味向量与全部食材的余弦相似度 (未对齐食材为 0)，按口味版本缓存。"""
+        return self.taste_state(db, username)[1]
+
+    def taste_state(self, db: Session, username: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        返回 (口味版本标记, 口味相似度)；没有有效口味时两者都为 None。
+        版本标记随每次偏好修改变化，可用作结果缓存键的一部分。
+        """
+        profile = self._load(db, username)
+        if profile is None:
+            return None, None
+        key = (profile.version, profile.embedding_version)
+        version = f"{profile.user_id}:{profile.version}:{profile.embedding_version}"
+        with self._lock:
+            cached = self._cache.get(profile.user_id)
+            if cached is not None and cached[0] == key:
+                self._cache.move_to_end(profile.user_id)
+                self.counters["hits"] += 1
+                return (version, cached[1]) if cached[1] is not None else (None, None)
+            self.counters["misses"] += 1
+
+        vector = self._vector_of(profile)
+        scores = None if vector is None else self.embedding_store.score(vector, invalid_value=0.0)
+        if scores is not None:
+            scores.setflags(write=False)
+        with self._lock:
+            self._cache[profile.user_id] = (key, scores)
+            self._cache.move_to_end(profile.user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return (version, scores) if scores is not None else (None, None)
@@ -1,17 +1,76 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from itertools import combinations
-from collections import defaultdict
+from pathlib import Path
+from scipy import sparse
+from typing import Iterator, Tuple
 
-def calculate_flavor_similarity(ingr_comp_dict: dict, ingr_info_df: pd.DataFrame) -> pd.DataFrame:
+from .dataloader import iter_recipe_chunks, recipe_vocabulary
+from .matrix_store import SparseSimilarityMatrix, default_block_rows
+from .recipe_store import RecipeStore
+
+def build_ingredient_compound_matrix(ingr_comp_dict: dict, ingredient_ids: list) -> sparse.csr_matrix:
+    """
+    构建 食材 x 风味化合物 的稀疏二值矩阵。
+
+    Args:
+        ingr_comp_dict (dict): 食材ID到其风味化合物集合的映射 {ingr_id: {comp_id_1, ...}}。
+        ingredient_ids (list): 矩阵行对应的食材ID顺序。
+
+    Returns:
+        sparse.csr_matrix: 第 i 行为 ingredient_ids[i] 所含化合物的 0/1 指示向量。
+    """
+    rows, cols = [], []
+    for row, ingr_id in enumerate(ingredient_ids):
+        compounds = ingr_comp_dict.get(ingr_id, ())
+        rows.extend([row] * len(compounds))
+        cols.extend(compounds)
+
+    comp_ids, comp_cols = np.unique(np.asarray(cols, dtype=np.int64), return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (np.asarray(rows, dtype=np.int64), comp_cols)),
+        shape=(len(ingredient_ids), len(comp_ids))
+    )
+    # 重复的 (食材, 化合物) 会被累加，这里统一压回 1
+    matrix.data[:] = 1.0
+    return matrix
+
+
+def iter_flavor_similarity_blocks(ingr_comp_dict: dict, ingr_info_df: pd.DataFrame, block_size: int = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    按行分块产出风味 Jaccard 相似度 (起始行, 块)，行列顺序与 ingr_info_df 一致，对角线为 1。
+
+    交集大小由稀疏矩阵乘法 X[块] @ X.T 得到，并集大小由行计数推出:
+    |A ∪ B| = |A| + |B| - |A ∩ B|。block_size 为 None 时按 default_block_rows 决定每块行数。
+    """
+    all_ingredient_ids = list(ingr_info_df['id'])
+    n = len(all_ingredient_ids)
+
+    compound_matrix = build_ingredient_compound_matrix(ingr_comp_dict, all_ingredient_ids)
+    compound_matrix_t = compound_matrix.T.tocsc()
+    compound_counts = np.asarray(compound_matrix.sum(axis=1), dtype=np.float32).ravel()
+
+    step = block_size or default_block_rows(n)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        intersection = (compound_matrix[start:stop] @ compound_matrix_t).toarray()
+        union = compound_counts[start:stop, None] + compound_counts[None, :] - intersection
+        block = np.zeros((stop - start, n), dtype=np.float32)
+        np.divide(intersection, union, out=block, where=union > 0)
+        # 对角线填充为1
+        block[np.arange(stop - start), np.arange(start, stop)] = 1.0
+        yield start, block
+
+
+def calculate_flavor_similarity(ingr_comp_dict: dict, ingr_info_df: pd.DataFrame, block_size: int = None) -> pd.DataFrame:
     """
     计算所有食材之间基于共享风味化合物的Jaccard相似度矩阵。
 
     Args:
         ingr_comp_dict (dict): 食材ID到其风味化合物集合的映射 {ingr_id: {comp_id_1, ...}}。
         ingr_info_df (pd.DataFrame): 食材信息 DataFrame，用于获取完整的食材列表。
+        block_size (int, optional): 分块计算时每块的行数，峰值额外内存只与 block_size x N 成正比。
+                                    为 None 时按食材数量自动选择。
 
     Returns:
         pd.DataFrame: 一个N x N的DataFrame，其中N是食材总数，值为0到1的Jaccard相似度分数。
@@ -22,100 +81,182 @@ def calculate_flavor_similarity(ingr_comp_dict: dict, ingr_info_df: pd.DataFrame
     # 用食材名称作为索引
     id_to_name = pd.Series(ingr_info_df.name.values, index=ingr_info_df.id).to_dict()
     all_ingredient_ids = list(ingr_info_df['id'])
-    
+    n = len(all_ingredient_ids)
+
     # np.float32节省内存
-    similarity_matrix = pd.DataFrame(
-        np.zeros((len(all_ingredient_ids), len(all_ingredient_ids)), dtype=np.float32),
-        index=[id_to_name[i] for i in all_ingredient_ids],
-        columns=[id_to_name[i] for i in all_ingredient_ids]
-    )
+    similarity_values = np.zeros((n, n), dtype=np.float32)
+    for start, block in iter_flavor_similarity_blocks(ingr_comp_dict, ingr_info_df, block_size):
+        similarity_values[start:start + len(block)] = block
 
-    # combinations避免重复计算 (A,B) 和 (B,A)
-    for id1, id2 in combinations(all_ingredient_ids, 2):
-        set1 = ingr_comp_dict.get(id1, set())
-        set2 = ingr_comp_dict.get(id2, set())
-        
-        intersection = len(set1.intersection(set2))
-        if intersection == 0:
-            continue # 如果没有交集，相似度为0，跳过
-
-        union = len(set1.union(set2))
-        jaccard_sim = intersection / union if union != 0 else 0
-        
-        name1 = id_to_name[id1]
-        name2 = id_to_name[id2]
-        similarity_matrix.loc[name1, name2] = jaccard_sim
-        similarity_matrix.loc[name2, name1] = jaccard_sim
-
-    # 对角线填充为1
-    np.fill_diagonal(similarity_matrix.values, 1.0)
+    names = [id_to_name[i] for i in all_ingredient_ids]
+    similarity_matrix = pd.DataFrame(similarity_values, index=names, columns=names)
     
     print("--- 风味相似度矩阵计算完成! ---")
     return similarity_matrix
 
 
-def calculate_cooccurrence_similarity(recipes_list_of_sets: list, ingr_info_df: pd.DataFrame) -> pd.DataFrame:
+def calculate_flavor_similarity_top_k(ingr_comp_dict: dict, ingr_info_df: pd.DataFrame, k: int) -> SparseSimilarityMatrix:
+    """风味相似度的 top-K 稀疏版本: 逐块计算、逐块截断，不物化 N x N 矩阵。"""
+    print(f"\n--- 开始分块计算风味相似度的 top-{k} 稀疏矩阵... ---")
+    matrix = SparseSimilarityMatrix.from_blocks(
+        iter_flavor_similarity_blocks(ingr_comp_dict, ingr_info_df), ingr_info_df['name'].tolist(), k
+    )
+    print(f"--- 风味 top-{k} 矩阵计算完成: {matrix.csr.nnz} 个非零值 ---")
+    return matrix
+
+
+def _recipe_ingredient_matrix(recipes, n_columns: int, column_map: np.ndarray = None) -> sparse.csr_matrix:
+    """
+    由 "每份食谱一个列号序列" 构建 食谱 x 食材 的稀疏 0/1 计数矩阵。
+    给定 column_map 时，序列中的编号先经 column_map 映射为列号。
+    """
+    lengths = [len(r) for r in recipes]
+    indptr = np.zeros(len(recipes) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.fromiter((c for r in recipes for c in r), dtype=np.int32, count=int(indptr[-1]))
+    if column_map is not None:
+        indices = column_map[indices]
+    data = np.ones(len(indices), dtype=np.int64)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(recipes), n_columns))
+
+
+def _sparse_cosine_from_gram(gram: sparse.spmatrix) -> sparse.csr_matrix:
+    """
+    由食材共现计数 (Gram 矩阵 X.T @ X) 计算稀疏的余弦相似度。
+
+    对角线是每个食材出现的食谱数，cos(i, j) = G[i, j] / sqrt(G[i, i] * G[j, j])；
+    从未出现过的食材整行整列为 0。
+    """
+    gram = sparse.csr_matrix(gram)
+    norms = np.sqrt(gram.diagonal().astype(np.float64))
+    inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    scaling = sparse.diags(inv_norms)
+    return sparse.csr_matrix((scaling @ gram @ scaling).astype(np.float32))
+
+
+def _cosine_from_gram(gram: sparse.spmatrix, ingredient_names: list) -> pd.DataFrame:
+    cosine = _sparse_cosine_from_gram(gram)
+    return pd.DataFrame(cosine.toarray(), index=ingredient_names, columns=ingredient_names)
+
+
+def _recipe_ingredient_csr(recipes, all_ingredient_names: list) -> sparse.csr_matrix:
+    """食谱 x 食材 的稀疏 CSR 矩阵，列顺序与 all_ingredient_names 一致。"""
+    if isinstance(recipes, RecipeStore):
+        # 直接复用存储里的 CSR，只需把列从存储词表顺序换到 ingr_info_df 的顺序
+        store_matrix = sparse.csr_matrix(
+            (np.ones(len(recipes.indices), dtype=np.int64), recipes.indices, recipes.indptr),
+            shape=(len(recipes), len(recipes.vocabulary))
+        )
+        column_order = [recipes.name_to_id[name] for name in all_ingredient_names]
+        recipe_ingredient_matrix = store_matrix[:, column_order]
+    else:
+        # 忽略无效的食材名
+        name_to_column = {name: i for i, name in enumerate(all_ingredient_names)}
+        recipes_as_columns = [
+            [name_to_column[name] for name in recipe if name in name_to_column]
+            for recipe in recipes
+        ]
+        recipe_ingredient_matrix = _recipe_ingredient_matrix(recipes_as_columns, len(all_ingredient_names))
+    return recipe_ingredient_matrix
+
+
+def _cooccurrence_gram(recipes, all_ingredient_names: list) -> sparse.csr_matrix:
+    """返回 食谱 x 食材 矩阵的稀疏 Gram 矩阵 (列顺序与 all_ingredient_names 一致)。"""
+    recipe_ingredient_matrix = _recipe_ingredient_csr(recipes, all_ingredient_names)
+    return recipe_ingredient_matrix.T @ recipe_ingredient_matrix
+
+
+def iter_cooccurrence_similarity_blocks(recipes, all_ingredient_names: list, block_rows: int = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    逐块产出共现余弦相似度的稠密行块 (起始行, block_rows x N)。
+
+    每块的 Gram 行由 X[:, 行块].T @ X 单独算出，再按两侧的范数缩放；
+    完整的 N x N Gram 或余弦矩阵从不出现，峰值内存只与 食谱 x 食材 矩阵和块大小相关。
+    """
+    matrix = _recipe_ingredient_csr(recipes, all_ingredient_names)
+    columns = sparse.csc_matrix(matrix)
+    n = len(all_ingredient_names)
+    # 对角线 G[i, i] = 第 i 列的平方和
+    norms = np.sqrt(np.asarray(columns.multiply(columns).sum(axis=0), dtype=np.float64).ravel())
+    inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    step = block_rows or default_block_rows(n)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        gram_rows = (columns[:, start:stop].T @ matrix).toarray()
+        yield start, ((inv_norms[start:stop, None] * gram_rows) * inv_norms[None, :]).astype(np.float32)
+
+
+def calculate_cooccurrence_similarity(recipes, ingr_info_df: pd.DataFrame) -> pd.DataFrame:
     """
     计算所有食材之间基于食谱共现的余弦相似度矩阵。
-    此版本已更新，可以直接处理包含食材标准名称集合的列表。
+
+    食谱 x 食材 矩阵以稀疏 CSR 直接构建，再由稀疏 Gram 矩阵得到余弦相似度，
+    全程不会物化稠密的 食谱 x 食材 矩阵。
 
     Args:
-        recipes_list_of_sets (list): 一个食谱列表，其中每个食谱是一个包含食材标准名称的集合。
+        recipes: RecipeStore，或一个食谱列表 (每个食谱是一个包含食材标准名称的集合)。
         ingr_info_df (pd.DataFrame): 食材信息 DataFrame。
 
     Returns:
-        pd.DataFrame: 一个N x N的DataFrame，值为余弦相似度分数。
+        pd.DataFrame: 一个N x N的 float32 DataFrame，值为余弦相似度分数。
                       行和列的索引都是食材的名称。
     """
     print("\n--- 开始计算经典搭配 (共现) 相似度矩阵... ---")
-    print("步骤 1/3: 创建 食谱-食材 的关系列表...")
+    print("步骤 1/3: 构建稀疏的 食谱-食材 矩阵...")
 
     # 获取所有食材的标准名称列表，这将作为我们矩阵的最终索引和列
     all_ingredient_names = ingr_info_df['name'].tolist()
-    
-    # 我们不再需要 recipe_id，而是使用列表的索引 (0, 1, 2...) 作为食谱的唯一标识
-    # 我们将创建一个长格式的列表，用于后续的 DataFrame 构建
-    recipe_indices = []
-    ingredient_names = []
-    
-    for recipe_idx, ingredients_set in enumerate(recipes_list_of_sets):
-        for ingr_name in ingredients_set:
-            recipe_indices.append(recipe_idx)
-            ingredient_names.append(ingr_name)
-
-    # 创建一个包含所有共现信息的长格式DataFrame
-    cooccurrence_df = pd.DataFrame({
-        'recipe_idx': recipe_indices,
-        'ingredient_name': ingredient_names
-    })
-    
-    # 确保没有无效的食材名混入
-    cooccurrence_df = cooccurrence_df[cooccurrence_df['ingredient_name'].isin(all_ingredient_names)]
-    
-    # 使用crosstab来创建 食谱 x 食材 的矩阵
-    # 值是食材在食谱中出现的次数（在这里都是1）
-    recipe_ingredient_matrix = pd.crosstab(
-        cooccurrence_df['recipe_idx'], 
-        cooccurrence_df['ingredient_name']
-    )
-    
-    # 确保矩阵的列包含了所有已知的食材，并按正确的顺序排列
-    recipe_ingredient_matrix = recipe_ingredient_matrix.reindex(
-        columns=all_ingredient_names, fill_value=0
-    )
-    
-    print("步骤 2/3: 计算余弦相似度 (这可能需要一些时间)...")
-    # 计算食材(列)之间的余弦相似度
-    # .T 表示转置矩阵，因为cosine_similarity默认计算行之间的相似度
-    cosine_sim_matrix = cosine_similarity(recipe_ingredient_matrix.T)
-    
+
+    print("步骤 2/3: 计算稀疏 Gram 矩阵与余弦相似度...")
+    gram = _cooccurrence_gram(recipes, all_ingredient_names)
+
     print("步骤 3/3: 整理结果...")
-    # 将numpy数组转换回带有食材名称索引的DataFrame
-    classic_similarity_df = pd.DataFrame(
-        cosine_sim_matrix,
-        index=all_ingredient_names,
-        columns=all_ingredient_names
-    )
-    
+    classic_similarity_df = _cosine_from_gram(gram, all_ingredient_names)
+
+    print("--- 共现相似度矩阵计算完成! ---")
+    return classic_similarity_df
+
+
+def calculate_cooccurrence_similarity_top_k(recipes, ingr_info_df: pd.DataFrame, k: int) -> SparseSimilarityMatrix:
+    """共现相似度的 top-K 稀疏版本: 按行块计算 Gram 与余弦，逐块截断为每行 top-K。"""
+    print(f"\n--- 开始分块计算共现相似度的 top-{k} 稀疏矩阵... ---")
+    all_ingredient_names = ingr_info_df['name'].tolist()
+    blocks = iter_cooccurrence_similarity_blocks(recipes, all_ingredient_names)
+    matrix = SparseSimilarityMatrix.from_blocks(blocks, all_ingredient_names, k)
+    print(f"--- 共现 top-{k} 矩阵计算完成: {matrix.csr.nnz} 个非零值 ---")
+    return matrix
+
+
+def calculate_cooccurrence_similarity_streaming(data_path: Path, ingr_info_df: pd.DataFrame, chunk_size: int = 50000) -> pd.DataFrame:
+    """
+    流式版本的共现相似度计算：逐文件、逐块读取食谱，只累加 N x N 的共现计数。
+
+    内存占用只与食材数量和 chunk_size 相关，与食谱总数无关，
+    因此可以处理远大于内存的食谱语料。结果与 calculate_cooccurrence_similarity 一致。
+
+    Args:
+        data_path (Path): 指向 flavor_network_data 目录的路径对象。
+        ingr_info_df (pd.DataFrame): 食材信息 DataFrame。
+        chunk_size (int): 每块处理的食谱数量。
+
+    Returns:
+        pd.DataFrame: 一个N x N的 float32 DataFrame，值为余弦相似度分数。
+    """
+    print("\n--- 开始流式计算经典搭配 (共现) 相似度矩阵... ---")
+    all_ingredient_names = ingr_info_df['name'].tolist()
+    vocabulary = recipe_vocabulary(ingr_info_df)
+    name_to_column = {name: i for i, name in enumerate(all_ingredient_names)}
+    vocab_to_column = np.array([name_to_column[name] for name in vocabulary], dtype=np.int32)
+
+    n = len(all_ingredient_names)
+    gram = sparse.csr_matrix((n, n), dtype=np.int64)
+    n_recipes = 0
+    for chunk in iter_recipe_chunks(data_path, ingr_info_df, chunk_size):
+        chunk_matrix = _recipe_ingredient_matrix(chunk, n, column_map=vocab_to_column)
+        gram = gram + chunk_matrix.T @ chunk_matrix
+        n_recipes += len(chunk)
+        print(f"已累加 {n_recipes} 份食谱的共现计数...")
+
+    classic_similarity_df = _cosine_from_gram(gram, all_ingredient_names)
     print("--- 共现相似度矩阵计算完成! ---")
     return classic_similarity_df